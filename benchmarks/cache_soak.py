@@ -0,0 +1,150 @@
+"""Soak benchmark for the bounded caches of a long-lived Converter.
+
+Converts millions of distinct message types through one shared Converter and
+its public `convert()` API, the way an embedding service would: definitions
+come from a generated bundle through MsgParser (exercising the bundle's parsed
+LRU), every type depends on shared std_msgs/geometry_msgs types (results cache
+hits), and a fraction of requests name messages of a package known to be
+unresolvable (negative cache). Resident memory and cache statistics are
+reported periodically; once the caches have filled up they evict, and
+anonymous memory stays flat however many types are converted.
+
+The bundle index of all generated types is loaded up front, so the baseline
+grows with --count; what matters is the growth after the first report. Pages
+of the memory-mapped bundle are reported separately ("file MiB"): they grow as
+the bundle is read, but belong to the page cache and can be reclaimed.
+
+Usage:
+    python benchmarks/cache_soak.py [--count 2000000] [--max-bytes 67108864]
+"""
+
+import argparse
+import contextlib
+import io
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from r2pb.bundle import build_bundle
+from r2pb.cache import LRUCache, NegativeCache
+from r2pb.converter import DEFAULT_RESULTS_CACHE_BYTES, Converter
+
+# Types per generated package; each package is converted and removed in turn.
+PACKAGE_SIZE = 1000
+MISSING_PACKAGE = "ghost_msgs"
+
+
+def soak_messages(count: int):
+    """Yields ('pkg/Msg', content) for the shared types and `count` others."""
+    yield "std_msgs/Header", "uint32 seq\ntime stamp\nstring frame_id"
+    yield "geometry_msgs/Point", "float64 x\nfloat64 y\nfloat64 z"
+    for i in range(count):
+        yield soak_type(i), (
+            "std_msgs/Header header\n"
+            f"float64[36] covariance_{i}\n"
+            "geometry_msgs/Point[] points\n"
+            f"string label  # variant {i}\n"
+            "uint8[] data"
+        )
+
+
+def soak_type(i: int) -> str:
+    return f"soak{i // PACKAGE_SIZE}_msgs/Msg{i % PACKAGE_SIZE}"
+
+
+def resident_bytes():
+    """Returns (anonymous, file-backed) resident memory in bytes.
+
+    Where /proc is unavailable, the peak RSS is reported as anonymous.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            status = dict(line.split(":", 1) for line in f)
+        return tuple(
+            int(status[key].split()[0]) * 1024 for key in ("RssAnon", "RssFile")
+        )
+    except (OSError, KeyError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return (peak if sys.platform == "darwin" else peak * 1024), 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=2_000_000)
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_RESULTS_CACHE_BYTES)
+    parser.add_argument("--miss-every", type=int, default=50)
+    parser.add_argument("--report-every", type=int, default=100_000)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="r2pb-soak-"))
+    try:
+        start = time.perf_counter()
+        bundle_path = workdir / "soak.bundle"
+        build_bundle(bundle_path, soak_messages(args.count))
+        print(
+            f"Built a bundle of {args.count} types in "
+            f"{time.perf_counter() - start:.0f}s"
+        )
+
+        negative_cache = NegativeCache(ttl=24 * 3600.0)
+        # Stands in for an earlier run that failed to fetch the package, so
+        # the misses below never reach the network.
+        negative_cache.record(
+            f"package:{MISSING_PACKAGE}",
+            KeyError(f"Package '{MISSING_PACKAGE}' not found"),
+        )
+        converter = Converter(
+            negative_cache=negative_cache,
+            bundles=[bundle_path],
+            results_cache=LRUCache(max_bytes=args.max_bytes),
+        )
+        run(converter, workdir / "out", args)
+    finally:
+        shutil.rmtree(workdir)
+
+
+def run(converter: Converter, output_dir: Path, args):
+    print(
+        f"{'converted':>10} {'anon MiB':>8} {'file MiB':>8} {'results':>8} {'res MiB':>8} "
+        f"{'hit rate':>8} {'evicted':>8} {'negative':>8} {'bundle':>8} "
+        f"{'msg/s':>8}"
+    )
+    misses = 0
+    start = time.perf_counter()
+    for first in range(0, args.count, PACKAGE_SIZE):
+        batch = [
+            soak_type(i) for i in range(first, min(first + PACKAGE_SIZE, args.count))
+        ]
+        # convert() reports every file it writes; keep the soak output readable.
+        with contextlib.redirect_stdout(io.StringIO()):
+            converter.convert(batch, output_dir)
+            for i in range(first, first + len(batch), args.miss_every):
+                try:
+                    converter.convert(f"{MISSING_PACKAGE}/Msg{i}", output_dir)
+                except FileNotFoundError:
+                    misses += 1
+        shutil.rmtree(output_dir / batch[0].split("/")[0])
+
+        converted = first + len(batch)
+        if converted % args.report_every == 0 or converted == args.count:
+            stats = converter.cache_stats()
+            results = stats["results"]
+            bundle = next(v for k, v in stats.items() if k.startswith("bundle:"))
+            anonymous, file_backed = resident_bytes()
+            elapsed = time.perf_counter() - start
+            print(
+                f"{converted:>10} {anonymous / 2**20:>8.1f} "
+                f"{file_backed / 2**20:>8.1f} "
+                f"{results.entries:>8} {results.bytes / 2**20:>8.1f} "
+                f"{results.hit_rate:>8.1%} {results.evictions:>8} "
+                f"{stats['negative'].entries:>8} {bundle.entries:>8} "
+                f"{converted / elapsed:>8.0f}"
+            )
+    print(f"{misses} requests failed fast on the negative cache")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Throughput benchmark for the Protobuf-to-ROS1 transcoder.
+
+Encodes a few representative messages with the protobuf runtime (using
+descriptors built by r2pb), then measures how many messages per second and
+megabytes per second `Transcoder.transcode_into` writes into a preallocated
+buffer.
+
+Usage:
+    python benchmarks/transcoder_throughput.py [--seconds 2.0]
+"""
+
+import argparse
+import time
+from unittest import mock
+
+from r2pb.descriptor import DescriptorBuilder
+from r2pb.parser import parse_msg_content
+from r2pb.transcoder import TranscoderBuilder
+
+MESSAGES = {
+    ("std_msgs", "Header"): "uint32 seq\ntime stamp\nstring frame_id",
+    ("geometry_msgs", "Point"): "float64 x\nfloat64 y\nfloat64 z",
+    ("geometry_msgs", "Quaternion"): "float64 x\nfloat64 y\nfloat64 z\nfloat64 w",
+    ("geometry_msgs", "Vector3"): "float64 x\nfloat64 y\nfloat64 z",
+    ("sensor_msgs", "Imu"): (
+        "std_msgs/Header header\n"
+        "geometry_msgs/Quaternion orientation\n"
+        "float64[9] orientation_covariance\n"
+        "geometry_msgs/Vector3 angular_velocity\n"
+        "float64[9] angular_velocity_covariance\n"
+        "geometry_msgs/Vector3 linear_acceleration\n"
+        "float64[9] linear_acceleration_covariance"
+    ),
+    ("sensor_msgs", "LaserScan"): (
+        "std_msgs/Header header\n"
+        "float32 angle_min\nfloat32 angle_max\nfloat32 angle_increment\n"
+        "float32 time_increment\nfloat32 scan_time\n"
+        "float32 range_min\nfloat32 range_max\n"
+        "float32[] ranges\nfloat32[] intensities"
+    ),
+    ("sensor_msgs", "Image"): (
+        "std_msgs/Header header\nuint32 height\nuint32 width\nstring encoding\n"
+        "uint8 is_bigendian\nuint32 step\nuint8[] data"
+    ),
+    ("test_msgs", "Path"): "std_msgs/Header header\ngeometry_msgs/Point[] points",
+}
+
+
+def make_parser():
+    parser = mock.Mock()
+    parser.parse.side_effect = lambda pkg, msg: parse_msg_content(MESSAGES[(pkg, msg)])
+    return parser
+
+
+def make_samples(pool):
+    imu = pool.get_message_class("sensor_msgs.Imu")()
+    imu.header.frame_id = "imu_link"
+    imu.header.stamp.seconds = 1700000000
+    imu.orientation.w = 1.0
+    imu.orientation_covariance.extend([0.01] * 9)
+    imu.angular_velocity_covariance.extend([0.02] * 9)
+    imu.linear_acceleration_covariance.extend([0.03] * 9)
+
+    scan = pool.get_message_class("sensor_msgs.LaserScan")()
+    scan.header.frame_id = "laser"
+    scan.ranges.extend([float(i % 30) for i in range(1080)])
+    scan.intensities.extend([1.0] * 1080)
+
+    image = pool.get_message_class("sensor_msgs.Image")()
+    image.height, image.width, image.step = 480, 640, 1920
+    image.encoding = "rgb8"
+    image.data = bytes(480 * 1920)
+
+    path = pool.get_message_class("test_msgs.Path")()
+    for i in range(500):
+        path.points.add(x=float(i), y=float(-i), z=0.5)
+
+    return {
+        "sensor_msgs/Imu": imu.SerializeToString(),
+        "sensor_msgs/LaserScan": scan.SerializeToString(),
+        "sensor_msgs/Image": image.SerializeToString(),
+        "test_msgs/Path": path.SerializeToString(),
+    }
+
+
+def bench(transcoder, data, seconds):
+    buffer = bytearray(transcoder.serialized_size(data))
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            transcoder.transcode_into(data, buffer)
+        count += 100
+    elapsed = time.perf_counter() - start
+    return count / elapsed, count * len(buffer) / elapsed / 1e6
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--seconds", type=float, default=2.0)
+    args = arg_parser.parse_args()
+
+    parser = make_parser()
+    msg_types = ["sensor_msgs/Imu", "sensor_msgs/LaserScan", "sensor_msgs/Image"]
+    msg_types.append("test_msgs/Path")
+    pool = DescriptorBuilder(parser).build_pool(msg_types)
+    samples = make_samples(pool)
+    builder = TranscoderBuilder(parser)
+
+    print(f"{'message':<24}{'pb bytes':>10}{'msgs/s':>14}{'MB/s (ROS1)':>14}")
+    for msg_type, data in samples.items():
+        rate, throughput = bench(builder.build(msg_type), data, args.seconds)
+        print(f"{msg_type:<24}{len(data):>10}{rate:>14,.0f}{throughput:>14,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import List, Optional, Union
+
+import requests
+
+from .locking import atomic_write, default_file_mode
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Bump when the layout of stored artifacts or the key derivation changes.
+ARTIFACT_FORMAT = 1
+
+# Linux ioctl that shares the extents of one file with another (a reflink).
+_FICLONE = 0x40049409
+
+
+def r2pb_version() -> str:
+    """Returns the r2pb version artifact keys are derived from.
+
+    The installed version alone does not identify the code: an editable
+    install keeps reporting the version it was installed at, and a source
+    tree has none. The modules that shape generated files are therefore
+    always hashed in, so an edit to them invalidates old artifacts just like
+    a release would.
+    """
+    try:
+        installed = version("r2pb")
+    except PackageNotFoundError:
+        installed = "source"
+    return f"{installed}/{_source_digest()}"
+
+
+def _source_digest() -> str:
+    from . import generator, mapper, parser
+
+    digest = hashlib.sha256()
+    for module in (generator, mapper, parser):
+        digest.update(Path(module.__file__).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def template_digest(generator) -> str:
+    """Returns the sha256 of the template source a ProtoGenerator renders."""
+    source, _, _ = generator.env.loader.get_source(
+        generator.env, generator.template.name
+    )
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def artifact_key(
+    msg_type: str, msg_content: str, template_hash: str, r2pb_ver: str
+) -> str:
+    """Derives the content address of the .proto generated for one message.
+
+    A generated file depends only on its own .msg text; dependencies appear in
+    it by name, and each of them is stored under its own key. `template_hash`
+    and `r2pb_ver` come from `template_digest` and `r2pb_version`, which
+    callers compute once rather than per message.
+    """
+    key_data = json.dumps(
+        {
+            "format": ARTIFACT_FORMAT,
+            "version": r2pb_ver,
+            "template": template_hash,
+            "msg_type": msg_type,
+            "msg": msg_content,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+
+def _parse_metadata(key: str, data: bytes) -> Optional[dict]:
+    """Decodes stored metadata, reporting and ignoring malformed objects."""
+    try:
+        meta = json.loads(data)
+        # Everything materialize relies on must be present.
+        for field in ("sha256", "dependencies"):
+            if field not in meta:
+                raise KeyError(field)
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring malformed artifact metadata for {key}: {e!r}")
+        return None
+    return meta
+
+
+def _metadata(msg_type: str, content: bytes, dependencies: List[str]) -> bytes:
+    return json.dumps(
+        {
+            "msg_type": msg_type,
+            "dependencies": sorted(dependencies),
+            "sha256": hashlib.sha256(content).hexdigest(),
+        },
+        sort_keys=True,
+    ).encode("utf-8")
+
+
+def _write_atomic(path: Path, data: bytes, mode: Optional[int] = None):
+    with atomic_write(path, binary=True, mode=mode) as f:
+        f.write(data)
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    """Clones `src` to `dst` sharing its data blocks, where supported."""
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        return True
+    except OSError:
+        if dst.exists():
+            dst.unlink()
+        return False
+
+
+class LocalArtifactStore:
+    """A content-addressed store of generated .proto files in a directory.
+
+    Objects are written once, atomically, and made read-only so that outputs
+    materialized as hardlinks cannot modify the store.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def _object_path(self, key: str, suffix: str) -> Path:
+        return self.path / key[:2] / f"{key}{suffix}"
+
+    def get(self, key: str) -> Optional[dict]:
+        meta_path = self._object_path(key, ".json")
+        try:
+            data = meta_path.read_bytes()
+        except FileNotFoundError:
+            return None
+        meta = _parse_metadata(key, data)
+        if meta is None:
+            self._discard(key)
+        return meta
+
+    def _discard(self, key: str):
+        """Removes a broken object's metadata, so that `put` replaces it."""
+        try:
+            self._object_path(key, ".json").unlink()
+        except FileNotFoundError:
+            pass
+
+    def put(self, key: str, msg_type: str, content: str, dependencies: List[str]):
+        meta_path = self._object_path(key, ".json")
+        if meta_path.exists():
+            return
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        data = content.encode("utf-8")
+        # Stored objects are read-only, as hardlinks to them are handed out.
+        # The metadata is written last: its presence marks a complete object.
+        mode = default_file_mode() & 0o444
+        _write_atomic(self._object_path(key, ".proto"), data, mode=mode)
+        _write_atomic(meta_path, _metadata(msg_type, data, dependencies), mode=mode)
+
+    def materialize(self, key: str, target: Path) -> Optional[List[str]]:
+        """Places a stored file at `target`, returning its dependencies.
+
+        Hardlinks are preferred, then reflinks, then a plain copy. Returns
+        None if the store has no intact object for `key`.
+        """
+        meta = self.get(key)
+        if meta is None:
+            return None
+        src = self._object_path(key, ".proto")
+        try:
+            digest = hashlib.sha256(src.read_bytes()).hexdigest()
+        except FileNotFoundError:
+            return None
+        if digest != meta["sha256"]:
+            print(f"Ignoring corrupt artifact {key}: content does not match its hash")
+            self._discard(key)
+            return None
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+        os.close(fd)
+        tmp = Path(tmp_name)
+        tmp.unlink()
+        try:
+            try:
+                os.link(src, tmp)
+            except OSError:
+                if not _reflink(src, tmp):
+                    shutil.copyfile(src, tmp)
+            os.replace(tmp, target)
+        except FileNotFoundError:
+            return None
+        except BaseException:
+            if tmp.exists():
+                tmp.unlink()
+            raise
+        return meta["dependencies"]
+
+
+class HttpArtifactStore:
+    """A content-addressed store behind a plain HTTP GET/PUT cache.
+
+    Objects are fetched and uploaded as `<url>/<key>.proto` and
+    `<url>/<key>.json`. Network errors are reported and treated as misses, so
+    an unavailable cache never fails a conversion.
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def _get(self, name: str) -> Optional[bytes]:
+        try:
+            response = self._session.get(f"{self.url}/{name}", timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"Artifact cache unavailable: {e}")
+            return None
+        if response.status_code != 200:
+            return None
+        return response.content
+
+    def get(self, key: str) -> Optional[dict]:
+        data = self._get(f"{key}.json")
+        if data is None:
+            return None
+        return _parse_metadata(key, data)
+
+    def put(self, key: str, msg_type: str, content: str, dependencies: List[str]):
+        data = content.encode("utf-8")
+        try:
+            for name, body in (
+                (f"{key}.proto", data),
+                (f"{key}.json", _metadata(msg_type, data, dependencies)),
+            ):
+                response = self._session.put(
+                    f"{self.url}/{name}", data=body, timeout=self.timeout
+                )
+                response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"Could not upload {msg_type} to the artifact cache: {e}")
+
+    def materialize(self, key: str, target: Path) -> Optional[List[str]]:
+        meta = self.get(key)
+        if meta is None:
+            return None
+        data = self._get(f"{key}.proto")
+        if data is None:
+            return None
+        if hashlib.sha256(data).hexdigest() != meta["sha256"]:
+            print(f"Ignoring corrupt artifact {key}: content does not match its hash")
+            return None
+        _write_atomic(target, data)
+        return meta["dependencies"]
+
+
+def open_artifact_store(location: str):
+    """Opens an HTTP store for http(s) URLs and a local store otherwise."""
+    if location.startswith(("http://", "https://")):
+        return HttpArtifactStore(location)
+    return LocalArtifactStore(location)
@@ -0,0 +1,177 @@
+import json
+import mmap
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from .cache import CacheStats, LRUCache
+from .locking import atomic_write
+from .parser import Constant, Field, ParsedMsg, parse_msg_content
+
+# File layout:
+#   header  = MAGIC, format version, index offset, index length
+#   records = UTF-8 .msg definitions and JSON pre-parsed models, back to back
+#   index   = JSON object mapping "pkg/Msg" to the offsets of both records
+MAGIC = b"R2PBBNDL"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sIQQ")
+
+
+class BundleError(ValueError):
+    """Raised when a file is not a valid r2pb message bundle."""
+
+
+def _encode_model(parsed_msg: ParsedMsg) -> bytes:
+    model = {
+        "fields": [list(field) for field in parsed_msg.fields],
+        "constants": [list(const) for const in parsed_msg.constants],
+    }
+    return json.dumps(model, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_model(data: bytes) -> ParsedMsg:
+    model = json.loads(data)
+    return ParsedMsg(
+        fields=[Field(*field) for field in model["fields"]],
+        constants=[Constant(*const) for const in model["constants"]],
+    )
+
+
+def iter_package_msgs(
+    package_name: str, package_path: Path
+) -> Iterator[Tuple[str, str]]:
+    """Yields ('pkg/Msg', content) for every .msg file of a package directory."""
+    msg_dir = package_path / "msg"
+    msg_files = sorted(msg_dir.glob("*.msg")) if msg_dir.is_dir() else []
+    if not msg_files:
+        # Some packages keep their .msg files in the package root.
+        msg_files = sorted(package_path.glob("*.msg"))
+    for msg_file in msg_files:
+        yield f"{package_name}/{msg_file.stem}", msg_file.read_text(encoding="utf-8")
+
+
+def build_bundle(path: Union[str, Path], messages: Iterable[Tuple[str, str]]) -> int:
+    """Writes a bundle containing the given ('pkg/Msg', content) pairs.
+
+    Each definition is parsed once at build time and stored alongside its
+    text, so loading a bundle never re-parses. The file is written next to
+    `path` and renamed into place, so processes that have the previous bundle
+    mapped are not affected. Returns the message count.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    index: Dict[str, list] = {}
+
+    with atomic_write(path, binary=True) as f:
+        _write_bundle(f, messages, index)
+    return len(index)
+
+
+def _write_bundle(f, messages: Iterable[Tuple[str, str]], index: Dict[str, list]):
+    """Streams records to `f`, filling in `index`, then writes index and header."""
+    f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0))
+    for msg_type, content in messages:
+        definition = content.encode("utf-8")
+        model = _encode_model(parse_msg_content(content))
+        offset = f.tell()
+        f.write(definition)
+        f.write(model)
+        index[msg_type] = [
+            offset,
+            len(definition),
+            offset + len(definition),
+            len(model),
+        ]
+
+    index_data = json.dumps(index, sort_keys=True).encode("utf-8")
+    index_offset = f.tell()
+    f.write(index_data)
+    f.seek(0)
+    f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, index_offset, len(index_data)))
+
+
+class MessageBundle:
+    """A read-only, memory-mapped bundle of message definitions.
+
+    Only the header and index are read when the bundle is opened; definitions
+    and pre-parsed models are sliced out of the mapping on demand. Decoded
+    models are kept in `parsed_cache` (the 4096 most recently used by default).
+    """
+
+    def __init__(self, path: Union[str, Path], parsed_cache: Optional[LRUCache] = None):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise BundleError(f"'{self.path}' is empty, not an r2pb bundle")
+
+        try:
+            self._index = self._read_index()
+        except BaseException:
+            self.close()
+            raise
+        self._parsed = (
+            parsed_cache if parsed_cache is not None else LRUCache(max_entries=4096)
+        )
+
+    def _read_index(self) -> Dict[str, list]:
+        if len(self._map) < _HEADER.size:
+            raise BundleError(f"'{self.path}' is too short to be an r2pb bundle")
+        magic, version, index_offset, index_length = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise BundleError(f"'{self.path}' is not an r2pb bundle")
+        if version != FORMAT_VERSION:
+            raise BundleError(
+                f"'{self.path}' has bundle format {version}, "
+                f"expected {FORMAT_VERSION}"
+            )
+        if index_offset + index_length > len(self._map):
+            raise BundleError(f"'{self.path}' is truncated")
+        return json.loads(self._map[index_offset : index_offset + index_length])
+
+    def __contains__(self, msg_type: str) -> bool:
+        return msg_type in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self._index))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_content(self, package_name: str, msg_name: str) -> Optional[str]:
+        """Returns the .msg text of a message, or None if it is not bundled."""
+        entry = self._index.get(f"{package_name}/{msg_name}")
+        if entry is None:
+            return None
+        offset, length = entry[0], entry[1]
+        return self._map[offset : offset + length].decode("utf-8")
+
+    def get_parsed(self, package_name: str, msg_name: str) -> Optional[ParsedMsg]:
+        """Returns the pre-parsed model of a message, or None if not bundled."""
+        msg_type = f"{package_name}/{msg_name}"
+        parsed_msg = self._parsed.get(msg_type)
+        if parsed_msg is None:
+            entry = self._index.get(msg_type)
+            if entry is None:
+                return None
+            offset, length = entry[2], entry[3]
+            parsed_msg = _decode_model(self._map[offset : offset + length])
+            self._parsed.put(msg_type, parsed_msg)
+        return parsed_msg
+
+    def cache_stats(self) -> CacheStats:
+        return self._parsed.stats()
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self) -> "MessageBundle":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,244 @@
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Union
+
+from .locking import FileLock, atomic_write
+
+
+def approximate_size(obj: Any) -> int:
+    """Estimates the memory held by `obj`, following containers recursively."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item) for item in obj)
+    return size
+
+
+class CacheStats(NamedTuple):
+    """A snapshot of an `LRUCache`'s size and effectiveness."""
+
+    entries: int
+    bytes: int
+    hits: int
+    misses: int
+    evictions: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache:
+    """A thread-safe mapping bounded by entry count and approximate bytes.
+
+    The least recently used entries are evicted once either limit is
+    exceeded; a limit of None means unbounded. Values larger than `max_bytes`
+    on their own are not cached at all. `sizeof` measures keys plus values and
+    defaults to `approximate_size`.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = approximate_size,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any):
+        size = self._sizeof(key) + self._sizeof(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (value, size)
+            self._bytes += size
+            while (
+                self.max_entries is not None and len(self._data) > self.max_entries
+            ) or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            self._bytes -= item[1]
+            return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                entries=len(self._data),
+                bytes=self._bytes,
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+            )
+
+
+# Exception types a negative cache entry may be replayed as.
+_CACHEABLE_ERRORS = {
+    "KeyError": KeyError,
+    "FileNotFoundError": FileNotFoundError,
+}
+
+
+def _is_valid_entry(entry: Any) -> bool:
+    """Whether a persisted entry has everything `check` relies on."""
+    return (
+        isinstance(entry, dict)
+        and entry.get("error") in _CACHEABLE_ERRORS
+        and isinstance(entry.get("message"), str)
+        and isinstance(entry.get("expires"), (int, float))
+        and not isinstance(entry["expires"], bool)
+    )
+
+
+class NegativeCache:
+    """Remembers lookups that could not be resolved, with a time-to-live.
+
+    A cached failure is replayed by `check` as the original exception type and
+    message, so repeated lookups of a missing package or message fail fast
+    instead of repeating the whole fetch path. Entries live in memory for the
+    session and, when `path` is given, are also persisted to a JSON file shared
+    between runs. At most `max_entries` entries are kept in memory.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 600.0,
+        path: Optional[Union[str, Path]] = None,
+        clock: Callable[[], float] = time.time,
+        max_entries: Optional[int] = 10000,
+    ):
+        self.ttl = ttl
+        self.path = Path(path) if path is not None else None
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = LRUCache(max_entries=max_entries)
+        for key, entry in self._load().items():
+            self._entries.put(key, entry)
+
+    def check(self, key: str):
+        """Raises the cached error for `key` if a fresh entry exists."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if entry["expires"] <= self._clock():
+                self._entries.pop(key)
+                return
+        raise _CACHEABLE_ERRORS[entry["error"]](entry["message"])
+
+    def record(self, key: str, error: Exception):
+        """Caches `error` as the result of looking up `key`."""
+        error_name = type(error).__name__
+        if error_name not in _CACHEABLE_ERRORS or self.ttl <= 0:
+            return
+        message = error.args[0] if error.args else str(error)
+        entry = {
+            "error": error_name,
+            "message": message,
+            "expires": self._clock() + self.ttl,
+        }
+        with self._lock:
+            self._entries.put(key, entry)
+            self._save({key: entry})
+
+    def invalidate(self, key: Optional[str] = None):
+        """Drops the entry for `key`, or every entry when no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._save(removed=key, clear=key is None)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry["expires"] > self._clock()
+
+    def stats(self) -> CacheStats:
+        return self._entries.stats()
+
+    def _load(self) -> Dict[str, dict]:
+        if self.path is None or not self.path.is_file():
+            return {}
+        try:
+            entries = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            # A corrupt or unreadable cache file is treated as empty.
+            return {}
+        if not isinstance(entries, dict):
+            return {}
+        now = self._clock()
+        # Malformed entries are skipped like expired ones.
+        return {
+            key: entry
+            for key, entry in entries.items()
+            if _is_valid_entry(entry) and entry["expires"] > now
+        }
+
+    def _save(
+        self,
+        updates: Optional[Dict[str, dict]] = None,
+        removed: Optional[str] = None,
+        clear: bool = False,
+    ):
+        """Merges changes into the on-disk file, replacing it atomically.
+
+        The read-merge-write cycle runs under a file lock so that processes
+        sharing the cache directory do not drop each other's entries.
+        """
+        if self.path is None:
+            return
+        with FileLock(self.path.with_name(self.path.name + ".lock")):
+            entries = {} if clear else self._load()
+            if removed is not None:
+                entries.pop(removed, None)
+            entries.update(updates or {})
+
+            with atomic_write(self.path) as f:
+                json.dump(entries, f, indent=2, sort_keys=True)
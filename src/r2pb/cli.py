@@ -1,19 +1,238 @@
 import argparse
+import itertools
 import sys
 import traceback
+from .bundle import build_bundle, iter_package_msgs
+from .cache import NegativeCache
+from .artifacts import open_artifact_store
 from .converter import Converter
+from .parser import MsgParser
+from .sharding import load_plan, merge_shards, parse_shard, write_plan
 from git import GitCommandError
 
 
+def _exit_with_error(action: str):
+    """Reports the exception being handled and exits with status 1."""
+    e = sys.exc_info()[1]
+    if isinstance(e, GitCommandError):
+        print(f"\nGit command failed: {e}", file=sys.stderr)
+        print(
+            "Please ensure that Git is installed and accessible in your system's PATH.",
+            file=sys.stderr,
+        )
+    else:
+        print(f"\nAn unexpected error occurred during {action}:", file=sys.stderr)
+        traceback.print_exc()
+    print(f"{action[0].upper()}{action[1:]} failed.", file=sys.stderr)
+    sys.exit(1)
+
+
+def bundle_main(argv):
+    """Entry point for `r2pb bundle build|use`."""
+    parser = argparse.ArgumentParser(
+        prog="r2pb bundle",
+        description="Build or use a prebuilt, memory-mapped message bundle.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser(
+        "build", help="Pack the messages of one or more packages into a bundle."
+    )
+    build.add_argument("output", type=str, help="The bundle file to write.")
+    build.add_argument(
+        "packages",
+        type=str,
+        nargs="+",
+        help="The ROS packages to include (e.g., std_msgs geometry_msgs).",
+    )
+    build.add_argument(
+        "-p",
+        "--package-path",
+        type=str,
+        action="append",
+        default=[],
+        help="A local directory containing ROS packages. May be repeated.",
+    )
+
+    use = subparsers.add_parser(
+        "use", help="Convert a message, resolving types from a bundle first."
+    )
+    use.add_argument("bundle", type=str, help="The bundle file to use.")
+    use.add_argument(
+        "msg_type",
+        type=str,
+        help="The ROS message type to convert (e.g., std_msgs/String).",
+    )
+    use.add_argument(
+        "-o",
+        "--output-dir",
+        type=str,
+        default=".",
+        help="The directory where the .proto files will be saved.",
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        try:
+            msg_parser = MsgParser(local_package_paths=args.package_path)
+
+            def package_msgs(package):
+                package_path = msg_parser.find_package_path(package)
+                # Fetched repositories may be pulled by other processes.
+                with msg_parser.fetcher.reading(package_path):
+                    yield from iter_package_msgs(package, package_path)
+
+            messages = itertools.chain.from_iterable(
+                package_msgs(package) for package in args.packages
+            )
+            count = build_bundle(args.output, messages)
+            print(f"Wrote {count} messages to {args.output}")
+        except Exception:
+            _exit_with_error("bundle build")
+    else:
+        try:
+            converter = Converter(bundles=[args.bundle])
+            converter.convert(args.msg_type, args.output_dir)
+            print("\nConversion finished successfully.")
+        except Exception:
+            _exit_with_error("conversion")
+
+
+def mcap_main(argv):
+    """Entry point for `r2pb mcap`."""
+    parser = argparse.ArgumentParser(
+        prog="r2pb mcap",
+        description="Convert a ROS MCAP recording to a protobuf-encoded MCAP file.",
+    )
+    parser.add_argument("input", type=str, help="The ros1msg/ros2msg MCAP file.")
+    parser.add_argument("output", type=str, help="The protobuf MCAP file to write.")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=0,
+        help="Worker processes used to transcode chunks (0 converts in-process).",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1024 * 1024,
+        help="Target size in bytes of the output chunks.",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=["zstd", "lz4", "none"],
+        default="zstd",
+        help="Compression of the output chunks.",
+    )
+
+    args = parser.parse_args(argv)
+
+    try:
+        from .mcap_convert import convert_mcap
+
+        stats = convert_mcap(
+            args.input,
+            args.output,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            compression=args.compression,
+        )
+        print(
+            f"Wrote {stats.messages} messages ({stats.translated} transcoded) "
+            f"on {stats.channels} channels to {args.output}"
+        )
+    except Exception:
+        _exit_with_error("MCAP conversion")
+
+
+def merge_main(argv):
+    """Entry point for `r2pb merge`."""
+    parser = argparse.ArgumentParser(
+        prog="r2pb merge",
+        description="Validate the outputs of a sharded conversion and combine them.",
+    )
+    parser.add_argument("output_dir", type=str, help="The merged output directory.")
+    parser.add_argument(
+        "shard_dirs",
+        type=str,
+        nargs="+",
+        help="The output directories of all shards (e.g., out-1 out-2).",
+    )
+
+    args = parser.parse_args(argv)
+
+    try:
+        count = merge_shards(args.shard_dirs, args.output_dir)
+        print(f"Merged {count} messages into {args.output_dir}")
+    except Exception:
+        _exit_with_error("merge")
+
+
+def plan_main(argv):
+    """Entry point for `r2pb plan`."""
+    parser = argparse.ArgumentParser(
+        prog="r2pb plan",
+        description="Compute the shard assignment of a conversion once, for all "
+        "nodes (see --shard-plan).",
+    )
+    parser.add_argument("plan", type=str, help="The plan file to write.")
+    parser.add_argument(
+        "msg_type",
+        type=str,
+        nargs="+",
+        help="The ROS message type(s) to convert (e.g., std_msgs/String).",
+    )
+    parser.add_argument(
+        "-n", "--shards", type=int, required=True, help="The number of shards."
+    )
+
+    args = parser.parse_args(argv)
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+
+    try:
+        plan = Converter().plan_shards(args.msg_type, args.shards)
+        write_plan(args.plan, plan)
+        sizes = ", ".join(
+            str(len(plan.owned(index))) for index in range(1, plan.count + 1)
+        )
+        print(f"Planned {len(plan.assignment)} messages ({sizes}) in {args.plan}")
+    except Exception:
+        _exit_with_error("planning")
+
+
+def _shard_arg(spec: str):
+    try:
+        return parse_shard(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+# Subcommands dispatched before the default "convert a message" interface.
+SUBCOMMANDS = {
+    "bundle": bundle_main,
+    "mcap": mcap_main,
+    "merge": merge_main,
+    "plan": plan_main,
+}
+
+
 def main():
     """Main function for the r2pb command-line interface."""
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         description="r2pb: ROS .msg to Protobuf .proto converter."
     )
     parser.add_argument(
         "msg_type",
         type=str,
-        help="The ROS message type to convert (e.g., std_msgs/String).",
+        nargs="+",
+        help="The ROS message type(s) to convert (e.g., std_msgs/String).",
     )
     parser.add_argument(
         "-o",
@@ -22,6 +241,22 @@ def main():
         default=".",
         help="The directory where the .proto files will be saved.",
     )
+    parser.add_argument(
+        "--shard",
+        type=_shard_arg,
+        default=None,
+        metavar="i/N",
+        help="Only convert shard i of N of the dependency closure and write a "
+        "manifest for `r2pb merge`.",
+    )
+    parser.add_argument(
+        "--shard-plan",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Use the assignment written by `r2pb plan` instead of parsing the "
+        "whole dependency closure on this node (requires --shard).",
+    )
     parser.add_argument(
         "-d",
         "--ros-distro",
@@ -29,29 +264,70 @@ def main():
         default="noetic",
         help="The ROS distribution to use (e.g., noetic, melodic).",
     )
+    parser.add_argument(
+        "--descriptor-set",
+        type=str,
+        default=None,
+        help="Also write a serialized FileDescriptorSet to this file "
+        "(requires the 'protobuf' package).",
+    )
+    parser.add_argument(
+        "--artifact-cache",
+        type=str,
+        default=None,
+        metavar="DIR_OR_URL",
+        help="Reuse generated .proto files from a content-addressed cache in a "
+        "local directory or behind an HTTP URL.",
+    )
+    parser.add_argument(
+        "--negative-cache",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Persist unresolvable packages and messages to this file so that "
+        "later runs fail fast on them.",
+    )
+    parser.add_argument(
+        "--negative-cache-ttl",
+        type=float,
+        default=600.0,
+        metavar="SECONDS",
+        help="How long an unresolvable package or message stays cached.",
+    )
+    parser.add_argument(
+        "--clear-negative-cache",
+        action="store_true",
+        help="Invalidate the negative cache before converting.",
+    )
 
     args = parser.parse_args()
+    if args.shard_plan and args.shard is None:
+        parser.error("--shard-plan requires --shard")
 
-    print(f"Converting {args.msg_type} for ROS {args.ros_distro}...")
+    print(f"Converting {', '.join(args.msg_type)} for ROS {args.ros_distro}...")
     print(f"Output directory: {args.output_dir}")
 
     try:
-        converter = Converter(ros_distro=args.ros_distro)
-        converter.convert(args.msg_type, args.output_dir)
-        print("\nConversion finished successfully.")
-    except GitCommandError as e:
-        print(f"\nGit command failed: {e}", file=sys.stderr)
-        print(
-            "Please ensure that Git is installed and accessible in your system's PATH.",
-            file=sys.stderr,
+        negative_cache = NegativeCache(
+            ttl=args.negative_cache_ttl, path=args.negative_cache
+        )
+        if args.clear_negative_cache:
+            negative_cache.invalidate()
+        artifact_store = (
+            open_artifact_store(args.artifact_cache) if args.artifact_cache else None
         )
-        print("Conversion failed.", file=sys.stderr)
-        sys.exit(1)
+        converter = Converter(
+            ros_distro=args.ros_distro,
+            negative_cache=negative_cache,
+            artifact_store=artifact_store,
+        )
+        plan = load_plan(args.shard_plan) if args.shard_plan else None
+        converter.convert(args.msg_type, args.output_dir, shard=args.shard, plan=plan)
+        if args.descriptor_set:
+            converter.write_descriptor_set(args.msg_type, args.descriptor_set)
+        print("\nConversion finished successfully.")
     except Exception:
-        print(f"\nAn unexpected error occurred during conversion:", file=sys.stderr)
-        traceback.print_exc()
-        print("Conversion failed.", file=sys.stderr)
-        sys.exit(1)
+        _exit_with_error("conversion")
 
 
 if __name__ == "__main__":
@@ -1,60 +1,348 @@
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 from collections import deque
-from typing import List, Set
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
 
-from .parser import MsgParser
-from .generator import ProtoGenerator
+from .cache import CacheStats, LRUCache, NegativeCache
+from .parser import MsgParser, ParsedMsg, parse_msg_content
+from .generator import ProtoGenerator, collect_dependencies
+from .locking import atomic_write
+from .sharding import Shard, ShardError, ShardPlan, make_plan, write_manifest
+
+# Default budget for generated results kept by a Converter.
+DEFAULT_RESULTS_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ConvertedMsg(NamedTuple):
+    """One generated .proto file, as yielded by `Converter.iter_convert`."""
+
+    msg_type: str
+    proto_text: str
+    dependencies: List[str]
 
 
 class Converter:
-    """The main class for converting ROS messages to Protobuf files."""
+    """The main class for converting ROS messages to Protobuf files.
 
-    def __init__(self, ros_distro: str = "noetic"):
+    A single instance may be shared between threads. Generated results are
+    cached across calls in `results_cache` (an LRUCache bounded to
+    DEFAULT_RESULTS_CACHE_BYTES by default), and concurrent requests for the
+    same message wait on one in-flight parse instead of repeating it.
+    """
+
+    def __init__(
+        self,
+        ros_distro: str = "noetic",
+        negative_cache: Optional[NegativeCache] = None,
+        bundles: Optional[List[str]] = None,
+        artifact_store=None,
+        results_cache: Optional[LRUCache] = None,
+    ):
         # self._parser = MsgParser(ros_distro=ros_distro)
-        self._parser = MsgParser()
+        self._parser = MsgParser(negative_cache=negative_cache, bundles=bundles)
         self._generator = ProtoGenerator()
-        self._processed_messages = set()
+        # Optional content-addressed store (see r2pb.artifacts) consulted before
+        # parsing or rendering each message.
+        self._artifact_store = artifact_store
+        # Parts of every artifact key, computed on first use.
+        self._template_hash: Optional[str] = None
+        self._r2pb_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._results = (
+            results_cache
+            if results_cache is not None
+            else LRUCache(max_bytes=DEFAULT_RESULTS_CACHE_BYTES)
+        )
+        self._in_flight: Dict[str, Future] = {}
 
-    def convert(self, top_level_msg_type: str, output_dir: str):
+    def convert(
+        self,
+        top_level_msg_type: Union[str, List[str]],
+        output_dir: str,
+        shard: Optional[Shard] = None,
+        plan: Optional[ShardPlan] = None,
+    ):
         """
-        Converts a top-level ROS message and its dependencies to .proto.
+        Converts top-level ROS messages and their dependencies to .proto.
 
         Args:
-            top_level_msg_type: The top-level message to convert (e.g., 'std_msgs/String').
+            top_level_msg_type: The top-level message(s) to convert
+                (e.g., 'std_msgs/String').
             output_dir: The directory where .proto files will be saved.
+            shard: Only convert this shard's part of the dependency closure
+                and record it in a manifest; see `r2pb.sharding`.
+            plan: A precomputed `plan_shards` result for the same messages.
+                With it, only the shard's own messages are parsed; without
+                it, the whole closure is parsed to compute the assignment.
         """
         output_path = Path(output_dir)
-        queue = deque([top_level_msg_type])
+        roots = (
+            [top_level_msg_type]
+            if isinstance(top_level_msg_type, str)
+            else list(top_level_msg_type)
+        )
+        if shard is not None:
+            self._convert_shard(roots, output_path, shard, plan)
+            return
+
+        queue = deque(roots)
+        visited: Set[str] = set()
 
         while queue:
             msg_type = queue.popleft()
-            if msg_type in self._processed_messages:
+            if msg_type in visited:
                 continue
+            visited.add(msg_type)
 
-            print(f"Processing {msg_type}...")
-            try:
-                package_name, msg_name = msg_type.split("/")
-                parsed_msg = self._parser.parse(package_name, msg_name)
+            dependencies = self._convert_one(output_path, msg_type)
+            for dep in dependencies:
+                if dep not in visited:
+                    queue.append(dep)
 
-                proto_content, dependencies = self._generator.generate_proto(
-                    parsed_msg, package_name=package_name, msg_name=msg_name
-                )
+    def iter_convert(
+        self, top_level_msg_type: Union[str, List[str]]
+    ) -> Iterator[ConvertedMsg]:
+        """
+        Lazily generates top-level ROS messages and their dependencies.
+
+        Every message is yielded once, after all of its dependencies, so a
+        consumer can load or forward each record as it arrives. Work happens
+        only when the next record is requested, nothing is written or printed,
+        and results are not added to the converter's cache: besides the names
+        of the messages already yielded, only the messages on the path from
+        the current root are held.
+
+        Args:
+            top_level_msg_type: The top-level message(s) to convert
+                (e.g., 'std_msgs/String').
+
+        Raises:
+            ValueError: If the messages depend on each other in a cycle.
+        """
+        roots = (
+            [top_level_msg_type]
+            if isinstance(top_level_msg_type, str)
+            else list(top_level_msg_type)
+        )
+        emitted: Set[str] = set()
+
+        for root in roots:
+            if root in emitted:
+                continue
+            stack = [(root, *self._generate(root))]
+            pending = [iter(stack[0][2])]
+            while stack:
+                for dep in pending[-1]:
+                    if dep in emitted:
+                        continue
+                    if any(dep == entry[0] for entry in stack):
+                        raise ValueError(
+                            f"Circular dependency: {dep} is required by {stack[-1][0]}"
+                        )
+                    stack.append((dep, *self._generate(dep)))
+                    pending.append(iter(stack[-1][2]))
+                    break
+                else:
+                    msg_type, proto_text, dependencies = stack.pop()
+                    pending.pop()
+                    emitted.add(msg_type)
+                    yield ConvertedMsg(msg_type, proto_text, dependencies)
+
+    def plan_shards(self, roots: List[str], count: int) -> ShardPlan:
+        """Computes the dependency graph of `roots` and its shard assignment.
+
+        The plan can be saved with `r2pb.sharding.write_plan` and passed to
+        `convert` on every node.
+        """
+        return make_plan(roots, self.dependency_graph(roots), count)
+
+    def _convert_shard(
+        self,
+        roots: List[str],
+        output_path: Path,
+        shard: Shard,
+        plan: Optional[ShardPlan],
+    ):
+        """Converts the messages assigned to `shard` and writes its manifest."""
+        parsed: Dict[str, ParsedMsg] = {}
+        if plan is None:
+            plan = make_plan(roots, self.dependency_graph(roots, parsed), shard.count)
+        elif plan.roots != sorted(set(roots)) or plan.count != shard.count:
+            raise ShardError(
+                f"The shard plan is for {', '.join(plan.roots)} in {plan.count} "
+                f"shards, not {', '.join(sorted(set(roots)))} in {shard.count}"
+            )
+        owned = plan.owned(shard.index)
+        print(f"Shard {shard}: {len(owned)} of {len(plan.assignment)} messages")
+
+        converted = {}
+        for msg_type in owned:
+            # Messages parsed by the graph pass are not parsed again.
+            converted[msg_type] = self._convert_one(
+                output_path, msg_type, parsed.pop(msg_type, None)
+            )
+        manifest = write_manifest(output_path, shard, roots, converted)
+        print(f"Wrote {manifest}")
 
+    def _convert_one(
+        self, output_path: Path, msg_type: str, parsed_msg: Optional[ParsedMsg] = None
+    ) -> List[str]:
+        """Generates and writes one message, returning its dependencies.
+
+        `parsed_msg` may supply the message if it has already been parsed.
+        """
+        print(f"Processing {msg_type}...")
+        try:
+            package_name, msg_name = msg_type.split("/")
+            if self._artifact_store is not None:
+                dependencies = self._convert_with_artifacts(
+                    output_path, package_name, msg_name, parsed_msg
+                )
+            else:
+                proto_content, dependencies = self._get_or_generate(
+                    msg_type, parsed_msg
+                )
                 self._write_proto_file(
                     output_path, package_name, msg_name, proto_content
                 )
 
-                for dep in dependencies:
-                    if dep not in self._processed_messages:
-                        queue.append(dep)
+            print(f"Successfully converted {msg_type}")
+            return dependencies
+
+        except Exception as e:
+            print(f"Failed to convert {msg_type}: {e}")
+            # Re-raise the exception to halt the entire conversion process
+            raise
 
-                self._processed_messages.add(msg_type)
-                print(f"Successfully converted {msg_type}")
+    def _convert_with_artifacts(
+        self,
+        output_path: Path,
+        package_name: str,
+        msg_name: str,
+        parsed_msg: Optional[ParsedMsg] = None,
+    ) -> List[str]:
+        """Restores a message from the artifact store, or generates and stores it.
 
-            except Exception as e:
-                print(f"Failed to convert {msg_type}: {e}")
-                # Re-raise the exception to halt the entire conversion process
-                raise
+        Only the .msg text is needed to compute the key, so a hit skips parsing
+        and rendering; the stored metadata supplies the dependencies. A miss is
+        generated through the results cache like any other conversion.
+        """
+        from .artifacts import artifact_key, r2pb_version, template_digest
+
+        if self._template_hash is None:
+            self._r2pb_version = r2pb_version()
+            self._template_hash = template_digest(self._generator)
+        msg_type = f"{package_name}/{msg_name}"
+        msg_content = self._parser.find_msg_file_content(package_name, msg_name)
+        key = artifact_key(
+            msg_type, msg_content, self._template_hash, self._r2pb_version
+        )
+
+        package_dir = output_path / package_name
+        package_dir.mkdir(parents=True, exist_ok=True)
+        file_path = package_dir / f"{msg_name}.proto"
+        dependencies = self._artifact_store.materialize(key, file_path)
+        if dependencies is not None:
+            print(f"Restored {file_path} from the artifact cache")
+            return dependencies
+
+        if parsed_msg is None:
+            parsed_msg = parse_msg_content(msg_content)
+        proto_content, dependencies = self._get_or_generate(msg_type, parsed_msg)
+        self._write_proto_file(output_path, package_name, msg_name, proto_content)
+        self._artifact_store.put(key, msg_type, proto_content, dependencies)
+        return dependencies
+
+    def dependency_graph(
+        self, roots: List[str], parsed: Optional[Dict[str, ParsedMsg]] = None
+    ) -> Dict[str, List[str]]:
+        """Maps every message in the closure of `roots` to its dependencies.
+
+        Only parses messages; nothing is generated or written. The parsed
+        messages are also stored in `parsed`, if given, for reuse.
+        """
+        graph: Dict[str, List[str]] = {}
+        queue = deque(roots)
+        while queue:
+            msg_type = queue.popleft()
+            if msg_type in graph:
+                continue
+            package_name, msg_name = msg_type.split("/")
+            parsed_msg = self._parser.parse(package_name, msg_name)
+            graph[msg_type] = collect_dependencies(parsed_msg.fields, package_name)
+            if parsed is not None:
+                parsed[msg_type] = parsed_msg
+            queue.extend(graph[msg_type])
+        return graph
+
+    def _get_or_generate(
+        self, msg_type: str, parsed_msg: Optional[ParsedMsg] = None
+    ) -> Tuple[str, List[str]]:
+        """Returns the cached .proto content and dependencies for a message.
+
+        The first caller for a message does the work, rendering `parsed_msg`
+        if given instead of parsing; callers arriving while it is in flight
+        wait for that result. Failures are not cached.
+        """
+        with self._lock:
+            result = self._results.get(msg_type)
+            if result is not None:
+                return result
+            future = self._in_flight.get(msg_type)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._in_flight[msg_type] = future
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            result = self._generate(msg_type, parsed_msg)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[msg_type]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._results.put(msg_type, result)
+            del self._in_flight[msg_type]
+        future.set_result(result)
+        return result
+
+    def cache_stats(self) -> Dict[str, CacheStats]:
+        """Returns statistics for every in-memory cache the converter uses."""
+        return {"results": self._results.stats(), **self._parser.cache_stats()}
+
+    def _generate(
+        self, msg_type: str, parsed_msg: Optional[ParsedMsg] = None
+    ) -> Tuple[str, List[str]]:
+        """Parses (unless given) and renders one message, bypassing the cache."""
+        package_name, msg_name = msg_type.split("/")
+        if parsed_msg is None:
+            parsed_msg = self._parser.parse(package_name, msg_name)
+        return self._generator.generate_proto(
+            parsed_msg, package_name=package_name, msg_name=msg_name
+        )
+
+    def write_descriptor_set(self, top_level_msg_type: str, path: str) -> Path:
+        """
+        Writes a FileDescriptorSet for a message and its dependencies.
+
+        The set is built directly from the parsed messages, so no protoc run is
+        needed to obtain descriptors. Requires the 'protobuf' package.
+
+        Args:
+            top_level_msg_type: The top-level message (e.g., 'std_msgs/String').
+            path: The file the serialized FileDescriptorSet is written to.
+        """
+        from .descriptor import DescriptorBuilder
+
+        file_path = DescriptorBuilder(self._parser).write_set(top_level_msg_type, path)
+        print(f"Wrote {file_path}")
+        return file_path
 
     def _write_proto_file(
         self, output_dir: Path, package_name: str, msg_name: str, content: str
@@ -63,5 +351,8 @@ class Converter:
         package_dir = output_dir / package_name
         package_dir.mkdir(parents=True, exist_ok=True)
         file_path = package_dir / f"{msg_name}.proto"
-        file_path.write_text(content, encoding="utf-8")
+        # Threads converting overlapping closures never observe a partially
+        # written file.
+        with atomic_write(file_path) as f:
+            f.write(content)
         print(f"Wrote {file_path}")
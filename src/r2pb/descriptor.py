@@ -0,0 +1,202 @@
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from .cache import LRUCache
+from .parser import ParsedMsg, MsgParser
+from .generator import (
+    WELL_KNOWN_TYPE_FILES,
+    collect_dependencies,
+    convert_fields,
+    well_known_imports,
+)
+
+try:
+    from google.protobuf import (
+        descriptor_pb2,
+        descriptor_pool,
+        duration_pb2,
+        message_factory,
+        timestamp_pb2,
+    )
+except ImportError:  # pragma: no cover - exercised only without protobuf
+    descriptor_pb2 = None
+
+
+def _require_protobuf():
+    if descriptor_pb2 is None:
+        raise ImportError(
+            "Building descriptors requires the 'protobuf' package. "
+            "Install it with: pip install r2pb[descriptor]"
+        )
+
+
+_SCALAR_FIELD_TYPES = {
+    "bool": "TYPE_BOOL",
+    "bytes": "TYPE_BYTES",
+    "double": "TYPE_DOUBLE",
+    "float": "TYPE_FLOAT",
+    "int32": "TYPE_INT32",
+    "int64": "TYPE_INT64",
+    "string": "TYPE_STRING",
+    "uint32": "TYPE_UINT32",
+    "uint64": "TYPE_UINT64",
+}
+
+
+def _well_known_file(file_name: str):
+    module = {
+        "google/protobuf/timestamp.proto": timestamp_pb2,
+        "google/protobuf/duration.proto": duration_pb2,
+    }[file_name]
+    return descriptor_pb2.FileDescriptorProto.FromString(
+        module.DESCRIPTOR.serialized_pb
+    )
+
+
+def build_file_descriptor(parsed_msg: ParsedMsg, package_name: str, msg_name: str):
+    """Builds the FileDescriptorProto equivalent of the generated .proto file.
+
+    Fields come from the same `convert_fields` mapping `ProtoGenerator`
+    renders, so descriptors and .proto text can be used interchangeably.
+    """
+    _require_protobuf()
+    FieldProto = descriptor_pb2.FieldDescriptorProto
+
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name=f"{package_name}/{msg_name}.proto",
+        package=package_name,
+        syntax="proto3",
+    )
+    message = file_proto.message_type.add(name=msg_name)
+    proto_fields = convert_fields(parsed_msg.fields, package_name)
+    imports = [
+        f"{dep}.proto" for dep in collect_dependencies(parsed_msg.fields, package_name)
+    ] + well_known_imports(proto_fields)
+
+    for number, field in enumerate(proto_fields, start=1):
+        field_proto = message.field.add(
+            name=field.name, number=number, label=FieldProto.LABEL_OPTIONAL
+        )
+        if field.label == "repeated":
+            field_proto.label = FieldProto.LABEL_REPEATED
+        if field.options == "packed = true":
+            field_proto.options.packed = True
+
+        if field.proto_type in _SCALAR_FIELD_TYPES:
+            field_proto.type = getattr(
+                FieldProto, _SCALAR_FIELD_TYPES[field.proto_type]
+            )
+        elif field.proto_type in WELL_KNOWN_TYPE_FILES:
+            field_proto.type = FieldProto.TYPE_MESSAGE
+            field_proto.type_name = f".{field.proto_type}"
+        else:
+            field_proto.type = FieldProto.TYPE_MESSAGE
+            field_proto.type_name = f".{field.msg_type.replace('/', '.')}"
+
+    file_proto.dependency.extend(sorted(imports))
+    return file_proto
+
+
+class MessagePool:
+    """A populated descriptor pool whose message classes are created on demand.
+
+    Created classes are kept in `class_cache` (the 4096 most recently used by
+    default).
+    """
+
+    def __init__(self, file_set, class_cache: Optional[LRUCache] = None):
+        _require_protobuf()
+        self.pool = descriptor_pool.DescriptorPool()
+        for file_proto in file_set.file:
+            self.pool.Add(file_proto)
+        self._classes = (
+            class_cache if class_cache is not None else LRUCache(max_entries=4096)
+        )
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path]) -> "MessagePool":
+        """Loads a serialized FileDescriptorSet in a single read."""
+        _require_protobuf()
+        data = Path(path).read_bytes()
+        return cls(descriptor_pb2.FileDescriptorSet.FromString(data))
+
+    def find_message_type(self, full_name: str):
+        """Returns the Descriptor for a name such as 'std_msgs.String'."""
+        return self.pool.FindMessageTypeByName(full_name)
+
+    def get_message_class(self, full_name: str) -> type:
+        """Returns the message class for `full_name`, creating it on first use."""
+        message_class = self._classes.get(full_name)
+        if message_class is None:
+            descriptor = self.find_message_type(full_name)
+            if hasattr(message_factory, "GetMessageClass"):
+                message_class = message_factory.GetMessageClass(descriptor)
+            else:
+                factory = message_factory.MessageFactory(self.pool)
+                message_class = factory.GetPrototype(descriptor)
+            self._classes.put(full_name, message_class)
+        return message_class
+
+
+class DescriptorBuilder:
+    """Builds FileDescriptorSets for ROS messages and their dependencies."""
+
+    def __init__(self, parser: Optional[MsgParser] = None):
+        _require_protobuf()
+        self._parser = parser if parser is not None else MsgParser()
+
+    def build_set(self, msg_types: Union[str, Iterable[str]]):
+        """Builds a FileDescriptorSet covering `msg_types` and all dependencies.
+
+        Files are ordered so that every file follows its dependencies, which is
+        the order expected by `DescriptorPool.Add`.
+        """
+        if isinstance(msg_types, str):
+            msg_types = [msg_types]
+
+        file_set = descriptor_pb2.FileDescriptorSet()
+        added = set()
+
+        def add_file(file_proto):
+            if file_proto.name not in added:
+                added.add(file_proto.name)
+                file_set.file.append(file_proto)
+
+        visited = set()
+        for top_level in msg_types:
+            stack = [(top_level, None)]
+            while stack:
+                msg_type, file_proto = stack.pop()
+                if file_proto is not None:
+                    # All dependencies are in place, emit the file itself.
+                    for dep in file_proto.dependency:
+                        if dep.startswith("google/protobuf/"):
+                            add_file(_well_known_file(dep))
+                    add_file(file_proto)
+                    continue
+                if msg_type in visited:
+                    continue
+                visited.add(msg_type)
+
+                package_name, msg_name = msg_type.split("/")
+                parsed_msg = self._parser.parse(package_name, msg_name)
+                file_proto = build_file_descriptor(parsed_msg, package_name, msg_name)
+                stack.append((msg_type, file_proto))
+                dependencies = collect_dependencies(parsed_msg.fields, package_name)
+                for dep in reversed(dependencies):
+                    if dep not in visited:
+                        stack.append((dep, None))
+        return file_set
+
+    def write_set(
+        self, msg_types: Union[str, Iterable[str]], path: Union[str, Path]
+    ) -> Path:
+        """Serializes the FileDescriptorSet for `msg_types` to `path`."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(self.build_set(msg_types).SerializeToString())
+        return path
+
+    def build_pool(self, msg_types: Union[str, Iterable[str]]) -> MessagePool:
+        """Returns a MessagePool populated with `msg_types` and dependencies."""
+        return MessagePool(self.build_set(msg_types))
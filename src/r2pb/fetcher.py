@@ -1,9 +1,19 @@
+import contextlib
 import os
 import shutil
 import tempfile
+import threading
+import time
 from pathlib import Path
+from typing import Optional
 from git import Repo, GitCommandError
 
+from .cache import NegativeCache
+from .locking import FileLock
+
+# 默认的本地缓存目录
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "r2pb"
+
 # 预设的 ROS 消息仓库
 ROS_MSG_REPOS = {
     "common_msgs": "https://github.com/ros/common_msgs.git",
@@ -13,14 +23,32 @@ ROS_MSG_REPOS = {
 
 
 class RosMsgFetcher:
-    """从远程 Git 仓库获取并缓存 ROS 消息包。"""
-
-    def __init__(self, cache_dir: Path = None):
+    """从远程 Git 仓库获取并缓存 ROS 消息包。
+
+    缓存目录可以被多个进程同时使用：对每个仓库的 git 操作都在文件锁内进行，
+    克隆先写入临时目录再原子重命名。等待锁的进程若发现仓库刚被其他进程更新过
+    （在 `refresh_interval` 秒内），则直接复用，不再重复拉取。`git pull` 会原地
+    改写仓库，因此读取仓库中的文件时应持有 `reading()` 返回的共享锁。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path = None,
+        negative_cache: Optional[NegativeCache] = None,
+        refresh_interval: float = 300.0,
+    ):
         if cache_dir is None:
-            self.cache_dir = Path.home() / ".cache" / "r2pb"
+            self.cache_dir = DEFAULT_CACHE_DIR
         else:
             self.cache_dir = cache_dir
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # 记录无法解析的包，重复查找时直接抛出原始错误。
+        self.negative_cache = (
+            negative_cache if negative_cache is not None else NegativeCache()
+        )
+        self.refresh_interval = refresh_interval
+        # 同一进程内的多个线程共享一个 fetcher 时，串行化对缓存仓库的 git 操作。
+        self._lock = threading.Lock()
 
     def fetch_package(self, package_name: str, repo_url: str) -> Path:
         """
@@ -36,14 +64,19 @@ class RosMsgFetcher:
         repo_name = Path(repo_url).stem
         repo_path = self.cache_dir / repo_name
 
+        lock = FileLock(self._lock_path(repo_name))
         try:
-            if repo_path.exists():
-                print(f"Updating repository: {repo_name}...")
-                repo = Repo(repo_path)
-                repo.remotes.origin.pull()
-            else:
-                print(f"Cloning repository: {repo_name} from {repo_url}...")
-                Repo.clone_from(repo_url, repo_path)
+            with self._lock, lock:
+                self._remove_stale_clones(repo_name)
+                if repo_path.exists():
+                    if not self._is_fresh(repo_name):
+                        print(f"Updating repository: {repo_name}...")
+                        repo = Repo(repo_path)
+                        repo.remotes.origin.pull()
+                        self._mark_fetched(repo_name)
+                else:
+                    self._clone(repo_name, repo_url, repo_path)
+                    self._mark_fetched(repo_name)
         except GitCommandError as e:
             print(f"Error fetching repository {repo_url}: {e}")
             raise
@@ -62,6 +95,53 @@ class RosMsgFetcher:
 
         return package_path
 
+    def reading(self, path: Path):
+        """返回读取 `path` 下文件期间应持有的锁。
+
+        对缓存仓库中的路径返回该仓库的共享锁：多个读取者可以同时持有，
+        但会与 `fetch_package` 中的 git 操作互斥，不会读到更新到一半的文件。
+        不在缓存目录中的路径（如本地包）无需加锁。
+        """
+        try:
+            repo_name = Path(path).relative_to(self.cache_dir).parts[0]
+        except (ValueError, IndexError):
+            return contextlib.nullcontext()
+        return FileLock(self._lock_path(repo_name), shared=True)
+
+    def _lock_path(self, repo_name: str) -> Path:
+        return self.cache_dir / f".{repo_name}.lock"
+
+    def _clone(self, repo_name: str, repo_url: str, repo_path: Path):
+        """克隆到临时目录后原子重命名，避免其他进程看到不完整的仓库。"""
+        print(f"Cloning repository: {repo_name} from {repo_url}...")
+        tmp_path = Path(
+            tempfile.mkdtemp(prefix=f".{repo_name}.", suffix=".tmp", dir=self.cache_dir)
+        )
+        try:
+            Repo.clone_from(repo_url, tmp_path)
+            os.rename(tmp_path, repo_path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    def _remove_stale_clones(self, repo_name: str):
+        """删除被中断的进程遗留的临时克隆目录（调用时须持有该仓库的锁）。"""
+        for tmp_path in self.cache_dir.glob(f".{repo_name}.*.tmp"):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def _stamp_path(self, repo_name: str) -> Path:
+        return self.cache_dir / f".{repo_name}.fetched"
+
+    def _is_fresh(self, repo_name: str) -> bool:
+        try:
+            fetched_at = self._stamp_path(repo_name).stat().st_mtime
+        except FileNotFoundError:
+            return False
+        return time.time() - fetched_at < self.refresh_interval
+
+    def _mark_fetched(self, repo_name: str):
+        self._stamp_path(repo_name).touch()
+
     def find_and_fetch(self, package_name: str) -> Path:
         """
         在预设的仓库中查找并获取一个 ROS 包。
@@ -75,6 +155,15 @@ class RosMsgFetcher:
         Raises:
             KeyError: 如果在任何预设的仓库中都找不到该包。
         """
+        cache_key = f"package:{package_name}"
+        self.negative_cache.check(cache_key)
+        try:
+            return self._find_and_fetch(package_name)
+        except (KeyError, FileNotFoundError) as e:
+            self.negative_cache.record(cache_key, e)
+            raise
+
+    def _find_and_fetch(self, package_name: str) -> Path:
         # 简单的实现：假设包名直接对应仓库名或在 common_msgs 中
         # 更复杂的实现可以查询一个清单文件
         if package_name in ROS_MSG_REPOS:
@@ -2,16 +2,122 @@ from pathlib import Path
 from typing import List, Dict, Any
 from jinja2 import Environment, PackageLoader, select_autoescape
 from .parser import ParsedMsg, Field, Constant, MsgParser  # 引入 MsgParser
-from .mapper import map_ros_to_proto_type
+from .mapper import (
+    ROS_BYTES_ARRAY_TYPES,
+    ROS_PACKABLE_TYPES,
+    ROS_TO_PROTO_TYPE_MAP,
+    map_ros_to_proto_type,
+    resolve_msg_type,
+    split_array_type,
+)
 
 
 class ProtoField:
     """Represents a field in the Protobuf message."""
 
-    def __init__(self, name: str, proto_type: str, package: str = ""):
+    def __init__(
+        self,
+        name: str,
+        proto_type: str,
+        package: str = "",
+        label: str = "",
+        options: str = "",
+        comment: str = "",
+        msg_type: str = "",
+    ):
         self.name = name
         self.proto_type = proto_type
         self.package = package
+        self.label = label
+        self.options = options
+        self.comment = comment
+        # The resolved 'pkg/Msg' for message-typed fields, empty otherwise.
+        self.msg_type = msg_type
+
+
+def _field_msg_type(field_type: str, package_name: str) -> str:
+    """Returns the resolved 'pkg/Msg' a field refers to, or '' for built-ins."""
+    base_type = split_array_type(field_type).base_type
+    if base_type in ROS_TO_PROTO_TYPE_MAP:
+        return ""
+    return resolve_msg_type(base_type, package_name)
+
+
+def collect_dependencies(fields: List[Field], package_name: str) -> List[str]:
+    """Returns the sorted message types referenced by the given fields.
+
+    Unqualified types are resolved against `package_name` ('Header' always
+    means 'std_msgs/Header').
+    """
+    dependencies = set()
+    for field in fields:
+        msg_type = _field_msg_type(field.field_type, package_name)
+        if msg_type:
+            dependencies.add(msg_type)
+    return sorted(dependencies)
+
+
+# Well-known Protobuf types referenced by the ROS type mapping, and the files
+# that define them.
+WELL_KNOWN_TYPE_FILES = {
+    "google.protobuf.Timestamp": "google/protobuf/timestamp.proto",
+    "google.protobuf.Duration": "google/protobuf/duration.proto",
+}
+
+
+def well_known_imports(proto_fields: List[ProtoField]) -> List[str]:
+    """Returns the sorted well-known .proto files the given fields need.
+
+    These are imported alongside the files of `collect_dependencies`, both by
+    the generated .proto text and by `r2pb.descriptor`.
+    """
+    return sorted(
+        {
+            WELL_KNOWN_TYPE_FILES[field.proto_type]
+            for field in proto_fields
+            if field.proto_type in WELL_KNOWN_TYPE_FILES
+        }
+    )
+
+
+def convert_fields(fields: List[Field], package_name: str) -> List[ProtoField]:
+    """Converts ROS message fields to Protobuf fields.
+
+    This is the single source of the field mapping; `ProtoGenerator` renders
+    it and `r2pb.descriptor` builds descriptors from it.
+    """
+    proto_fields = []
+    for field in fields:
+        ros_type = split_array_type(field.field_type)
+        msg_type = _field_msg_type(ros_type.base_type, package_name)
+        package = msg_type.split("/", 1)[0] if msg_type else ""
+
+        proto_type = map_ros_to_proto_type(ros_type.base_type)
+        label = options = comment = ""
+        if ros_type.is_array:
+            if ros_type.base_type in ROS_BYTES_ARRAY_TYPES:
+                # Byte buffers (images, point clouds) go on the wire as one
+                # contiguous length-delimited blob.
+                proto_type = "bytes"
+            else:
+                label = "repeated"
+                if ros_type.base_type in ROS_PACKABLE_TYPES:
+                    options = "packed = true"
+            if ros_type.array_size is not None:
+                comment = f"fixed size: {ros_type.array_size}"
+
+        proto_fields.append(
+            ProtoField(
+                name=field.name,
+                proto_type=proto_type,
+                package=package,
+                label=label,
+                options=options,
+                comment=comment,
+                msg_type=msg_type,
+            )
+        )
+    return proto_fields
 
 
 class ProtoGenerator:
@@ -23,41 +129,17 @@ class ProtoGenerator:
         )
         self.template = self.env.get_template("msg.proto.j2")
 
-    def _collect_dependencies(self, fields: List[Field]) -> List[str]:
-        """Collects required dependencies based on field types."""
-        dependencies = set()
-        for field in fields:
-            if "/" in field.field_type:
-                dependencies.add(field.field_type)
-        return sorted(list(dependencies))
-
-    def _convert_fields(self, fields: List[Field]) -> List[ProtoField]:
-        """Converts ROS message fields to Protobuf fields."""
-        proto_fields = []
-        for field in fields:
-            package = ""
-            ros_type = field.field_type
-            if "/" in ros_type:
-                package, ros_type = ros_type.split("/", 1)
-
-            proto_fields.append(
-                ProtoField(
-                    name=field.name,
-                    proto_type=map_ros_to_proto_type(field.field_type),
-                    package=package,
-                )
-            )
-        return proto_fields
-
     def generate_proto(
         self, parsed_msg: ParsedMsg, package_name: str, msg_name: str
     ) -> (str, List[str]):
         """Generates a .proto file content for a given ROS message."""
-        proto_fields = self._convert_fields(parsed_msg.fields)
-        dependencies = self._collect_dependencies(parsed_msg.fields)
+        proto_fields = convert_fields(parsed_msg.fields, package_name)
+        dependencies = collect_dependencies(parsed_msg.fields, package_name)
 
         # 从依赖项生成导入语句
-        imports = sorted([f"{dep}.proto" for dep in dependencies])
+        imports = sorted(
+            [f"{dep}.proto" for dep in dependencies] + well_known_imports(proto_fields)
+        )
 
         proto_content = self.template.render(
             package_name=package_name,
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+# The umask can only be read by replacing it, so that is done once, at import
+# time, with a restrictive value in case anything is created in between.
+_UMASK = os.umask(0o077)
+os.umask(_UMASK)
+
+
+class LockTimeout(TimeoutError):
+    """Raised when a FileLock cannot be acquired within its timeout."""
+
+
+class FileLock:
+    """An advisory lock on a file, shared between processes.
+
+    The lock is exclusive unless `shared` is set, in which case it may be held
+    by any number of shared holders at once but excludes exclusive ones (a
+    readers-writer lock). Uses flock() on POSIX and msvcrt.locking() on
+    Windows, where shared locks are exclusive as well. Both lock an open file
+    description, so separate FileLock instances also exclude each other
+    within one process. The lock file itself is left in place.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.05,
+        shared: bool = False,
+    ):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.shared = shared
+        self._fd: Optional[int] = None
+
+    @property
+    def is_locked(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self):
+        """Blocks until the lock is held or the timeout expires."""
+        if self._fd is not None:
+            raise RuntimeError(f"Lock {self.path} is already held")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        try:
+            while not self._try_lock(fd, blocking=deadline is None):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise LockTimeout(
+                        f"Timed out after {self.timeout}s waiting for {self.path}"
+                    )
+                time.sleep(self.poll_interval)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self):
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:  # pragma: no cover - Windows
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def _try_lock(self, fd: int, blocking: bool) -> bool:
+        if fcntl is not None:
+            operation = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+            flags = operation if blocking else operation | fcntl.LOCK_NB
+            try:
+                fcntl.flock(fd, flags)
+            except BlockingIOError:
+                return False
+            return True
+
+        # msvcrt has no unbounded blocking mode, so Windows always polls.
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def default_file_mode() -> int:
+    """Returns the permissions open() gives new files under the process umask."""
+    return 0o666 & ~_UMASK
+
+
+@contextmanager
+def atomic_write(
+    path: Union[str, Path], binary: bool = False, mode: Optional[int] = None
+):
+    """Opens a temporary file next to `path` and renames it into place on success.
+
+    Readers see either the previous file or the complete new one, never a
+    partial write. The file gets `mode`, or by default the permissions a plain
+    open() would give it (mkstemp alone creates it owner-only). On error the
+    temporary file is removed and `path` is left untouched.
+    """
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        if binary:
+            f = os.fdopen(fd, "wb")
+        else:
+            f = os.fdopen(fd, "w", encoding="utf-8")
+        with f:
+            yield f
+        os.chmod(tmp_name, default_file_mode() if mode is None else mode)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
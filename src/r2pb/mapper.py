@@ -1,3 +1,6 @@
+import re
+from typing import NamedTuple, Optional
+
 # A mapping from ROS built-in types to Protobuf types
 ROS_TO_PROTO_TYPE_MAP = {
     "bool": "bool",
@@ -19,9 +22,86 @@ ROS_TO_PROTO_TYPE_MAP = {
     "duration": "google.protobuf.Duration",
 }
 
+# ROS array element types that are serialized as a single `bytes` field.
+ROS_BYTES_ARRAY_TYPES = {"uint8", "char"}
+
+# ROS types whose repeated Protobuf counterpart can use packed encoding.
+ROS_PACKABLE_TYPES = {
+    "bool",
+    "byte",
+    "float32",
+    "float64",
+    "int8",
+    "uint8",
+    "int16",
+    "uint16",
+    "int32",
+    "uint32",
+    "int64",
+    "uint64",
+}
+
+# `struct` format codes of the ROS1 serialization of scalar types, without
+# the byte order (ROS1 is little-endian, CDR may be either).
+ROS_STRUCT_CODES = {
+    "bool": "B",
+    "byte": "b",
+    "char": "B",
+    "int8": "b",
+    "uint8": "B",
+    "int16": "h",
+    "uint16": "H",
+    "int32": "i",
+    "uint32": "I",
+    "int64": "q",
+    "uint64": "Q",
+    "float32": "f",
+    "float64": "d",
+}
+
+_ARRAY_TYPE_RE = re.compile(r"^(?P<base>[^\[\]]+)\[(?P<size>\d*)\]$")
+
+
+class RosType(NamedTuple):
+    """A ROS field type split into its element type and array suffix."""
+
+    base_type: str
+    is_array: bool = False
+    array_size: Optional[int] = None
+
+
+def split_array_type(ros_type: str) -> RosType:
+    """Splits a ROS type such as 'float64[36]' into its element type and size.
+
+    Variable-length arrays ('uint8[]') have `is_array` set and no `array_size`.
+    """
+    match = _ARRAY_TYPE_RE.match(ros_type)
+    if match is None:
+        return RosType(ros_type)
+    size = match.group("size")
+    return RosType(match.group("base"), True, int(size) if size else None)
+
+
+def resolve_msg_type(base_type: str, package_name: str) -> str:
+    """Resolves a message field type to 'pkg/Msg' following ROS1 naming rules.
+
+    Unqualified names refer to the enclosing package, except 'Header', which
+    always means 'std_msgs/Header'.
+    """
+    if "/" in base_type:
+        return base_type
+    if base_type == "Header":
+        return "std_msgs/Header"
+    return f"{package_name}/{base_type}"
+
 
 def map_ros_to_proto_type(ros_type: str) -> str:
-    """Maps a ROS type to its corresponding Protobuf type."""
+    """Maps a ROS type to its corresponding Protobuf type.
+
+    Array suffixes are ignored; the element type is mapped. Use
+    `split_array_type` to decide on the field label.
+    """
+    ros_type = split_array_type(ros_type).base_type
     if ros_type in ROS_TO_PROTO_TYPE_MAP:
         return ROS_TO_PROTO_TYPE_MAP[ros_type]
     # For complex types (e.g., other messages), we assume they will be
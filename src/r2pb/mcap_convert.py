@@ -0,0 +1,596 @@
+import re
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple, Union
+
+from .mapper import (
+    ROS_BYTES_ARRAY_TYPES,
+    ROS_STRUCT_CODES,
+    ROS_TO_PROTO_TYPE_MAP,
+    resolve_msg_type,
+    split_array_type,
+)
+from .cache import LRUCache
+from .parser import Field, ParsedMsg, parse_msg_content
+
+try:
+    from mcap.reader import make_reader
+    from mcap.records import Attachment, Channel, Chunk, Message, Metadata, Schema
+    from mcap.stream_reader import StreamReader, breakup_chunk
+    from mcap.writer import CompressionType, Writer
+except ImportError:  # pragma: no cover - exercised only without mcap
+    StreamReader = None
+
+
+def _require_mcap():
+    if StreamReader is None:
+        raise ImportError(
+            "Converting MCAP files requires the 'mcap' package. "
+            "Install it with: pip install r2pb[mcap]"
+        )
+
+
+# Schema encodings (and their message encodings) that r2pb can translate.
+ROS_SCHEMA_ENCODINGS = {
+    "ros1msg": "ros1",
+    "ros2msg": "cdr",
+}
+
+_SECTION_SEPARATOR = re.compile(r"^=+\s*$", re.MULTILINE)
+_BOUND = re.compile(r"<=\d+")
+
+_TIME_CODES = {"time": "I", "duration": "i"}
+
+
+def _normalize_type_name(ros_type: str) -> str:
+    """'pkg/msg/Type' (ROS 2) -> 'pkg/Type'."""
+    parts = ros_type.split("/")
+    if len(parts) == 3 and parts[1] == "msg":
+        return f"{parts[0]}/{parts[2]}"
+    return ros_type
+
+
+def parse_ros_schema(name: str, encoding: str, text: str) -> Dict[str, ParsedMsg]:
+    """Splits a concatenated ros1msg/ros2msg schema into parsed messages.
+
+    Field types are rewritten to fully-qualified 'pkg/Msg' names and ROS 2
+    bounds ('string<=10', 'int32[<=5]') are dropped, so the result can be fed
+    to the same generators as messages parsed from .msg files.
+    """
+    root = _normalize_type_name(name)
+    sections = _SECTION_SEPARATOR.split(text)
+    definitions = {root: sections[0]}
+    for section in sections[1:]:
+        section = section.strip("\n")
+        header, _, body = section.partition("\n")
+        if not header.startswith("MSG:"):
+            raise ValueError(f"Malformed {encoding} schema section for {name}")
+        definitions[_normalize_type_name(header[4:].strip())] = body
+
+    messages = {}
+    for msg_type, definition in definitions.items():
+        package_name = msg_type.split("/")[0]
+        parsed_msg = parse_msg_content(_BOUND.sub("", definition))
+        fields = []
+        for field in parsed_msg.fields:
+            ros_type = split_array_type(_normalize_type_name(field.field_type))
+            base_type = ros_type.base_type
+            if base_type not in ROS_TO_PROTO_TYPE_MAP:
+                base_type = resolve_msg_type(base_type, package_name)
+            suffix = ""
+            if ros_type.is_array:
+                suffix = f"[{ros_type.array_size or ''}]"
+            fields.append(Field(base_type + suffix, field.name))
+        messages[msg_type] = ParsedMsg(fields=fields, constants=parsed_msg.constants)
+    return messages
+
+
+class _SchemaParser:
+    """Serves parsed messages from an MCAP schema to r2pb's generators."""
+
+    def __init__(self, messages: Dict[str, ParsedMsg]):
+        self._messages = messages
+
+    def parse(self, package_name: str, msg_name: str) -> ParsedMsg:
+        try:
+            return self._messages[f"{package_name}/{msg_name}"]
+        except KeyError:
+            raise FileNotFoundError(
+                f"Message '{package_name}/{msg_name}' is not defined in the schema"
+            ) from None
+
+
+class _FieldPlan(NamedTuple):
+    name: str
+    key_varint: bytes
+    key_fixed: bytes
+    key_len: bytes
+    base_type: str
+    is_array: bool
+    array_size: Optional[int]
+
+
+class MessagePlan(NamedTuple):
+    """A picklable recipe for transcoding one ROS message type to protobuf."""
+
+    root: str
+    layouts: Dict[str, Tuple[_FieldPlan, ...]]
+    cdr: bool
+
+
+def _key(number: int, wire: int) -> bytes:
+    return _varint((number << 3) | wire)
+
+
+def _varint(value: int) -> bytes:
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def build_message_plan(messages: Dict[str, ParsedMsg], root: str, cdr: bool):
+    layouts = {}
+    for msg_type, parsed_msg in messages.items():
+        plans = []
+        for number, field in enumerate(parsed_msg.fields, start=1):
+            ros_type = split_array_type(field.field_type)
+            fixed_wire = 5 if ros_type.base_type == "float32" else 1
+            plans.append(
+                _FieldPlan(
+                    field.name,
+                    _key(number, 0),
+                    _key(number, fixed_wire),
+                    _key(number, 2),
+                    ros_type.base_type,
+                    ros_type.is_array,
+                    ros_type.array_size,
+                )
+            )
+        layouts[msg_type] = tuple(plans)
+    return MessagePlan(root, layouts, cdr)
+
+
+class RosMessageEncoder:
+    """Transcodes ROS1 or CDR serialized messages to protobuf wire bytes.
+
+    The protobuf layout is the one r2pb generates for the same message, so the
+    output can be decoded with the descriptors from `TranslatedSchema`.
+    """
+
+    def __init__(self, plan: MessagePlan):
+        self._plan = plan
+
+    def encode(self, data: bytes) -> bytes:
+        if self._plan.cdr:
+            if len(data) < 4:
+                raise ValueError("CDR payload is shorter than its header")
+            # The second header byte selects the byte order (1 = little endian).
+            reader = _Reader(data, 4, "<" if data[1] & 1 else ">", cdr=True)
+        else:
+            reader = _Reader(data, 0, "<", cdr=False)
+        out = bytearray()
+        self._encode_message(self._plan.root, reader, out)
+        return bytes(out)
+
+    def _encode_message(self, msg_type: str, reader: "_Reader", out: bytearray):
+        for field in self._plan.layouts[msg_type]:
+            base = field.base_type
+            if field.is_array:
+                count = field.array_size
+                if count is None:
+                    count = reader.read("I", 4)
+                self._encode_array(field, base, count, reader, out)
+            elif base in ("float32", "float64"):
+                raw = reader.read_raw_scalars(base, 1)
+                if any(raw):
+                    out += field.key_fixed
+                    out += raw
+            elif base == "char":
+                value = reader.read("B", 1)
+                if value:
+                    _append_len(out, field.key_len, chr(value).encode("utf-8"))
+            elif base in ROS_STRUCT_CODES:
+                code = self._scalar_code(base)
+                value = reader.read(code, struct.calcsize(code))
+                if value:
+                    out += field.key_varint
+                    out += _varint(int(value))
+            elif base == "string":
+                value = reader.read_string()
+                if value:
+                    _append_len(out, field.key_len, value)
+            elif base in _TIME_CODES:
+                _append_len(out, field.key_len, self._encode_time(base, reader))
+            else:
+                nested = bytearray()
+                self._encode_message(base, reader, nested)
+                _append_len(out, field.key_len, nested)
+
+    def _encode_array(self, field, base, count, reader: "_Reader", out: bytearray):
+        if base in ROS_BYTES_ARRAY_TYPES:
+            value = reader.read_bytes(count)
+            if value:
+                _append_len(out, field.key_len, value)
+        elif base in ("float32", "float64"):
+            # Packed floats: the little-endian element bytes are the payload.
+            value = reader.read_raw_scalars(base, count)
+            if value:
+                _append_len(out, field.key_len, value)
+        elif base in ROS_STRUCT_CODES:
+            values = reader.read_array(self._scalar_code(base), count)
+            if values:
+                payload = b"".join(_varint(int(v)) for v in values)
+                _append_len(out, field.key_len, payload)
+        elif base == "string":
+            for _ in range(count):
+                _append_len(out, field.key_len, reader.read_string())
+        elif base in _TIME_CODES:
+            for _ in range(count):
+                _append_len(out, field.key_len, self._encode_time(base, reader))
+        else:
+            for _ in range(count):
+                nested = bytearray()
+                self._encode_message(base, reader, nested)
+                _append_len(out, field.key_len, nested)
+
+    def _scalar_code(self, base: str) -> str:
+        # ROS 2 'byte' is an unsigned octet; ROS 1 'byte' is signed.
+        if base == "byte" and self._plan.cdr:
+            return "B"
+        if base == "bool":
+            return "?"
+        return ROS_STRUCT_CODES[base]
+
+    @staticmethod
+    def _encode_time(base: str, reader: "_Reader") -> bytes:
+        code = _TIME_CODES[base]
+        secs = reader.read(code, 4)
+        nsecs = reader.read(code, 4)
+        out = bytearray()
+        if secs:
+            out += b"\x08" + _varint(secs)
+        if nsecs:
+            out += b"\x10" + _varint(nsecs)
+        return bytes(out)
+
+
+def _append_len(out: bytearray, key: bytes, payload):
+    out += key
+    out += _varint(len(payload))
+    out += payload
+
+
+class _Reader:
+    """Sequential reader over ROS1 or CDR serialized bytes."""
+
+    def __init__(self, data: bytes, pos: int, endian: str, cdr: bool):
+        self.data = data
+        self.pos = pos
+        self.origin = pos
+        self.endian = endian
+        self.cdr = cdr
+
+    def _align(self, size: int):
+        if self.cdr and size > 1:
+            self.pos += -(self.pos - self.origin) % min(size, 8)
+
+    def read(self, code: str, size: int):
+        self._align(size)
+        value = struct.unpack_from(self.endian + code, self.data, self.pos)[0]
+        self.pos += size
+        return value
+
+    def read_array(self, code: str, count: int) -> tuple:
+        if not count:
+            return ()
+        size = struct.calcsize(code)
+        self._align(size)
+        values = struct.unpack_from(f"{self.endian}{count}{code}", self.data, self.pos)
+        self.pos += size * count
+        return values
+
+    def read_bytes(self, count: int) -> bytes:
+        value = self.data[self.pos : self.pos + count]
+        if len(value) != count:
+            raise ValueError("Serialized message is truncated")
+        self.pos += count
+        return value
+
+    def read_raw_scalars(self, base: str, count: int) -> bytes:
+        """Returns `count` floats as little-endian bytes, as protobuf expects."""
+        if not count:
+            return b""
+        size = 4 if base == "float32" else 8
+        self._align(size)
+        raw = self.read_bytes(size * count)
+        if self.endian == ">":
+            code = ROS_STRUCT_CODES[base]
+            raw = struct.pack(f"<{count}{code}", *struct.unpack(f">{count}{code}", raw))
+        return raw
+
+    def read_string(self) -> bytes:
+        length = self.read("I", 4)
+        value = self.read_bytes(length)
+        if self.cdr and value.endswith(b"\0"):
+            # CDR string lengths include the NUL terminator.
+            value = value[:-1]
+        return value
+
+
+def _parse_schema(
+    name: str, encoding: str, data: bytes
+) -> Tuple[Dict[str, ParsedMsg], MessagePlan]:
+    messages = parse_ros_schema(name, encoding, data.decode("utf-8"))
+    root = _normalize_type_name(name)
+    return messages, build_message_plan(messages, root, encoding == "ros2msg")
+
+
+class TranslatedSchema(NamedTuple):
+    """A ROS schema translated to its protobuf counterpart."""
+
+    proto_name: str
+    descriptor_set: bytes
+    plan: MessagePlan
+
+
+class SchemaTranslator:
+    """Translates ros1msg/ros2msg MCAP schemas to protobuf, once per schema.
+
+    Translations are kept in `cache` (16 MiB of the most recently used by
+    default).
+    """
+
+    def __init__(self, cache: Optional[LRUCache] = None):
+        # Keyed by the schema text, so the budget is in bytes.
+        self._cache = (
+            cache if cache is not None else LRUCache(max_bytes=16 * 1024 * 1024)
+        )
+
+    def translate(self, name: str, encoding: str, data: bytes) -> TranslatedSchema:
+        key = (name, encoding, data)
+        translated = self._cache.get(key)
+        if translated is None:
+            from .descriptor import DescriptorBuilder
+
+            messages, plan = _parse_schema(name, encoding, data)
+            builder = DescriptorBuilder(_SchemaParser(messages))
+            translated = TranslatedSchema(
+                proto_name=plan.root.replace("/", "."),
+                descriptor_set=builder.build_set(plan.root).SerializeToString(),
+                plan=plan,
+            )
+            self._cache.put(key, translated)
+        return translated
+
+
+def _transcode_chunk(chunk, plans: Dict[int, MessagePlan], channels: Dict[int, int]):
+    """Worker entry point: decompresses a chunk and transcodes its messages.
+
+    `plans` maps schema IDs to the plans of the translated ROS schemas and
+    `channels` maps channel IDs to schema IDs for the ROS channels known so
+    far. Schemas and channels defined inside the chunk are returned to the
+    caller; messages on channels the worker cannot resolve are returned
+    untranslated.
+    """
+    plans = dict(plans)
+    channels = dict(channels)
+    # Encoders only live as long as the chunk, so nothing accumulates in
+    # long-lived worker processes.
+    encoders: Dict[int, RosMessageEncoder] = {}
+    results = []
+    for record in breakup_chunk(chunk):
+        if isinstance(record, Schema):
+            if record.encoding in ROS_SCHEMA_ENCODINGS:
+                _, plans[record.id] = _parse_schema(
+                    record.name, record.encoding, record.data
+                )
+            results.append(record)
+        elif isinstance(record, Channel):
+            plan = plans.get(record.schema_id)
+            if plan is not None and record.message_encoding == (
+                "cdr" if plan.cdr else "ros1"
+            ):
+                channels[record.id] = record.schema_id
+            results.append(record)
+        elif isinstance(record, Message):
+            schema_id = channels.get(record.channel_id)
+            if schema_id is None:
+                results.append((record, False))
+            else:
+                encoder = encoders.get(schema_id)
+                if encoder is None:
+                    encoder = encoders[schema_id] = RosMessageEncoder(plans[schema_id])
+                record.data = encoder.encode(record.data)
+                results.append((record, True))
+    return results
+
+
+class ConversionStats(NamedTuple):
+    messages: int
+    translated: int
+    channels: int
+
+
+class _OutputState:
+    """Tracks schema/channel ID mappings between the input and output files."""
+
+    def __init__(self, writer, translator: SchemaTranslator):
+        self.writer = writer
+        self.translator = translator
+        self.schemas: Dict[int, tuple] = {}
+        self.plans: Dict[int, MessagePlan] = {}
+        self.ros_channels: Dict[int, int] = {}
+        self._encoders: Dict[int, RosMessageEncoder] = {}
+        self._schema_ids: Dict[int, int] = {}
+        self._channel_ids: Dict[int, int] = {}
+        self.messages = 0
+        self.translated = 0
+
+    def add_schema(self, schema):
+        if schema.id in self.schemas:
+            return
+        self.schemas[schema.id] = (schema.name, schema.encoding, schema.data)
+        if schema.encoding in ROS_SCHEMA_ENCODINGS:
+            translated = self.translator.translate(
+                schema.name, schema.encoding, schema.data
+            )
+            self.plans[schema.id] = translated.plan
+            self._encoders[schema.id] = RosMessageEncoder(translated.plan)
+            self._schema_ids[schema.id] = self.writer.register_schema(
+                translated.proto_name, "protobuf", translated.descriptor_set
+            )
+        else:
+            self._schema_ids[schema.id] = self.writer.register_schema(
+                schema.name, schema.encoding, schema.data
+            )
+
+    def add_channel(self, channel):
+        if channel.id in self._channel_ids:
+            return
+        schema = self.schemas.get(channel.schema_id)
+        encoding = channel.message_encoding
+        if schema is not None and ROS_SCHEMA_ENCODINGS.get(schema[1]) == encoding:
+            self.ros_channels[channel.id] = channel.schema_id
+            encoding = "protobuf"
+        self._channel_ids[channel.id] = self.writer.register_channel(
+            channel.topic,
+            encoding,
+            self._schema_ids.get(channel.schema_id, 0),
+            channel.metadata,
+        )
+
+    def add_message(self, message, translated: bool):
+        schema_id = self.ros_channels.get(message.channel_id)
+        if schema_id is not None and not translated:
+            message.data = self._encoders[schema_id].encode(message.data)
+            translated = True
+        self.messages += 1
+        self.translated += translated
+        self.writer.add_message(
+            self._channel_ids[message.channel_id],
+            message.log_time,
+            message.data,
+            message.publish_time,
+            message.sequence,
+        )
+
+    def apply(self, results):
+        for result in results:
+            if isinstance(result, Schema):
+                self.add_schema(result)
+            elif isinstance(result, Channel):
+                self.add_channel(result)
+            else:
+                self.add_message(*result)
+
+
+_COMPRESSION = {
+    "zstd": "ZSTD",
+    "lz4": "LZ4",
+    "none": "NONE",
+}
+
+
+def convert_mcap(
+    input_path: Union[str, Path],
+    output_path: Union[str, Path],
+    workers: int = 0,
+    chunk_size: int = 1024 * 1024,
+    compression: str = "zstd",
+) -> ConversionStats:
+    """Streams a ROS MCAP file into a protobuf-encoded, indexed MCAP file.
+
+    The input is read record by record; chunks are decompressed and transcoded
+    by a pool of `workers` processes (in the calling process when 0), with at
+    most two chunks per worker in flight, so memory stays bounded regardless of
+    file size. Each ROS schema is translated once. Channels with other
+    encodings are copied unchanged.
+    """
+    _require_mcap()
+    if compression not in _COMPRESSION:
+        raise ValueError(
+            f"Unsupported compression '{compression}', "
+            f"expected one of: {', '.join(_COMPRESSION)}"
+        )
+    translator = SchemaTranslator()
+
+    with open(input_path, "rb") as fin, open(output_path, "wb") as fout:
+        writer = Writer(
+            fout,
+            chunk_size=chunk_size,
+            compression=getattr(CompressionType, _COMPRESSION[compression]),
+        )
+        writer.start(profile="", library="r2pb")
+        state = _OutputState(writer, translator)
+
+        # Indexed inputs list every schema and channel in their summary;
+        # registering them up front lets workers translate from the first chunk.
+        summary = make_reader(fin).get_summary() if fin.seekable() else None
+        if summary is not None:
+            for schema in summary.schemas.values():
+                state.add_schema(schema)
+            for channel in summary.channels.values():
+                state.add_channel(channel)
+        fin.seek(0)
+
+        executor = ProcessPoolExecutor(workers) if workers > 0 else None
+        in_flight = deque()
+        window = max(1, workers * 2)
+
+        def drain(limit: int = 0):
+            while len(in_flight) > limit:
+                state.apply(in_flight.popleft().result())
+
+        try:
+            for record in StreamReader(fin, emit_chunks=True).records:
+                if isinstance(record, Chunk):
+                    plans = {i: state.plans[i] for i in state.ros_channels.values()}
+                    if executor is None:
+                        state.apply(_transcode_chunk(record, plans, state.ros_channels))
+                        continue
+                    in_flight.append(
+                        executor.submit(
+                            _transcode_chunk,
+                            record,
+                            plans,
+                            dict(state.ros_channels),
+                        )
+                    )
+                    drain(window)
+                elif isinstance(record, Schema):
+                    drain()
+                    state.add_schema(record)
+                elif isinstance(record, Channel):
+                    drain()
+                    state.add_channel(record)
+                elif isinstance(record, Message):
+                    drain()
+                    state.add_message(record, False)
+                elif isinstance(record, Attachment):
+                    drain()
+                    writer.add_attachment(
+                        record.create_time,
+                        record.log_time,
+                        record.name,
+                        record.media_type,
+                        record.data,
+                    )
+                elif isinstance(record, Metadata):
+                    drain()
+                    writer.add_metadata(record.name, record.metadata)
+            drain()
+        finally:
+            if executor is not None:
+                for future in in_flight:
+                    future.cancel()
+                executor.shutdown()
+        writer.finish()
+
+    return ConversionStats(state.messages, state.translated, len(state._channel_ids))
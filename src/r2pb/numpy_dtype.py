@@ -0,0 +1,157 @@
+import struct
+from typing import Optional, Tuple
+
+from .cache import LRUCache
+from .parser import MsgParser
+from .mapper import resolve_msg_type, split_array_type
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError(
+            "Building NumPy dtypes requires the 'numpy' package. "
+            "Install it with: pip install r2pb[numpy]"
+        )
+
+
+class NotFixedSizeError(ValueError):
+    """Raised for messages whose ROS1 serialization has no fixed layout."""
+
+
+# ROS1 serializes little-endian with no padding between fields.
+_SCALAR_DTYPES = {
+    "bool": "u1",
+    "byte": "i1",
+    "char": "u1",
+    "int8": "i1",
+    "uint8": "u1",
+    "int16": "<i2",
+    "uint16": "<u2",
+    "int32": "<i4",
+    "uint32": "<u4",
+    "int64": "<i8",
+    "uint64": "<u8",
+    "float32": "<f4",
+    "float64": "<f8",
+}
+
+_TIME_DTYPES = {
+    "time": [("secs", "<u4"), ("nsecs", "<u4")],
+    "duration": [("secs", "<i4"), ("nsecs", "<i4")],
+}
+
+
+class DtypeBuilder:
+    """Derives NumPy structured dtypes matching the ROS1 layout of messages.
+
+    Only messages made entirely of fixed-size fields (scalars, time/duration,
+    fixed-size arrays and fixed-size nested messages) are eligible; their ROS1
+    serialization is a packed C struct that `np.frombuffer` can view directly.
+    Dtypes, and the reasons of ineligible messages, are kept in `cache` (the
+    4096 most recently used by default).
+    """
+
+    def __init__(
+        self, parser: Optional[MsgParser] = None, cache: Optional[LRUCache] = None
+    ):
+        _require_numpy()
+        self._parser = parser if parser is not None else MsgParser()
+        # Maps message types to their dtype, or to why they have none.
+        self._cache = cache if cache is not None else LRUCache(max_entries=4096)
+        self._building = set()
+
+    def is_fixed_size(self, msg_type: str) -> bool:
+        """Returns whether `msg_type` has a fixed-size ROS1 layout."""
+        try:
+            self.build(msg_type)
+        except NotFixedSizeError:
+            return False
+        return True
+
+    def build(self, msg_type: str) -> "np.dtype":
+        """Returns the structured dtype of `msg_type`.
+
+        Raises:
+            NotFixedSizeError: if any field, possibly nested, has variable size
+                or the message contains itself.
+        """
+        cached = self._cache.get(msg_type)
+        if isinstance(cached, str):
+            raise NotFixedSizeError(cached)
+        if cached is not None:
+            return cached
+
+        if msg_type in self._building:
+            # A message containing itself has no finite layout.
+            raise NotFixedSizeError(f"{msg_type} is recursive")
+        self._building.add(msg_type)
+        try:
+            dtype = self._build_fields(msg_type)
+        finally:
+            self._building.discard(msg_type)
+        self._cache.put(msg_type, dtype)
+        return dtype
+
+    def _build_fields(self, msg_type: str) -> "np.dtype":
+        package_name, msg_name = msg_type.split("/")
+        parsed_msg = self._parser.parse(package_name, msg_name)
+        fields = []
+        for field in parsed_msg.fields:
+            ros_type = split_array_type(field.field_type)
+            base_type = ros_type.base_type
+            if ros_type.is_array and ros_type.array_size is None:
+                self._reject(
+                    msg_type, f"field '{field.name}' is a variable-length array"
+                )
+            if base_type == "string":
+                self._reject(msg_type, f"field '{field.name}' is a string")
+
+            if base_type in _SCALAR_DTYPES:
+                element = np.dtype(_SCALAR_DTYPES[base_type])
+            elif base_type in _TIME_DTYPES:
+                element = np.dtype(_TIME_DTYPES[base_type])
+            else:
+                nested_type = resolve_msg_type(base_type, package_name)
+                try:
+                    element = self.build(nested_type)
+                except NotFixedSizeError as e:
+                    self._reject(msg_type, f"field '{field.name}': {e}")
+
+            if ros_type.is_array:
+                fields.append((field.name, element, (ros_type.array_size,)))
+            else:
+                fields.append((field.name, element))
+
+        return np.dtype(fields)
+
+    def _reject(self, msg_type: str, reason: str):
+        message = f"{msg_type} is not fixed-size: {reason}"
+        self._cache.put(msg_type, message)
+        raise NotFixedSizeError(message)
+
+    def frombuffer(
+        self, msg_type: str, buffer, count: int = -1, offset: int = 0
+    ) -> "np.ndarray":
+        """Views `count` back-to-back ROS1 messages in `buffer` as an array."""
+        return np.frombuffer(
+            buffer, dtype=self.build(msg_type), count=count, offset=offset
+        )
+
+    def frombuffer_array(
+        self, msg_type: str, buffer, offset: int = 0
+    ) -> Tuple["np.ndarray", int]:
+        """Views a serialized ROS1 variable-length array field `msg_type[]`.
+
+        Reads the uint32 element count at `offset` and returns the array view
+        together with the offset just past the array.
+        """
+        dtype = self.build(msg_type)
+        (count,) = struct.unpack_from("<I", buffer, offset)
+        offset += 4
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+        return array, offset + count * dtype.itemsize
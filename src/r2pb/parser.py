@@ -1,9 +1,13 @@
 import re
 from pathlib import Path
-from typing import List, Dict, Any, Tuple, NamedTuple, Optional, Union
+from typing import List, Dict, Any, Tuple, NamedTuple, Optional, Union, TYPE_CHECKING
 
+from .cache import CacheStats, NegativeCache
 from .fetcher import RosMsgFetcher
 
+if TYPE_CHECKING:
+    from .bundle import MessageBundle
+
 
 class Field(NamedTuple):
     field_type: str
@@ -57,11 +61,22 @@ def parse_msg_content(content: str) -> ParsedMsg:
 class MsgParser:
     """ROS 消息文件解析器，支持本地搜索和在线获取。"""
 
-    def __init__(self, local_package_paths: Optional[List[Union[str, Path]]] = None):
+    def __init__(
+        self,
+        local_package_paths: Optional[List[Union[str, Path]]] = None,
+        negative_cache: Optional[NegativeCache] = None,
+        bundles: Optional[List[Union[str, Path, "MessageBundle"]]] = None,
+    ):
         self.local_package_paths = (
             [Path(p) for p in local_package_paths] if local_package_paths else []
         )
-        self.fetcher = RosMsgFetcher()
+        # 预构建的消息包（bundle）优先于本地路径和在线获取。
+        self.bundles = [self._open_bundle(b) for b in bundles] if bundles else []
+        # 本地查找成本很低，负缓存只用于跳过昂贵的在线查找。
+        self.negative_cache = (
+            negative_cache if negative_cache is not None else NegativeCache()
+        )
+        self.fetcher = RosMsgFetcher(negative_cache=self.negative_cache)
 
     def find_msg_file_content(self, package_name: str, msg_name: str) -> str:
         """查找指定的消息文件内容，优先在本地搜索，找不到则尝试在线获取。
@@ -76,25 +91,59 @@ class MsgParser:
         Raises:
             FileNotFoundError: 当消息文件无法在本地和在线仓库中找到时。
         """
-        # 1. 先在本地包路径中查找
+        # 1. 先在预构建的 bundle 中查找
+        for bundle in self.bundles:
+            content = bundle.get_content(package_name, msg_name)
+            if content is not None:
+                return content
+
+        # 2. 再在本地包路径中查找
         content = self._find_local_msg_content(package_name, msg_name)
         if content is not None:
             return content
 
-        # 2. 本地找不到，尝试在线获取
+        # 3. 本地找不到，若之前已确认无法获取则直接失败
+        cache_key = f"msg:{package_name}/{msg_name}"
+        self.negative_cache.check(cache_key)
+
+        # 4. 尝试在线获取
         try:
             package_path = self.fetcher.find_and_fetch(package_name)
-            msg_file_path = self._find_msg_in_package(package_path, msg_name)
-            if msg_file_path:
-                return msg_file_path.read_text(encoding="utf-8")
+            # 其他进程可能正在原地 git pull 该仓库，读取期间持有共享锁。
+            with self.fetcher.reading(package_path):
+                msg_file_path = self._find_msg_in_package(package_path, msg_name)
+                if msg_file_path:
+                    return msg_file_path.read_text(encoding="utf-8")
         except (KeyError, FileNotFoundError):
             # 捕获 fetcher 找不到包或文件找不到的异常，统一处理
             pass
 
-        raise FileNotFoundError(
+        error = FileNotFoundError(
             f"Message '{msg_name}.msg' not found in package '{package_name}' "
             f"(searched in {self.local_package_paths} and online)"
         )
+        self.negative_cache.record(cache_key, error)
+        raise error
+
+    def find_package_path(self, package_name: str) -> Path:
+        """返回包所在的目录，优先使用本地路径，找不到则在线获取。
+
+        Raises:
+            KeyError: 当包无法在本地和在线仓库中找到时。
+        """
+        for base_path in self.local_package_paths:
+            package_path = base_path / package_name
+            if package_path.is_dir():
+                return package_path
+        return self.fetcher.find_and_fetch(package_name)
+
+    @staticmethod
+    def _open_bundle(bundle):
+        from .bundle import MessageBundle
+
+        if isinstance(bundle, MessageBundle):
+            return bundle
+        return MessageBundle(bundle)
 
     def _find_local_msg_content(
         self, package_name: str, msg_name: str
@@ -121,10 +170,22 @@ class MsgParser:
 
         return None
 
+    def cache_stats(self) -> Dict[str, CacheStats]:
+        """返回负缓存和各个 bundle 的内存缓存统计信息。"""
+        stats = {"negative": self.negative_cache.stats()}
+        for bundle in self.bundles:
+            stats[f"bundle:{bundle.path}"] = bundle.cache_stats()
+        return stats
+
     def parse(self, package_name: str, msg_name: str) -> ParsedMsg:
         """查找并解析一个消息文件。
 
         这是推荐使用的主方法，它封装了查找和解析的整个过程。
+        bundle 中的消息直接返回预解析的结果。
         """
+        for bundle in self.bundles:
+            parsed_msg = bundle.get_parsed(package_name, msg_name)
+            if parsed_msg is not None:
+                return parsed_msg
         content = self.find_msg_file_content(package_name, msg_name)
         return parse_msg_content(content)
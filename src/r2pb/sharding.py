@@ -0,0 +1,328 @@
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Union
+
+from .locking import atomic_write
+
+MANIFEST_NAME = "r2pb-manifest.json"
+MANIFEST_VERSION = 1
+PLAN_VERSION = 1
+
+
+class ShardError(ValueError):
+    """Raised when shard outputs are inconsistent and cannot be merged."""
+
+
+class Shard(NamedTuple):
+    """One of `count` partitions of a conversion, numbered from 1."""
+
+    index: int
+    count: int
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+def parse_shard(spec: str) -> Shard:
+    """Parses an 'i/N' shard specification such as '2/4'."""
+    index, sep, count = spec.partition("/")
+    try:
+        shard = Shard(int(index), int(count))
+    except ValueError:
+        shard = None
+    if not sep or shard is None or not 1 <= shard.index <= shard.count:
+        raise ValueError(
+            f"Invalid shard '{spec}', expected 'i/N' with 1 <= i <= N (e.g., 2/4)"
+        )
+    return shard
+
+
+def _dependency_order(members: List[str], graph: Dict[str, List[str]]) -> List[str]:
+    """Lists `members` with dependencies before dependents, deterministically."""
+    member_set = set(members)
+    order: List[str] = []
+    visited = set()
+    for start in sorted(members):
+        if start in visited:
+            continue
+        visited.add(start)
+        stack = [(start, iter(sorted(graph[start])))]
+        while stack:
+            msg_type, deps = stack[-1]
+            for dep in deps:
+                if dep in member_set and dep not in visited:
+                    visited.add(dep)
+                    stack.append((dep, iter(sorted(graph[dep]))))
+                    break
+            else:
+                stack.pop()
+                order.append(msg_type)
+    return order
+
+
+def _package_units(
+    members: List[str], graph: Dict[str, List[str]], limit: int
+) -> List[List[str]]:
+    """Splits one package into units of at most `limit` messages.
+
+    A package that fits is a single unit. Otherwise it is split along the
+    connected components of its internal dependencies, and components that
+    are still too large into consecutive runs of their dependency order.
+    """
+    if len(members) <= limit:
+        return [members]
+    parent = {msg_type: msg_type for msg_type in members}
+
+    def find(msg_type: str) -> str:
+        while parent[msg_type] != msg_type:
+            parent[msg_type] = parent[parent[msg_type]]
+            msg_type = parent[msg_type]
+        return msg_type
+
+    for msg_type in members:
+        for dep in graph[msg_type]:
+            if dep in parent:
+                parent[find(dep)] = find(msg_type)
+    components: Dict[str, List[str]] = {}
+    for msg_type in members:
+        components.setdefault(find(msg_type), []).append(msg_type)
+
+    units = []
+    for component in components.values():
+        order = _dependency_order(component, graph)
+        units.extend(order[i : i + limit] for i in range(0, len(order), limit))
+    return units
+
+
+def assign_shards(graph: Dict[str, List[str]], count: int) -> Dict[str, int]:
+    """Assigns every message of a dependency graph to a shard index.
+
+    Messages are grouped by ROS package, which is also the unit of the output
+    tree and of fetching, so a node usually needs few packages. A package
+    larger than a shard's fair share is split along its dependency
+    components (see `_package_units`), so one dominant package cannot
+    unbalance the run. Units are placed largest first on the least loaded
+    shard (ties go to the lower index). The result only depends on the graph,
+    so every node computes the same, disjoint assignment.
+    """
+    packages: Dict[str, List[str]] = {}
+    for msg_type in sorted(graph):
+        packages.setdefault(msg_type.split("/")[0], []).append(msg_type)
+
+    limit = max(1, -(-len(graph) // count))
+    units = [
+        unit
+        for members in packages.values()
+        for unit in _package_units(members, graph, limit)
+    ]
+
+    loads = [0] * count
+    assignment = {}
+    for unit in sorted(units, key=lambda u: (-len(u), min(u))):
+        shard_index = min(range(count), key=lambda i: (loads[i], i))
+        loads[shard_index] += len(unit)
+        for msg_type in unit:
+            assignment[msg_type] = shard_index + 1
+    return assignment
+
+
+class ShardPlan(NamedTuple):
+    """The dependency graph of a run and its assignment to shards.
+
+    Computing a plan once and handing it to every node (see `write_plan`)
+    spares the nodes the graph pass: each then parses only its own messages.
+    """
+
+    roots: List[str]
+    count: int
+    graph: Dict[str, List[str]]
+    assignment: Dict[str, int]
+
+    def owned(self, index: int) -> List[str]:
+        """Returns the messages shard `index` converts, sorted."""
+        return sorted(t for t, i in self.assignment.items() if i == index)
+
+
+def make_plan(
+    roots: Iterable[str], graph: Dict[str, List[str]], count: int
+) -> ShardPlan:
+    return ShardPlan(sorted(set(roots)), count, graph, assign_shards(graph, count))
+
+
+def _sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _write_json(path: Path, data: dict):
+    with atomic_write(path) as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def write_manifest(
+    output_dir: Union[str, Path],
+    shard: Shard,
+    roots: Iterable[str],
+    messages: Dict[str, List[str]],
+) -> Path:
+    """Records the messages a shard converted, with file hashes and dependencies.
+
+    `messages` maps each converted message type to its dependencies; the
+    .proto files must already exist under `output_dir`.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    entries = {}
+    for msg_type, dependencies in messages.items():
+        file_name = f"{msg_type}.proto"
+        entries[msg_type] = {
+            "file": file_name,
+            "sha256": _sha256(output_dir / file_name),
+            "dependencies": sorted(dependencies),
+        }
+    path = output_dir / MANIFEST_NAME
+    _write_json(
+        path,
+        {
+            "version": MANIFEST_VERSION,
+            "shard": shard.index,
+            "shards": shard.count,
+            "roots": sorted(set(roots)),
+            "messages": entries,
+        },
+    )
+    return path
+
+
+def write_plan(path: Union[str, Path], plan: ShardPlan) -> Path:
+    """Writes a shard plan as JSON for `load_plan` on every node."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_json(
+        path,
+        {
+            "version": PLAN_VERSION,
+            "roots": plan.roots,
+            "shards": plan.count,
+            "messages": {
+                msg_type: {
+                    "shard": plan.assignment[msg_type],
+                    "dependencies": sorted(dependencies),
+                }
+                for msg_type, dependencies in plan.graph.items()
+            },
+        },
+    )
+    return path
+
+
+def load_plan(path: Union[str, Path]) -> ShardPlan:
+    path = Path(path)
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        raise ShardError(f"Shard plan '{path}' does not exist") from None
+    except ValueError as e:
+        raise ShardError(f"'{path}' is not a valid shard plan: {e}") from None
+    if data.get("version") != PLAN_VERSION:
+        raise ShardError(
+            f"'{path}' has plan version {data.get('version')}, "
+            f"expected {PLAN_VERSION}"
+        )
+    messages = data["messages"]
+    return ShardPlan(
+        data["roots"],
+        data["shards"],
+        {t: entry["dependencies"] for t, entry in messages.items()},
+        {t: entry["shard"] for t, entry in messages.items()},
+    )
+
+
+def load_manifest(shard_dir: Union[str, Path]) -> dict:
+    path = Path(shard_dir) / MANIFEST_NAME
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        raise ShardError(f"'{shard_dir}' has no {MANIFEST_NAME}") from None
+    except ValueError as e:
+        raise ShardError(f"'{path}' is not a valid manifest: {e}") from None
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ShardError(
+            f"'{path}' has manifest version {manifest.get('version')}, "
+            f"expected {MANIFEST_VERSION}"
+        )
+    return manifest
+
+
+def merge_shards(
+    shard_dirs: Iterable[Union[str, Path]], output_dir: Union[str, Path]
+) -> int:
+    """Validates the outputs of all shards and combines them into one tree.
+
+    Every shard of the same run must be present exactly once, the shards must
+    be disjoint, every dependency must be provided by some shard and every
+    file must match the hash in its manifest. Nothing is written unless all
+    checks pass. The merged tree gets a manifest of its own, as if it were
+    the only shard of a '1/1' run. Returns the number of merged messages.
+    """
+    shard_dirs = [Path(d) for d in shard_dirs]
+    manifests = [load_manifest(d) for d in shard_dirs]
+    if not manifests:
+        raise ShardError("No shard outputs to merge")
+
+    count = manifests[0]["shards"]
+    roots = manifests[0]["roots"]
+    seen = {}
+    for shard_dir, manifest in zip(shard_dirs, manifests):
+        if manifest["shards"] != count or manifest["roots"] != roots:
+            raise ShardError(
+                f"'{shard_dir}' belongs to a different run than '{shard_dirs[0]}'"
+            )
+        if manifest["shard"] in seen:
+            raise ShardError(
+                f"Shard {manifest['shard']}/{count} is given twice: "
+                f"'{seen[manifest['shard']]}' and '{shard_dir}'"
+            )
+        seen[manifest["shard"]] = shard_dir
+    missing = sorted(set(range(1, count + 1)) - set(seen))
+    if missing:
+        raise ShardError(
+            f"Missing shards: {', '.join(f'{i}/{count}' for i in missing)}"
+        )
+
+    sources: Dict[str, Path] = {}
+    messages: Dict[str, dict] = {}
+    for shard_dir, manifest in zip(shard_dirs, manifests):
+        for msg_type, entry in manifest["messages"].items():
+            if msg_type in messages:
+                raise ShardError(
+                    f"'{msg_type}' was converted by more than one shard "
+                    f"('{sources[msg_type]}' and '{shard_dir}')"
+                )
+            file_path = shard_dir / entry["file"]
+            if not file_path.is_file() or _sha256(file_path) != entry["sha256"]:
+                raise ShardError(f"'{file_path}' is missing or does not match its hash")
+            sources[msg_type] = shard_dir
+            messages[msg_type] = entry
+
+    for msg_type, entry in messages.items():
+        for dep in entry["dependencies"]:
+            if dep not in messages:
+                raise ShardError(f"'{dep}' (needed by '{msg_type}') is in no shard")
+    for root in roots:
+        if root not in messages:
+            raise ShardError(f"Requested message '{root}' is in no shard")
+
+    output_dir = Path(output_dir)
+    for msg_type, entry in messages.items():
+        target = output_dir / entry["file"]
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(sources[msg_type] / entry["file"], target)
+    write_manifest(
+        output_dir,
+        Shard(1, 1),
+        roots,
+        {msg_type: entry["dependencies"] for msg_type, entry in messages.items()},
+    )
+    return len(messages)
@@ -0,0 +1,680 @@
+import struct
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .cache import LRUCache
+from .parser import MsgParser, ParsedMsg
+from .mapper import (
+    ROS_BYTES_ARRAY_TYPES,
+    ROS_STRUCT_CODES,
+    ROS_TO_PROTO_TYPE_MAP,
+    resolve_msg_type,
+    split_array_type,
+)
+
+
+class TranscodeError(ValueError):
+    """Raised when Protobuf input cannot be transcoded to ROS1."""
+
+
+class TranscodeRangeError(TranscodeError):
+    """Raised when a value does not fit the narrower ROS field type."""
+
+
+# Wire types of the Protobuf encoding.
+_VARINT, _FIXED64, _LEN, _FIXED32 = 0, 1, 2, 5
+
+
+class _Scalar(NamedTuple):
+    """How a ROS scalar travels on the Protobuf wire and in ROS1."""
+
+    wire: int
+    struct_code: str
+    low: Optional[int] = None
+    high: Optional[int] = None
+    signed: bool = False
+
+
+# Keyed by ROS type. The proto side follows ROS_TO_PROTO_TYPE_MAP: narrow ROS
+# integers are widened to (u)int32 on the wire and range-checked on the way back.
+_SCALARS = {
+    "bool": _Scalar(_VARINT, ROS_STRUCT_CODES["bool"]),
+    "byte": _Scalar(_VARINT, ROS_STRUCT_CODES["byte"], -(2**7), 2**7 - 1, True),
+    "int8": _Scalar(_VARINT, ROS_STRUCT_CODES["int8"], -(2**7), 2**7 - 1, True),
+    "uint8": _Scalar(_VARINT, ROS_STRUCT_CODES["uint8"], 0, 2**8 - 1),
+    "int16": _Scalar(_VARINT, ROS_STRUCT_CODES["int16"], -(2**15), 2**15 - 1, True),
+    "uint16": _Scalar(_VARINT, ROS_STRUCT_CODES["uint16"], 0, 2**16 - 1),
+    "int32": _Scalar(_VARINT, ROS_STRUCT_CODES["int32"], -(2**31), 2**31 - 1, True),
+    "uint32": _Scalar(_VARINT, ROS_STRUCT_CODES["uint32"], 0, 2**32 - 1),
+    "int64": _Scalar(_VARINT, ROS_STRUCT_CODES["int64"], -(2**63), 2**63 - 1, True),
+    "uint64": _Scalar(_VARINT, ROS_STRUCT_CODES["uint64"], 0, 2**64 - 1),
+    "float32": _Scalar(_FIXED32, ROS_STRUCT_CODES["float32"]),
+    "float64": _Scalar(_FIXED64, ROS_STRUCT_CODES["float64"]),
+}
+
+# ROS time is unsigned, duration is signed; both are two 32-bit words in ROS1.
+_TIME_RANGES = {
+    "time": (0, 2**32 - 1),
+    "duration": (-(2**31), 2**31 - 1),
+}
+
+_U32 = struct.Struct("<I")
+
+
+def _read_varint(buf, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        try:
+            byte = buf[pos]
+        except IndexError:
+            raise TranscodeError("Truncated varint") from None
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 70:
+            raise TranscodeError("Varint is too long")
+
+
+def _read_length(buf, pos: int, end: int) -> Tuple[int, int]:
+    """Reads a length prefix and returns (start, stop) of the payload."""
+    length, pos = _read_varint(buf, pos)
+    stop = pos + length
+    if stop > end:
+        raise TranscodeError("Length-delimited field runs past the message end")
+    return pos, stop
+
+
+def _skip_field(buf, pos: int, end: int, wire: int) -> int:
+    if wire == _VARINT:
+        return _read_varint(buf, pos)[1]
+    if wire == _FIXED64:
+        pos += 8
+    elif wire == _FIXED32:
+        pos += 4
+    elif wire == _LEN:
+        pos = _read_length(buf, pos, end)[1]
+    else:
+        raise TranscodeError(f"Unsupported wire type {wire}")
+    if pos > end:
+        raise TranscodeError("Field runs past the message end")
+    return pos
+
+
+def _to_signed(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _check_range(field: str, value: int, low: int, high: int) -> int:
+    if value < low or value > high:
+        raise TranscodeRangeError(
+            f"Value {value} of field '{field}' is out of range [{low}, {high}]"
+        )
+    return value
+
+
+def _decode_time(buf, pos: int, end: int, field: str, low: int, high: int):
+    """Decodes a google.protobuf.Timestamp/Duration into (secs, nsecs)."""
+    seconds = nanos = 0
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        number, wire = key >> 3, key & 7
+        if number in (1, 2) and wire == _VARINT:
+            value, pos = _read_varint(buf, pos)
+            if number == 1:
+                seconds = _to_signed(value)
+            else:
+                nanos = _to_signed(value)
+        else:
+            pos = _skip_field(buf, pos, end, wire)
+    return (
+        _check_range(f"{field}.secs", seconds, low, high),
+        _check_range(f"{field}.nsecs", nanos, low, high),
+    )
+
+
+def _decode_char(data: bytes, field: str) -> int:
+    """ROS char maps to a one-character proto string; returns its code."""
+    text = data.decode("utf-8")
+    if len(text) > 1:
+        raise TranscodeRangeError(f"Field '{field}' holds more than one char")
+    return _check_range(field, ord(text) if text else 0, 0, 2**8 - 1)
+
+
+def _wire_error(field: str, wire: int):
+    return TranscodeError(f"Unexpected wire type {wire} for field '{field}'")
+
+
+def _length_error(field: str, expected: int, actual: int):
+    return TranscodeError(
+        f"Fixed-size field '{field}' has {actual} elements, expected {expected}"
+    )
+
+
+class _FieldSpec(NamedTuple):
+    name: str
+    number: int
+    base_type: str
+    is_array: bool
+    array_size: Optional[int]
+
+
+def _is_builtin(base_type: str) -> bool:
+    return base_type in ROS_TO_PROTO_TYPE_MAP
+
+
+def _split_msg_type(msg_type: str) -> Tuple[str, str]:
+    """Splits 'pkg/Msg', rejecting names that are not identifiers.
+
+    Names end up in the generated source, so they are checked before use.
+    """
+    parts = msg_type.split("/")
+    if len(parts) != 2 or not all(part.isidentifier() for part in parts):
+        raise TranscodeError(f"Invalid message type {msg_type!r}")
+    return parts[0], parts[1]
+
+
+class _ModuleWriter:
+    """Emits the Python source of the specialized transcoding functions."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.constants: Dict[str, object] = {}
+
+    def emit(self, indent: int, line: str):
+        self.lines.append("    " * indent + line)
+
+    def constant(self, prefix: str, value) -> str:
+        name = f"_{prefix}{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    @property
+    def source(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+class Transcoder:
+    """Transcodes Protobuf wire bytes of one message type to ROS1 bytes."""
+
+    def __init__(
+        self,
+        msg_type: str,
+        decode: Callable,
+        size: Callable,
+        write: Callable,
+        source: str,
+    ):
+        self.msg_type = msg_type
+        self._decode = decode
+        self._size = size
+        self._write = write
+        self.source = source
+
+    def decode(self, data) -> tuple:
+        """Decodes Protobuf bytes into the tuple of ROS field values."""
+        return self._decode(data, 0, len(data))
+
+    def serialized_size(self, data) -> int:
+        """Returns the length of the ROS1 serialization of `data`."""
+        return self._size(self.decode(data))
+
+    def transcode_into(self, data, buffer, offset: int = 0) -> int:
+        """Writes the ROS1 serialization of `data` into a preallocated buffer.
+
+        `buffer` must be a bytearray or writable memoryview. Returns the
+        offset just past the written message.
+        """
+        values = self.decode(data)
+        needed = self._size(values)
+        if len(buffer) - offset < needed:
+            raise TranscodeError(
+                f"Buffer has {len(buffer) - offset} bytes free, {needed} needed"
+            )
+        return self._write(values, buffer, offset)
+
+    def transcode(self, data) -> bytes:
+        """Returns the ROS1 serialization of Protobuf-encoded `data`."""
+        values = self.decode(data)
+        buffer = bytearray(self._size(values))
+        self._write(values, buffer, 0)
+        return bytes(buffer)
+
+
+class TranscoderBuilder:
+    """Compiles Protobuf-to-ROS1 transcoders from the parsed message graph.
+
+    For every message type in the dependency closure a decode, size and write
+    function is generated as Python source, specialized to that message's field
+    layout, and compiled once. Field numbers follow the generated .proto files.
+    Compiled transcoders are kept in `cache` (the 1024 most recently used by
+    default).
+    """
+
+    def __init__(
+        self, parser: Optional[MsgParser] = None, cache: Optional[LRUCache] = None
+    ):
+        self._parser = parser if parser is not None else MsgParser()
+        self._transcoders = cache if cache is not None else LRUCache(max_entries=1024)
+
+    def build(self, msg_type: str) -> Transcoder:
+        """Returns the (cached) transcoder for `msg_type`."""
+        transcoder = self._transcoders.get(msg_type)
+        if transcoder is None:
+            transcoder = self._compile(msg_type)
+            self._transcoders.put(msg_type, transcoder)
+        return transcoder
+
+    def _collect(self, top_level: str) -> Dict[str, List[_FieldSpec]]:
+        """Loads the closure of `top_level`, dependencies before dependents."""
+        layouts: Dict[str, List[_FieldSpec]] = {}
+        visiting = set()
+
+        def visit(msg_type: str):
+            if msg_type in layouts:
+                return
+            if msg_type in visiting:
+                raise TranscodeError(f"Recursive message definition at {msg_type}")
+            visiting.add(msg_type)
+            package_name, msg_name = _split_msg_type(msg_type)
+            parsed_msg: ParsedMsg = self._parser.parse(package_name, msg_name)
+            specs = []
+            for number, field in enumerate(parsed_msg.fields, start=1):
+                if not field.name.isidentifier():
+                    raise TranscodeError(
+                        f"Invalid field name {field.name!r} in {msg_type}"
+                    )
+                ros_type = split_array_type(field.field_type)
+                base_type = ros_type.base_type
+                if not _is_builtin(base_type):
+                    base_type = resolve_msg_type(base_type, package_name)
+                    visit(base_type)
+                specs.append(
+                    _FieldSpec(
+                        field.name,
+                        number,
+                        base_type,
+                        ros_type.is_array,
+                        ros_type.array_size,
+                    )
+                )
+            visiting.discard(msg_type)
+            layouts[msg_type] = specs
+
+        visit(top_level)
+        return layouts
+
+    def _compile(self, top_level: str) -> Transcoder:
+        layouts = self._collect(top_level)
+        names = {msg_type: f"m{i}" for i, msg_type in enumerate(layouts)}
+        fixed_sizes: Dict[str, Optional[int]] = {}
+        writer = _ModuleWriter()
+
+        for msg_type, specs in layouts.items():
+            fixed_sizes[msg_type] = self._fixed_size(specs, fixed_sizes)
+            self._emit_decode(writer, msg_type, specs, names)
+            self._emit_size(writer, msg_type, specs, names, fixed_sizes)
+            self._emit_write(writer, msg_type, specs, names, fixed_sizes)
+            writer.emit(
+                0, f"_default_{names[msg_type]} = _decode_{names[msg_type]}(b'', 0, 0)"
+            )
+            writer.emit(0, "")
+
+        namespace = {
+            "struct": struct,
+            "_U32": _U32,
+            "_read_varint": _read_varint,
+            "_read_length": _read_length,
+            "_skip_field": _skip_field,
+            "_to_signed": _to_signed,
+            "_check_range": _check_range,
+            "_decode_time": _decode_time,
+            "_decode_char": _decode_char,
+            "_wire_error": _wire_error,
+            "_length_error": _length_error,
+            "TranscodeError": TranscodeError,
+        }
+        namespace.update(writer.constants)
+        source = writer.source
+        exec(compile(source, f"<r2pb transcoder {top_level}>", "exec"), namespace)
+
+        name = names[top_level]
+        return Transcoder(
+            top_level,
+            namespace[f"_decode_{name}"],
+            namespace[f"_size_{name}"],
+            namespace[f"_write_{name}"],
+            source,
+        )
+
+    @staticmethod
+    def _element_size(base_type: str, fixed_sizes) -> Optional[int]:
+        if base_type in _SCALARS:
+            return struct.calcsize("<" + _SCALARS[base_type].struct_code)
+        if base_type == "char":
+            return 1
+        if base_type in _TIME_RANGES:
+            return 8
+        if base_type == "string":
+            return None
+        return fixed_sizes[base_type]
+
+    def _fixed_size(self, specs: List[_FieldSpec], fixed_sizes) -> Optional[int]:
+        total = 0
+        for spec in specs:
+            element = self._element_size(spec.base_type, fixed_sizes)
+            if element is None or (spec.is_array and spec.array_size is None):
+                return None
+            total += element * (spec.array_size if spec.is_array else 1)
+        return total
+
+    # --- decode -----------------------------------------------------------
+
+    def _emit_decode(self, w: _ModuleWriter, msg_type, specs, names):
+        w.emit(0, f"def _decode_{names[msg_type]}(buf, pos, end):")
+        w.emit(1, f"# {msg_type!r}")
+        for i, spec in enumerate(specs):
+            w.emit(1, f"v{i} = {self._default_expr(spec, names)}")
+            if self._merges(spec):
+                w.emit(1, f"r{i} = None")
+        w.emit(1, "while pos < end:")
+        w.emit(2, "key, pos = _read_varint(buf, pos)")
+        w.emit(2, "number = key >> 3")
+        w.emit(2, "wire = key & 7")
+        for i, spec in enumerate(specs):
+            w.emit(2, f"{'if' if i == 0 else 'elif'} number == {spec.number}:")
+            self._emit_field_decode(w, i, spec, names, msg_type)
+        if specs:
+            w.emit(2, "else:")
+            w.emit(3, "pos = _skip_field(buf, pos, end, wire)")
+        else:
+            w.emit(2, "pos = _skip_field(buf, pos, end, wire)")
+        w.emit(1, "if pos != end:")
+        w.emit(2, f"raise TranscodeError({f'Malformed {msg_type} message'!r})")
+        for i, spec in enumerate(specs):
+            if spec.is_array and spec.array_size is not None:
+                self._emit_fixed_length_check(w, i, spec, names)
+        w.emit(1, f"return ({''.join(f'v{i}, ' for i in range(len(specs)))})")
+        w.emit(0, "")
+
+    @staticmethod
+    def _merges(spec: _FieldSpec) -> bool:
+        """Whether repeated occurrences of the field merge instead of replace.
+
+        That is the case for singular submessages, time and duration included.
+        """
+        base = spec.base_type
+        return not spec.is_array and (
+            base in _TIME_RANGES or not (base in _SCALARS or base in ("char", "string"))
+        )
+
+    def _default_expr(self, spec: _FieldSpec, names) -> str:
+        base = spec.base_type
+        if spec.is_array:
+            if base in ROS_BYTES_ARRAY_TYPES or base in ("float32", "float64"):
+                return "b''" if base in ROS_BYTES_ARRAY_TYPES else "bytearray()"
+            return "[]"
+        if base in _SCALARS:
+            return "0.0" if base.startswith("float") else "0"
+        if base == "char":
+            return "0"
+        if base in _TIME_RANGES:
+            return "(0, 0)"
+        if base == "string":
+            return "b''"
+        return f"_default_{names[base]}"
+
+    def _emit_fixed_length_check(self, w: _ModuleWriter, i, spec, names):
+        base, size = spec.base_type, spec.array_size
+        if base in ROS_BYTES_ARRAY_TYPES:
+            length_expr, default = f"len(v{i})", f"bytes({size})"
+        elif base in ("float32", "float64"):
+            itemsize = 4 if base == "float32" else 8
+            length_expr = f"len(v{i}) // {itemsize}"
+            default = f"bytearray({size * itemsize})"
+        else:
+            length_expr = f"len(v{i})"
+            if base in _SCALARS or base == "char":
+                element = "0"
+            elif base in _TIME_RANGES:
+                element = "(0, 0)"
+            elif base == "string":
+                element = "b''"
+            else:
+                element = f"_default_{names[base]}"
+            default = f"[{element}] * {size}"
+        w.emit(1, f"if {length_expr} != {size}:")
+        w.emit(2, f"if v{i}:")
+        w.emit(3, f"raise _length_error({spec.name!r}, {size}, {length_expr})")
+        w.emit(2, f"v{i} = {default}")
+
+    def _emit_scalar_read(self, w: _ModuleWriter, indent, scalar: _Scalar, field):
+        """Emits code that reads one element into `x`."""
+        if scalar.wire == _VARINT:
+            w.emit(indent, "x, pos = _read_varint(buf, pos)")
+            if scalar.signed:
+                w.emit(indent, "if x >= 0x8000000000000000:")
+                w.emit(indent + 1, "x -= 0x10000000000000000")
+            if scalar.low is None:
+                w.emit(indent, "x = 1 if x else 0")
+            else:
+                w.emit(indent, f"if x < {scalar.low} or x > {scalar.high}:")
+                w.emit(
+                    indent + 1,
+                    f"_check_range({field!r}, x, {scalar.low}, {scalar.high})",
+                )
+
+    def _emit_field_decode(
+        self, w: _ModuleWriter, i, spec: _FieldSpec, names, msg_type
+    ):
+        base, field = spec.base_type, f"{msg_type}.{spec.name}"
+        v = f"v{i}"
+
+        if spec.is_array and base in ROS_BYTES_ARRAY_TYPES:
+            w.emit(3, "if wire != 2:")
+            w.emit(4, f"raise _wire_error({field!r}, wire)")
+            w.emit(3, "start, pos = _read_length(buf, pos, end)")
+            w.emit(3, f"{v} = bytes(buf[start:pos])")
+            return
+
+        if base in ("float32", "float64"):
+            itemsize = 4 if base == "float32" else 8
+            wire = _FIXED32 if base == "float32" else _FIXED64
+            if spec.is_array:
+                # Packed little-endian floats are byte-identical to the ROS1
+                # array body, so the payload is kept as raw bytes.
+                w.emit(3, "if wire == 2:")
+                w.emit(4, "start, stop = _read_length(buf, pos, end)")
+                w.emit(4, f"if (stop - start) % {itemsize}:")
+                w.emit(
+                    5, f"raise TranscodeError({'Malformed packed field ' + field!r})"
+                )
+                w.emit(4, f"{v} += buf[start:stop]")
+                w.emit(4, "pos = stop")
+                w.emit(3, f"elif wire == {wire}:")
+                w.emit(4, f"if pos + {itemsize} > end:")
+                w.emit(5, f"raise TranscodeError({'Truncated field ' + field!r})")
+                w.emit(4, f"{v} += buf[pos:pos + {itemsize}]")
+                w.emit(4, f"pos += {itemsize}")
+            else:
+                code = _SCALARS[base].struct_code
+                w.emit(3, f"if wire == {wire}:")
+                w.emit(4, f"if pos + {itemsize} > end:")
+                w.emit(5, f"raise TranscodeError({'Truncated field ' + field!r})")
+                w.emit(4, f"{v} = struct.unpack_from('<{code}', buf, pos)[0]")
+                w.emit(4, f"pos += {itemsize}")
+            w.emit(3, "else:")
+            w.emit(4, f"raise _wire_error({field!r}, wire)")
+            return
+
+        if base in _SCALARS:
+            scalar = _SCALARS[base]
+            w.emit(3, "if wire == 0:")
+            self._emit_scalar_read(w, 4, scalar, field)
+            w.emit(4, f"{v}.append(x)" if spec.is_array else f"{v} = x")
+            if spec.is_array:
+                w.emit(3, "elif wire == 2:")
+                w.emit(4, "start, stop = _read_length(buf, pos, end)")
+                w.emit(4, "pos = start")
+                w.emit(4, "while pos < stop:")
+                self._emit_scalar_read(w, 5, scalar, field)
+                w.emit(5, f"{v}.append(x)")
+                w.emit(4, "if pos != stop:")
+                w.emit(
+                    5, f"raise TranscodeError({'Malformed packed field ' + field!r})"
+                )
+            w.emit(3, "else:")
+            w.emit(4, f"raise _wire_error({field!r}, wire)")
+            return
+
+        # Everything else is length-delimited.
+        w.emit(3, "if wire != 2:")
+        w.emit(4, f"raise _wire_error({field!r}, wire)")
+        w.emit(3, "start, pos = _read_length(buf, pos, end)")
+        # `SPAN` stands for the arguments locating the payload.
+        if base == "string":
+            value = "bytes(buf[start:pos])"
+        elif base == "char":
+            value = f"_decode_char(bytes(buf[start:pos]), {field!r})"
+        elif base in _TIME_RANGES:
+            low, high = _TIME_RANGES[base]
+            value = f"_decode_time(SPAN, {field!r}, {low}, {high})"
+        else:
+            value = f"_decode_{names[base]}(SPAN)"
+        if not self._merges(spec):
+            value = value.replace("SPAN", "buf, start, pos")
+            w.emit(3, f"{v}.append({value})" if spec.is_array else f"{v} = {value}")
+        else:
+            # A singular submessage that occurs again is merged into the
+            # earlier one, which protobuf defines as parsing the payloads
+            # concatenated. Only that rare case copies the payload.
+            r = f"r{i}"
+            w.emit(3, f"if {r} is None:")
+            w.emit(4, f"{r} = (start, pos)")
+            w.emit(4, f"{v} = {value.replace('SPAN', 'buf, start, pos')}")
+            w.emit(3, "else:")
+            w.emit(4, f"if type({r}) is tuple:")
+            w.emit(5, f"{r} = bytearray(buf[{r}[0]:{r}[1]])")
+            w.emit(4, f"{r} += buf[start:pos]")
+            w.emit(4, f"{v} = {value.replace('SPAN', f'{r}, 0, len({r})')}")
+
+    # --- size -------------------------------------------------------------
+
+    def _emit_size(self, w: _ModuleWriter, msg_type, specs, names, fixed_sizes):
+        w.emit(0, f"def _size_{names[msg_type]}(v):")
+        fixed = fixed_sizes[msg_type]
+        if fixed is not None:
+            w.emit(1, f"return {fixed}")
+            w.emit(0, "")
+            return
+
+        constant = 0
+        terms = []
+        for i, spec in enumerate(specs):
+            base = spec.base_type
+            element = self._element_size(base, fixed_sizes)
+            if not spec.is_array:
+                if element is not None:
+                    constant += element
+                elif base == "string":
+                    terms.append(f"4 + len(v[{i}])")
+                else:
+                    terms.append(f"_size_{names[base]}(v[{i}])")
+                continue
+
+            if spec.array_size is None:
+                constant += 4
+            if base in ROS_BYTES_ARRAY_TYPES or base in ("float32", "float64"):
+                terms.append(f"len(v[{i}])")
+            elif element is not None:
+                if spec.array_size is None:
+                    terms.append(f"{element} * len(v[{i}])")
+                else:
+                    constant += element * spec.array_size
+            elif base == "string":
+                terms.append(f"sum(4 + len(x) for x in v[{i}])")
+            else:
+                terms.append(f"sum(_size_{names[base]}(x) for x in v[{i}])")
+        w.emit(1, f"return {' + '.join([str(constant)] + terms)}")
+        w.emit(0, "")
+
+    # --- write ------------------------------------------------------------
+
+    def _emit_write(self, w: _ModuleWriter, msg_type, specs, names, fixed_sizes):
+        w.emit(0, f"def _write_{names[msg_type]}(v, out, off):")
+        run_codes: List[str] = []
+        run_args: List[str] = []
+
+        def flush():
+            if run_codes:
+                packer = w.constant("S", struct.Struct("<" + "".join(run_codes)))
+                w.emit(1, f"{packer}.pack_into(out, off, {', '.join(run_args)})")
+                w.emit(1, f"off += {packer}.size")
+                run_codes.clear()
+                run_args.clear()
+
+        for i, spec in enumerate(specs):
+            base = spec.base_type
+            # Consecutive fixed-width scalars are packed with one Struct call.
+            if not spec.is_array and (base in _SCALARS or base == "char"):
+                run_codes.append(
+                    _SCALARS[base].struct_code if base in _SCALARS else "B"
+                )
+                run_args.append(f"v[{i}]")
+                continue
+            if not spec.is_array and base in _TIME_RANGES:
+                code = "I" if base == "time" else "i"
+                run_codes.append(code * 2)
+                run_args.extend([f"v[{i}][0]", f"v[{i}][1]"])
+                continue
+            flush()
+            self._emit_compound_write(w, i, spec, names, fixed_sizes)
+        flush()
+        w.emit(1, "return off")
+        w.emit(0, "")
+
+    def _emit_compound_write(self, w: _ModuleWriter, i, spec, names, fixed_sizes):
+        base = spec.base_type
+        v = f"v[{i}]"
+        if not spec.is_array:
+            if base == "string":
+                w.emit(1, f"n = len({v})")
+                w.emit(1, "_U32.pack_into(out, off, n)")
+                w.emit(1, f"out[off + 4:off + 4 + n] = {v}")
+                w.emit(1, "off += 4 + n")
+            else:
+                w.emit(1, f"off = _write_{names[base]}({v}, out, off)")
+            return
+
+        if spec.array_size is None:
+            if base in ("float32", "float64"):
+                itemsize = 4 if base == "float32" else 8
+                w.emit(1, f"_U32.pack_into(out, off, len({v}) // {itemsize})")
+            else:
+                w.emit(1, f"_U32.pack_into(out, off, len({v}))")
+            w.emit(1, "off += 4")
+
+        if base in ROS_BYTES_ARRAY_TYPES or base in ("float32", "float64"):
+            w.emit(1, f"n = len({v})")
+            w.emit(1, f"out[off:off + n] = {v}")
+            w.emit(1, "off += n")
+        elif base in _SCALARS or base == "char":
+            code = _SCALARS[base].struct_code if base in _SCALARS else "B"
+            w.emit(1, f"n = len({v})")
+            w.emit(1, f"struct.pack_into('<%d{code}' % n, out, off, *{v})")
+            w.emit(1, f"off += n * {struct.calcsize(code)}")
+        elif base in _TIME_RANGES:
+            code = "I" if base == "time" else "i"
+            w.emit(1, f"for x in {v}:")
+            w.emit(2, f"struct.pack_into('<{code}{code}', out, off, x[0], x[1])")
+            w.emit(2, "off += 8")
+        elif base == "string":
+            w.emit(1, f"for x in {v}:")
+            w.emit(2, "n = len(x)")
+            w.emit(2, "_U32.pack_into(out, off, n)")
+            w.emit(2, "out[off + 4:off + 4 + n] = x")
+            w.emit(2, "off += 4 + n")
+        else:
+            w.emit(1, f"for x in {v}:")
+            w.emit(2, f"off = _write_{names[base]}(x, out, off)")
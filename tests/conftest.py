@@ -0,0 +1,65 @@
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from r2pb.parser import parse_msg_content
+
+# Message definitions shared by the tests, keyed by 'pkg/Msg'. Modules add
+# their own on top through the factories below.
+MESSAGES = {
+    "std_msgs/Header": "uint32 seq\ntime stamp\nstring frame_id",
+    "geometry_msgs/Point": "float64 x\nfloat64 y\nfloat64 z",
+    "geometry_msgs/Quaternion": "float64 x\nfloat64 y\nfloat64 z\nfloat64 w",
+    "geometry_msgs/Pose": "Point position\nQuaternion orientation",
+    "geometry_msgs/PoseStamped": "Header header\nPose pose",
+}
+
+
+@pytest.fixture
+def make_parser():
+    """Returns a factory of mock parsers serving MESSAGES and `extra`."""
+
+    def make(extra=None):
+        messages = {**MESSAGES, **(extra or {})}
+        parser = mock.Mock()
+        parser.parse.side_effect = lambda pkg, msg: parse_msg_content(
+            messages[f"{pkg}/{msg}"]
+        )
+        parser.cache_stats.return_value = {}
+        return parser
+
+    return make
+
+
+@pytest.fixture
+def make_workspace(tmp_path):
+    """Returns a factory writing MESSAGES and `extra` as .msg files.
+
+    The workspace is laid out as `<pkg>/msg/<Msg>.msg` under `tmp_path/ws`,
+    which is what MsgParser expects of local package paths.
+    """
+
+    def make(extra=None) -> Path:
+        root = tmp_path / "ws"
+        for msg_type, content in {**MESSAGES, **(extra or {})}.items():
+            package_name, msg_name = msg_type.split("/")
+            msg_dir = root / package_name / "msg"
+            msg_dir.mkdir(parents=True, exist_ok=True)
+            (msg_dir / f"{msg_name}.msg").write_text(content)
+        return root
+
+    return make
+
+
+@pytest.fixture
+def proto_files():
+    """Returns a function reading every .proto file below a directory."""
+
+    def read(root: Path):
+        return {
+            str(path.relative_to(root)): path.read_text()
+            for path in sorted(root.rglob("*.proto"))
+        }
+
+    return read
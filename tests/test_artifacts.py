@@ -0,0 +1,217 @@
+import stat
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from r2pb import artifacts
+from r2pb.artifacts import (
+    HttpArtifactStore,
+    LocalArtifactStore,
+    artifact_key,
+    open_artifact_store,
+    r2pb_version,
+    template_digest,
+)
+from r2pb.converter import Converter
+from r2pb.locking import default_file_mode
+from r2pb.generator import ProtoGenerator
+from r2pb.parser import MsgParser
+
+MESSAGES = {
+    "geometry_msgs/PointStamped": "std_msgs/Header header\ngeometry_msgs/Point point",
+}
+
+
+class _CacheHandler(BaseHTTPRequestHandler):
+    """A minimal in-memory HTTP cache standing in for a real one."""
+
+    def do_GET(self):
+        data = self.server.objects.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        length = int(self.headers["Content-Length"])
+        self.server.objects[self.path] = self.rfile.read(length)
+        self.send_response(201)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_cache():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _CacheHandler)
+    server.objects = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def workspace(make_workspace):
+    return make_workspace(MESSAGES)
+
+
+def _converter(workspace: Path, store) -> Converter:
+    converter = Converter(artifact_store=store)
+    converter._parser = MsgParser(local_package_paths=[workspace])
+    return converter
+
+
+def test_artifact_key_inputs():
+    """Test that the key changes with every input it is derived from."""
+    key = artifact_key("pkg/Msg", "int32 a", "t1", "1.0")
+    assert key == artifact_key("pkg/Msg", "int32 a", "t1", "1.0")
+    assert key != artifact_key("pkg/Msg", "int32 b", "t1", "1.0")
+    assert key != artifact_key("pkg/Other", "int32 a", "t1", "1.0")
+    assert key != artifact_key("pkg/Msg", "int32 a", "t2", "1.0")
+    assert key != artifact_key("pkg/Msg", "int32 a", "t1", "1.1")
+    assert len(template_digest(ProtoGenerator())) == 64
+
+
+def test_version_includes_source_digest():
+    """Test that artifact versions change with the generator source."""
+    with mock.patch.object(
+        artifacts, "version", side_effect=artifacts.PackageNotFoundError
+    ):
+        fallback = r2pb_version()
+        assert fallback.startswith("source/") and len(fallback) == 23
+        assert r2pb_version() == fallback
+
+    # An editable install reports a frozen version; the digest still counts.
+    with mock.patch.object(artifacts, "version", return_value="0.1.dev1"):
+        installed = r2pb_version()
+        assert installed == f"0.1.dev1/{fallback[len('source/'):]}"
+        with mock.patch.object(artifacts, "_source_digest", return_value="edited"):
+            assert r2pb_version() == "0.1.dev1/edited"
+
+
+def test_open_artifact_store(tmp_path):
+    assert isinstance(open_artifact_store(str(tmp_path)), LocalArtifactStore)
+    assert isinstance(open_artifact_store("http://cache:8080/r2pb"), HttpArtifactStore)
+
+
+def test_local_store_hits_skip_parsing_and_hardlink(workspace, tmp_path, proto_files):
+    """Test that a second conversion is served from the store as hardlinks."""
+    store = LocalArtifactStore(tmp_path / "store")
+    _converter(workspace, store).convert("geometry_msgs/PointStamped", tmp_path / "a")
+
+    converter = _converter(workspace, store)
+    converter._generator = mock.Mock(wraps=converter._generator)
+    converter.convert("geometry_msgs/PointStamped", tmp_path / "b")
+
+    converter._generator.generate_proto.assert_not_called()
+    assert proto_files(tmp_path / "b") == proto_files(tmp_path / "a")
+    assert len(proto_files(tmp_path / "b")) == 3
+
+    output = tmp_path / "b" / "std_msgs" / "Header.proto"
+    stored = next((tmp_path / "store").rglob("*.proto"))
+    assert output.stat().st_nlink > 1
+    assert stored.stat().st_mode & 0o222 == 0
+
+
+def test_local_store_damaged_objects_are_misses(workspace, tmp_path, capsys):
+    """Test that broken local objects are reported, regenerated and replaced."""
+    store = LocalArtifactStore(tmp_path / "store")
+    _converter(workspace, store).convert("std_msgs/Header", tmp_path / "a")
+    (meta_path,) = (tmp_path / "store").rglob("*.json")
+    (proto_path,) = (tmp_path / "store").rglob("*.proto")
+    intact = proto_path.read_bytes()
+
+    for damage, message in (
+        (lambda: meta_path.write_bytes(b"[]"), "Ignoring malformed artifact"),
+        (lambda: proto_path.write_bytes(b"edited"), "Ignoring corrupt artifact"),
+    ):
+        for path in (meta_path, proto_path):
+            path.chmod(0o644)
+        damage()
+        converter = _converter(workspace, store)
+        converter._generator = mock.Mock(wraps=converter._generator)
+        converter.convert("std_msgs/Header", tmp_path / "b")
+
+        assert message in capsys.readouterr().out
+        assert converter._generator.generate_proto.call_count == 1
+        assert proto_path.read_bytes() == intact
+        assert (tmp_path / "b" / "std_msgs" / "Header.proto").read_bytes() == intact
+        assert store.materialize(meta_path.stem, tmp_path / "c.proto") == []
+
+
+def test_misses_share_the_results_cache(workspace, tmp_path):
+    """Test that generated misses are cached like plain conversions."""
+    converter = _converter(workspace, LocalArtifactStore(tmp_path / "store"))
+    converter.convert("geometry_msgs/PointStamped", tmp_path / "a")
+    assert converter.cache_stats()["results"].entries == 3
+
+
+def test_changed_msg_misses(workspace, tmp_path):
+    """Test that editing a .msg file regenerates only that message."""
+    store = LocalArtifactStore(tmp_path / "store")
+    _converter(workspace, store).convert("geometry_msgs/PointStamped", tmp_path / "a")
+    (workspace / "geometry_msgs" / "msg" / "Point.msg").write_text("float32 x")
+
+    converter = _converter(workspace, store)
+    converter._generator = mock.Mock(wraps=converter._generator)
+    converter.convert("geometry_msgs/PointStamped", tmp_path / "b")
+
+    assert converter._generator.generate_proto.call_count == 1
+    point = (tmp_path / "b" / "geometry_msgs" / "Point.proto").read_text()
+    assert "float x = 1;" in point
+
+
+def test_http_store(workspace, tmp_path, http_cache, proto_files):
+    """Test sharing artifacts between workspaces through an HTTP cache."""
+    url = f"http://127.0.0.1:{http_cache.server_port}/r2pb"
+    _converter(workspace, HttpArtifactStore(url)).convert(
+        "geometry_msgs/PointStamped", tmp_path / "a"
+    )
+    assert len(http_cache.objects) == 6
+
+    converter = _converter(workspace, HttpArtifactStore(url))
+    converter._generator = mock.Mock(wraps=converter._generator)
+    converter.convert("geometry_msgs/PointStamped", tmp_path / "b")
+    converter._generator.generate_proto.assert_not_called()
+    assert proto_files(tmp_path / "b") == proto_files(tmp_path / "a")
+
+    # Downloaded files get the same permissions as generated ones.
+    for name in ("a", "b"):
+        path = tmp_path / name / "std_msgs" / "Header.proto"
+        assert stat.S_IMODE(path.stat().st_mode) == default_file_mode()
+
+
+def test_http_store_unavailable_is_a_miss(workspace, tmp_path, capsys):
+    """Test that an unreachable cache does not fail the conversion."""
+    store = HttpArtifactStore("http://127.0.0.1:9", timeout=1.0)
+    _converter(workspace, store).convert("std_msgs/Header", tmp_path / "out")
+    assert (tmp_path / "out" / "std_msgs" / "Header.proto").is_file()
+    assert "Artifact cache unavailable" in capsys.readouterr().out
+
+
+def test_http_store_malformed_metadata_is_a_miss(
+    workspace, tmp_path, http_cache, capsys
+):
+    """Test that a corrupt metadata object is reported and regenerated."""
+    url = f"http://127.0.0.1:{http_cache.server_port}/r2pb"
+    _converter(workspace, HttpArtifactStore(url)).convert(
+        "std_msgs/Header", tmp_path / "a"
+    )
+    (name,) = [n for n in http_cache.objects if n.endswith(".json")]
+    for body in (b"not json", b'{"msg_type": "std_msgs/Header"}', b"[]"):
+        http_cache.objects[name] = body
+        _converter(workspace, HttpArtifactStore(url)).convert(
+            "std_msgs/Header", tmp_path / "b"
+        )
+        assert "Ignoring malformed artifact metadata" in capsys.readouterr().out
+        assert (tmp_path / "b" / "std_msgs" / "Header.proto").is_file()
@@ -0,0 +1,69 @@
+import stat
+
+import pytest
+
+from r2pb.bundle import BundleError, MessageBundle, build_bundle, iter_package_msgs
+from r2pb.parser import Constant, Field, ParsedMsg
+
+
+@pytest.fixture
+def package_dir(tmp_path):
+    """Create a dummy std_msgs package."""
+    msg_dir = tmp_path / "ws" / "std_msgs" / "msg"
+    msg_dir.mkdir(parents=True)
+    (msg_dir / "String.msg").write_text("string data")
+    (msg_dir / "Header.msg").write_text(
+        "uint32 seq\ntime stamp\nstring frame_id\nuint8 FLAG = 1"
+    )
+    return tmp_path / "ws" / "std_msgs"
+
+
+def test_iter_package_msgs(package_dir):
+    """Test that every .msg file of a package is collected in order."""
+    messages = list(iter_package_msgs("std_msgs", package_dir))
+    assert messages == [
+        ("std_msgs/Header", "uint32 seq\ntime stamp\nstring frame_id\nuint8 FLAG = 1"),
+        ("std_msgs/String", "string data"),
+    ]
+
+
+def test_bundle_round_trip(package_dir, tmp_path):
+    """Test building a bundle and reading definitions and models back."""
+    path = tmp_path / "out" / "std.bundle"
+    assert build_bundle(path, iter_package_msgs("std_msgs", package_dir)) == 2
+
+    with MessageBundle(path) as bundle:
+        assert len(bundle) == 2
+        assert list(bundle) == ["std_msgs/Header", "std_msgs/String"]
+        assert "std_msgs/String" in bundle
+        assert "std_msgs/Missing" not in bundle
+
+        assert bundle.get_content("std_msgs", "String") == "string data"
+        assert bundle.get_parsed("std_msgs", "Header") == ParsedMsg(
+            fields=[
+                Field("uint32", "seq"),
+                Field("time", "stamp"),
+                Field("string", "frame_id"),
+            ],
+            constants=[Constant("uint8", "FLAG", "1")],
+        )
+        assert bundle.get_content("std_msgs", "Missing") is None
+        assert bundle.get_parsed("std_msgs", "Missing") is None
+
+
+def test_bundle_is_readable_by_others(package_dir, tmp_path):
+    """Test that a bundle gets the permissions of any file the user creates."""
+    path = tmp_path / "std.bundle"
+    build_bundle(path, iter_package_msgs("std_msgs", package_dir))
+    plain = tmp_path / "plain.txt"
+    plain.write_text("x")
+    assert stat.S_IMODE(path.stat().st_mode) == stat.S_IMODE(plain.stat().st_mode)
+
+
+@pytest.mark.parametrize("data", [b"", b"R2PB", b"NOTABUNDLE" + b"\0" * 40])
+def test_bundle_rejects_invalid_files(tmp_path, data):
+    """Test that empty, short and foreign files are rejected."""
+    path = tmp_path / "bad.bundle"
+    path.write_bytes(data)
+    with pytest.raises(BundleError):
+        MessageBundle(path)
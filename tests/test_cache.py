@@ -0,0 +1,133 @@
+import pytest
+
+from r2pb.cache import CacheStats, LRUCache, NegativeCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_negative_cache_replays_original_error():
+    """Test that a cached failure is raised again with the same message."""
+    cache = NegativeCache()
+    cache.check("package:missing")  # Nothing cached yet
+
+    cache.record("package:missing", KeyError("Package 'missing' not found"))
+    with pytest.raises(KeyError, match="Package 'missing' not found"):
+        cache.check("package:missing")
+    assert "package:missing" in cache
+
+
+def test_negative_cache_ignores_transient_errors():
+    """Test that errors other than lookup failures are not cached."""
+    cache = NegativeCache()
+    cache.record("package:flaky", OSError("network unreachable"))
+    cache.check("package:flaky")
+    assert "package:flaky" not in cache
+
+
+def test_negative_cache_entries_expire():
+    """Test that entries stop failing once their TTL has passed."""
+    clock = FakeClock()
+    cache = NegativeCache(ttl=60, clock=clock)
+    cache.record("msg:pkg/Msg", FileNotFoundError("Msg.msg not found"))
+
+    clock.now += 59
+    with pytest.raises(FileNotFoundError):
+        cache.check("msg:pkg/Msg")
+
+    clock.now += 2
+    cache.check("msg:pkg/Msg")
+    assert "msg:pkg/Msg" not in cache
+
+
+def test_negative_cache_persists_to_disk(tmp_path):
+    """Test that entries are shared through the cache file and can be cleared."""
+    path = tmp_path / "negative_cache.json"
+    NegativeCache(path=path).record("package:a", KeyError("a not found"))
+    NegativeCache(path=path).record("package:b", KeyError("b not found"))
+
+    reloaded = NegativeCache(path=path)
+    with pytest.raises(KeyError, match="a not found"):
+        reloaded.check("package:a")
+    assert "package:b" in reloaded
+
+    reloaded.invalidate("package:a")
+    assert "package:a" not in NegativeCache(path=path)
+    assert "package:b" in NegativeCache(path=path)
+
+    reloaded.invalidate()
+    assert "package:b" not in NegativeCache(path=path)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "{not json",
+        "[]",
+        '{"package:a": {"error": "KeyError", "message": "a not found"}}',
+        '{"package:a": {"error": "KeyError", "expires": 1e12}}',
+        '{"package:a": {"error": "KeyError", "message": "a", "expires": "soon"}}',
+        '{"package:a": ["KeyError", "a not found", 1e12]}',
+    ],
+)
+def test_negative_cache_ignores_corrupt_file(tmp_path, content):
+    """Test that unreadable files and malformed entries are treated as absent."""
+    path = tmp_path / "negative_cache.json"
+    path.write_text(content)
+    cache = NegativeCache(path=path)
+    cache.check("package:a")
+    cache.record("package:a", KeyError("a not found"))
+    assert "package:a" in NegativeCache(path=path)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test entry-count eviction and hit/miss accounting."""
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats.entries, stats.hits, stats.misses, stats.evictions) == (2, 2, 1, 1)
+    assert stats.hit_rate == pytest.approx(2 / 3)
+
+
+def test_lru_cache_byte_budget():
+    """Test that the byte budget is enforced and replacements are re-counted."""
+    cache = LRUCache(max_bytes=10, sizeof=lambda obj: len(obj))
+    cache.put("a", "xxxx")  # 5 bytes
+    cache.put("b", "yyyy")  # 10 bytes
+    assert cache.stats().bytes == 10
+
+    cache.put("a", "xx")  # Replacing "a" frees 2 bytes
+    assert cache.stats() == CacheStats(
+        entries=2, bytes=8, hits=0, misses=0, evictions=0
+    )
+
+    cache.put("c", "zzzz")  # Over budget: "b" goes first
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.stats().bytes == 8
+
+    cache.put("big", "z" * 20)  # Larger than the whole budget: not cached
+    assert "big" not in cache and len(cache) == 2
+    assert cache.pop("a") == "xx"
+    assert cache.stats().bytes == 5
+
+
+def test_negative_cache_is_bounded():
+    """Test that the in-memory negative cache keeps at most max_entries."""
+    cache = NegativeCache(max_entries=2)
+    for name in ["a", "b", "c"]:
+        cache.record(f"package:{name}", KeyError(name))
+    assert "package:a" not in cache
+    assert "package:c" in cache
+    assert cache.stats().evictions == 1
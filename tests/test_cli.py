@@ -1,6 +1,10 @@
+import sys
+import tempfile
 import unittest
-from unittest.mock import patch, MagicMock
+from pathlib import Path
+from unittest.mock import patch, MagicMock, ANY
 from r2pb import cli
+from r2pb.sharding import Shard, make_plan
 
 
 class TestCli(unittest.TestCase):
@@ -11,9 +15,16 @@ class TestCli(unittest.TestCase):
         """Test the main CLI flow with mocked arguments and converter."""
         # Arrange: Mock the parsed arguments
         mock_args = MagicMock()
-        mock_args.msg_type = "std_msgs/String"
+        mock_args.msg_type = ["std_msgs/String"]
         mock_args.output_dir = "/tmp/proto_test"
+        mock_args.shard = None
+        mock_args.shard_plan = None
         mock_args.ros_distro = "noetic"
+        mock_args.descriptor_set = None
+        mock_args.negative_cache = None
+        mock_args.negative_cache_ttl = 600.0
+        mock_args.clear_negative_cache = False
+        mock_args.artifact_cache = None
         mock_parse_args.return_value = mock_args
 
         # Arrange: Mock the Converter instance and its methods
@@ -24,9 +35,95 @@ class TestCli(unittest.TestCase):
         cli.main()
 
         # Assert: Check if Converter was initialized and called correctly
-        mock_converter_class.assert_called_once_with(ros_distro="noetic")
+        mock_converter_class.assert_called_once_with(
+            ros_distro="noetic", negative_cache=ANY, artifact_store=None
+        )
         mock_converter_instance.convert.assert_called_once_with(
-            "std_msgs/String", "/tmp/proto_test"
+            ["std_msgs/String"], "/tmp/proto_test", shard=None, plan=None
+        )
+
+
+class TestBundleCli(unittest.TestCase):
+
+    def test_bundle_build_and_use(self):
+        """Test building a bundle from a local package and converting with it."""
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            msg_dir = tmp / "ws" / "std_msgs" / "msg"
+            msg_dir.mkdir(parents=True)
+            (msg_dir / "String.msg").write_text("string data")
+            bundle_path = tmp / "std.bundle"
+
+            with patch.object(
+                sys,
+                "argv",
+                ["r2pb", "bundle", "build", str(bundle_path), "std_msgs"]
+                + ["-p", str(tmp / "ws")],
+            ):
+                cli.main()
+            self.assertTrue(bundle_path.is_file())
+
+            with patch.object(
+                sys,
+                "argv",
+                ["r2pb", "bundle", "use", str(bundle_path), "std_msgs/String"]
+                + ["-o", str(tmp / "out")],
+            ):
+                cli.main()
+            proto = (tmp / "out" / "std_msgs" / "String.proto").read_text()
+            self.assertIn("string data = 1;", proto)
+
+
+class TestMcapCli(unittest.TestCase):
+
+    @patch("r2pb.mcap_convert.convert_mcap")
+    def test_mcap_subcommand(self, mock_convert):
+        """Test that `r2pb mcap` forwards its options to convert_mcap."""
+        mock_convert.return_value = MagicMock(messages=3, translated=2, channels=2)
+        with patch.object(
+            sys,
+            "argv",
+            ["r2pb", "mcap", "in.mcap", "out.mcap", "-j", "4"]
+            + ["--compression", "lz4"],
+        ):
+            cli.main()
+        mock_convert.assert_called_once_with(
+            "in.mcap",
+            "out.mcap",
+            workers=4,
+            chunk_size=1024 * 1024,
+            compression="lz4",
+        )
+
+
+class TestShardPlanCli(unittest.TestCase):
+
+    @patch("r2pb.cli.Converter")
+    def test_plan_and_use_plan(self, mock_converter_class):
+        """Test writing a shard plan and handing it to a node."""
+        graph = {"nav_msgs/Path": ["std_msgs/Header"], "std_msgs/Header": []}
+        mock_converter = mock_converter_class.return_value
+        mock_converter.plan_shards.return_value = make_plan(["nav_msgs/Path"], graph, 2)
+        with tempfile.TemporaryDirectory() as tmp:
+            plan_path = str(Path(tmp) / "plan.json")
+            with patch.object(
+                sys, "argv", ["r2pb", "plan", plan_path, "nav_msgs/Path", "-n", "2"]
+            ):
+                cli.main()
+            mock_converter.plan_shards.assert_called_once_with(["nav_msgs/Path"], 2)
+
+            with patch.object(
+                sys,
+                "argv",
+                ["r2pb", "nav_msgs/Path", "--shard", "2/2"]
+                + ["--shard-plan", plan_path, "-o", tmp],
+            ):
+                cli.main()
+        mock_converter.convert.assert_called_once_with(
+            ["nav_msgs/Path"],
+            tmp,
+            shard=Shard(2, 2),
+            plan=mock_converter.plan_shards.return_value,
         )
 
 
@@ -1,9 +1,15 @@
+import stat
+import threading
+import time
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest import mock
 
+from r2pb.cache import LRUCache
 from r2pb.converter import Converter
-from r2pb.parser import ParsedMsg, Field
+from r2pb.generator import ProtoGenerator
+from r2pb.parser import ParsedMsg, Field, parse_msg_content
 
 
 def test_converter_basic(tmp_path: Path):
@@ -94,3 +100,130 @@ def test_converter_failure(tmp_path: Path, capsys):
     captured = capsys.readouterr()
     assert "Failed to convert bad_pkg/BadMessage" in captured.out
     assert not (output_dir / "bad_pkg").exists()
+
+
+def test_converter_shared_between_threads(tmp_path: Path):
+    """Test that concurrent conversions share one parse per message."""
+    messages = {
+        ("my_pkg", "Top"): "std_msgs/Header header\nmy_pkg/Leaf leaf",
+        ("my_pkg", "Leaf"): "std_msgs/Header header\nint32 value",
+        ("std_msgs", "Header"): "uint32 seq\ntime stamp\nstring frame_id",
+    }
+    parse_counts = {}
+    counts_lock = threading.Lock()
+
+    def slow_parse(pkg, msg):
+        with counts_lock:
+            parse_counts[(pkg, msg)] = parse_counts.get((pkg, msg), 0) + 1
+        time.sleep(0.05)  # Keep the parse in flight while other threads arrive
+        return parse_msg_content(messages[(pkg, msg)])
+
+    mock_parser = mock.Mock()
+    mock_parser.parse.side_effect = slow_parse
+
+    converter = Converter()
+    converter._parser = mock_parser
+    converter._generator = ProtoGenerator()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [
+            pool.submit(converter.convert, "my_pkg/Top", tmp_path / f"out{i}")
+            for i in range(8)
+        ]
+        for future in futures:
+            future.result()
+
+    assert parse_counts == {key: 1 for key in messages}
+    for i in range(8):
+        assert (tmp_path / f"out{i}" / "std_msgs" / "Header.proto").exists()
+        assert (tmp_path / f"out{i}" / "my_pkg" / "Leaf.proto").exists()
+
+    # A later call reuses the cached results but still writes its own files.
+    converter.convert("my_pkg/Top", tmp_path / "again")
+    assert mock_parser.parse.call_count == len(messages)
+    assert (tmp_path / "again" / "my_pkg" / "Top.proto").exists()
+
+
+def test_converter_failure_is_not_cached(tmp_path: Path):
+    """Test that a failed message is retried by the next call."""
+    mock_parser = mock.Mock()
+    mock_parser.parse.side_effect = [
+        IOError("temporary failure"),
+        parse_msg_content("int32 value"),
+    ]
+
+    converter = Converter()
+    converter._parser = mock_parser
+    converter._generator = ProtoGenerator()
+
+    with pytest.raises(IOError, match="temporary failure"):
+        converter.convert("my_pkg/Flaky", tmp_path)
+    converter.convert("my_pkg/Flaky", tmp_path)
+
+    assert (tmp_path / "my_pkg" / "Flaky.proto").exists()
+    assert converter._in_flight == {}
+
+
+def test_iter_convert_yields_dependencies_first(make_parser):
+    """Test that records arrive lazily, once each, after their dependencies."""
+    messages = {
+        "my_pkg/Top": "std_msgs/Header header\nmy_pkg/Leaf[] leaves\nmy_pkg/Other o",
+        "my_pkg/Leaf": "std_msgs/Header header\nint32 value",
+        "my_pkg/Other": "my_pkg/Leaf leaf",
+    }
+    converter = Converter()
+    converter._parser = make_parser(messages)
+
+    records = converter.iter_convert(["my_pkg/Top", "my_pkg/Leaf"])
+    assert converter._parser.parse.call_count == 0
+
+    first = next(records)
+    assert first.msg_type == "std_msgs/Header"
+    assert first.dependencies == []
+    assert "string frame_id = 3;" in first.proto_text
+    # Only the path from the root to the first leaf has been parsed so far.
+    assert converter._parser.parse.call_count == 3
+
+    order = [first.msg_type] + [record.msg_type for record in records]
+    assert order == ["std_msgs/Header", "my_pkg/Leaf", "my_pkg/Other", "my_pkg/Top"]
+    assert converter._parser.parse.call_count == len(messages) + 1  # + Header
+    assert len(converter._results) == 0
+
+
+def test_iter_convert_rejects_cycles(make_parser):
+    """Test that circular dependencies are reported instead of looping."""
+    converter = Converter()
+    converter._parser = make_parser(
+        {"my_pkg/A": "my_pkg/B b", "my_pkg/B": "my_pkg/A a"}
+    )
+    with pytest.raises(ValueError, match="Circular dependency: my_pkg/A"):
+        list(converter.iter_convert("my_pkg/A"))
+
+
+def test_converter_results_cache_is_bounded():
+    """Test that generated results respect the configured cache limits."""
+    converter = Converter(results_cache=LRUCache(max_entries=2))
+    converter._parser = mock.Mock()
+    converter._parser.parse.return_value = parse_msg_content("int32 value")
+    converter._parser.cache_stats.return_value = {}
+
+    for i in range(5):
+        converter._get_or_generate(f"my_pkg/Msg{i}")
+    converter._get_or_generate("my_pkg/Msg4")
+
+    stats = converter.cache_stats()["results"]
+    assert stats.entries == 2
+    assert stats.evictions == 3
+    assert (stats.hits, stats.misses) == (1, 5)
+
+
+def test_converted_files_honour_umask(tmp_path: Path, make_parser):
+    """Test that generated files are as readable as any file the user creates."""
+    converter = Converter()
+    converter._parser = make_parser()
+    converter.convert("geometry_msgs/Point", tmp_path / "out")
+
+    plain = tmp_path / "plain.txt"
+    plain.write_text("x")
+    proto = tmp_path / "out" / "geometry_msgs" / "Point.proto"
+    assert stat.S_IMODE(proto.stat().st_mode) == stat.S_IMODE(plain.stat().st_mode)
@@ -0,0 +1,150 @@
+import shutil
+import subprocess
+import textwrap
+
+import pytest
+
+pytest.importorskip("google.protobuf")
+
+from google.protobuf import descriptor_pb2
+
+from r2pb.converter import Converter
+from r2pb.parser import parse_msg_content
+from r2pb.descriptor import (
+    DescriptorBuilder,
+    MessagePool,
+    build_file_descriptor,
+)
+
+MESSAGES = {
+    "sensor_msgs/Cloud": textwrap.dedent("""
+        std_msgs/Header header
+        uint8[] data
+        float64[9] covariance
+        geometry_msgs/Point[] points
+        """),
+    "sensor_msgs/Imu": "Header header\nQuaternion orientation",
+    "sensor_msgs/Quaternion": "float64 x\nfloat64 y\nfloat64 z\nfloat64 w",
+    "sensor_msgs/Trigger": "Header header\nduration delay\ntime[] stamps",
+}
+
+
+@pytest.fixture
+def builder(make_parser):
+    return DescriptorBuilder(make_parser(MESSAGES))
+
+
+def test_build_file_descriptor_fields():
+    """Test that descriptor fields match the generated .proto layout."""
+    parsed_msg = parse_msg_content(MESSAGES["sensor_msgs/Cloud"])
+    file_proto = build_file_descriptor(parsed_msg, "sensor_msgs", "Cloud")
+    FieldProto = descriptor_pb2.FieldDescriptorProto
+
+    assert file_proto.name == "sensor_msgs/Cloud.proto"
+    assert file_proto.package == "sensor_msgs"
+    assert list(file_proto.dependency) == [
+        "geometry_msgs/Point.proto",
+        "std_msgs/Header.proto",
+    ]
+
+    header, data, covariance, points = file_proto.message_type[0].field
+    assert (header.number, header.type_name) == (1, ".std_msgs.Header")
+    assert (data.number, data.type) == (2, FieldProto.TYPE_BYTES)
+    assert covariance.label == FieldProto.LABEL_REPEATED
+    assert covariance.type == FieldProto.TYPE_DOUBLE
+    assert covariance.options.packed
+    assert points.label == FieldProto.LABEL_REPEATED
+    assert points.type_name == ".geometry_msgs.Point"
+    assert not points.options.HasField("packed")
+
+
+def test_build_set_orders_dependencies_first(builder):
+    """Test that every file in the set follows the files it imports."""
+    file_set = builder.build_set("sensor_msgs/Cloud")
+    names = [f.name for f in file_set.file]
+
+    assert sorted(names) == [
+        "geometry_msgs/Point.proto",
+        "google/protobuf/timestamp.proto",
+        "sensor_msgs/Cloud.proto",
+        "std_msgs/Header.proto",
+    ]
+    for index, file_proto in enumerate(file_set.file):
+        for dep in file_proto.dependency:
+            assert names.index(dep) < index
+
+
+def test_message_pool_round_trip(builder, tmp_path):
+    """Test loading a written descriptor set and using its message classes."""
+    path = builder.write_set(["sensor_msgs/Cloud"], tmp_path / "out" / "msgs.pb")
+    pool = MessagePool.from_file(path)
+
+    Cloud = pool.get_message_class("sensor_msgs.Cloud")
+    assert pool.get_message_class("sensor_msgs.Cloud") is Cloud
+
+    msg = Cloud(data=b"\x00\x01", covariance=[1.0] * 9)
+    msg.header.stamp.seconds = 42
+    msg.points.add(x=1.0, y=2.0, z=3.0)
+
+    decoded = Cloud.FromString(msg.SerializeToString())
+    assert decoded.header.stamp.seconds == 42
+    assert decoded.data == b"\x00\x01"
+    assert list(decoded.covariance) == [1.0] * 9
+    assert decoded.points[0].z == 3.0
+
+
+def test_unqualified_types_resolve(builder):
+    """Test that a bare Header and same-package types build a usable pool."""
+    file_set = builder.build_set("sensor_msgs/Imu")
+    imu_file = file_set.file[-1]
+    assert list(imu_file.dependency) == [
+        "sensor_msgs/Quaternion.proto",
+        "std_msgs/Header.proto",
+    ]
+    header, orientation = imu_file.message_type[0].field
+    assert header.type_name == ".std_msgs.Header"
+    assert orientation.type_name == ".sensor_msgs.Quaternion"
+
+    pool = builder.build_pool("sensor_msgs/Imu")
+    imu = pool.get_message_class("sensor_msgs.Imu")()
+    imu.header.frame_id = "imu"
+    imu.orientation.w = 1.0
+    assert imu.ByteSize() > 0
+
+
+def test_generated_proto_text_matches_descriptors(make_parser, tmp_path):
+    """Test that protoc accepts the .proto text and agrees with build_set."""
+    protoc = shutil.which("protoc")
+    if protoc is None:
+        pytest.skip("protoc is not installed")
+    parser = make_parser(MESSAGES)
+    converter = Converter()
+    converter._parser = parser
+    converter.convert(["sensor_msgs/Cloud", "sensor_msgs/Trigger"], tmp_path / "out")
+
+    compiled = tmp_path / "compiled.pb"
+    subprocess.run(
+        [
+            protoc,
+            f"--proto_path={tmp_path / 'out'}",
+            "--include_imports",
+            f"--descriptor_set_out={compiled}",
+            "sensor_msgs/Cloud.proto",
+            "sensor_msgs/Trigger.proto",
+        ],
+        check=True,
+    )
+    from_text = descriptor_pb2.FileDescriptorSet.FromString(compiled.read_bytes())
+    built = DescriptorBuilder(parser).build_set(
+        ["sensor_msgs/Cloud", "sensor_msgs/Trigger"]
+    )
+
+    def imports(file_set):
+        return {f.name: sorted(f.dependency) for f in file_set.file}
+
+    assert imports(from_text) == imports(built)
+    assert imports(built)["sensor_msgs/Trigger.proto"] == [
+        "google/protobuf/duration.proto",
+        "google/protobuf/timestamp.proto",
+        "std_msgs/Header.proto",
+    ]
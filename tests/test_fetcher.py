@@ -1,6 +1,12 @@
+import contextlib
+import io
+import multiprocessing
+import threading
+import time
 import pytest
 from pathlib import Path
 from unittest.mock import MagicMock
+from git import Repo
 
 from r2pb.fetcher import RosMsgFetcher, ROS_MSG_REPOS
 
@@ -48,10 +54,15 @@ def test_fetch_package_clone(fetcher, mock_git_repo, tmp_path):
     repo_url = ROS_MSG_REPOS["std_msgs"]
     package_path = fetcher.fetch_package("std_msgs", repo_url)
 
-    # 验证 clone_from 被正确调用
-    mock_repo_class.clone_from.assert_called_once_with(repo_url, tmp_path / "std_msgs")
-    # 验证返回的路径是否正确
+    # 验证 clone_from 被调用，且克隆先写入临时目录
+    mock_repo_class.clone_from.assert_called_once()
+    clone_url, clone_path = mock_repo_class.clone_from.call_args[0]
+    assert clone_url == repo_url
+    assert clone_path != tmp_path / "std_msgs"
+    # 验证临时目录已被原子重命名为最终路径
     assert package_path == tmp_path / "std_msgs" / "std_msgs"
+    assert package_path.is_dir()
+    assert not clone_path.exists()
 
 
 def test_fetch_package_update(fetcher, mock_git_repo, tmp_path):
@@ -98,3 +109,103 @@ def test_fetch_package_not_in_repo(fetcher, mock_git_repo):
         FileNotFoundError, match="'wrong_pkg' not found in repository 'std_msgs'"
     ):
         fetcher.fetch_package("wrong_pkg", repo_url)
+
+
+def test_find_and_fetch_missing_package_fails_fast(fetcher, mock_git_repo):
+    """测试找不到的包会被负缓存，再次查找时不再访问远程仓库。"""
+    mock_repo_class, mock_repo_instance = mock_git_repo
+    with pytest.raises(KeyError, match="'non_existent_pkg' not found"):
+        fetcher.find_and_fetch("non_existent_pkg")
+    mock_repo_class.clone_from.reset_mock()
+    mock_repo_instance.reset_mock()
+
+    with pytest.raises(KeyError, match="'non_existent_pkg' not found"):
+        fetcher.find_and_fetch("non_existent_pkg")
+    mock_repo_class.clone_from.assert_not_called()
+    mock_repo_instance.remotes.origin.pull.assert_not_called()
+
+    # 失效后会重新走完整的查找流程
+    fetcher.negative_cache.invalidate()
+    fetcher.refresh_interval = 0
+    with pytest.raises(KeyError):
+        fetcher.find_and_fetch("non_existent_pkg")
+    mock_repo_instance.remotes.origin.pull.assert_called_once()
+
+
+def test_fetch_package_skips_recently_fetched_repo(fetcher, mock_git_repo, tmp_path):
+    """测试刚被获取过的仓库不会被重复拉取。"""
+    mock_repo_class, mock_repo_instance = mock_git_repo
+    repo_url = ROS_MSG_REPOS["std_msgs"]
+
+    fetcher.fetch_package("std_msgs", repo_url)
+    fetcher.fetch_package("std_msgs", repo_url)
+
+    mock_repo_class.clone_from.assert_called_once()
+    mock_repo_instance.remotes.origin.pull.assert_not_called()
+
+
+def test_pull_waits_for_readers(fetcher, mock_git_repo, tmp_path):
+    """测试原地 git pull 会等待正在读取仓库的读取者。"""
+    mock_repo_class, mock_repo_instance = mock_git_repo
+    repo_url = ROS_MSG_REPOS["std_msgs"]
+    package_path = fetcher.fetch_package("std_msgs", repo_url)
+    fetcher.refresh_interval = 0
+    events = []
+    mock_repo_instance.remotes.origin.pull.side_effect = lambda: events.append("pull")
+
+    # 本地包不在缓存目录中，无需加锁。
+    assert isinstance(fetcher.reading(tmp_path.parent), contextlib.nullcontext)
+
+    with fetcher.reading(package_path), fetcher.reading(package_path):
+        thread = threading.Thread(
+            target=fetcher.fetch_package, args=("std_msgs", repo_url)
+        )
+        thread.start()
+        time.sleep(0.1)
+        events.append("read")
+    thread.join()
+    assert events == ["read", "pull"]
+
+
+def test_fetch_package_removes_interrupted_clone(fetcher, mock_git_repo, tmp_path):
+    """测试被中断的克隆留下的临时目录会被清理。"""
+    stale = tmp_path / ".std_msgs.abc123.tmp"
+    (stale / "half_written").mkdir(parents=True)
+
+    fetcher.fetch_package("std_msgs", ROS_MSG_REPOS["std_msgs"])
+
+    assert not stale.exists()
+
+
+def _fetch_in_subprocess(cache_dir, repo_url):
+    """在子进程中获取包，返回包路径和输出。"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        path = RosMsgFetcher(cache_dir=Path(cache_dir)).fetch_package(
+            "my_msgs", repo_url
+        )
+    return str(path), output.getvalue()
+
+
+def test_fetch_package_shared_between_processes(tmp_path):
+    """测试多个进程共享缓存目录时只克隆一次，且都能得到完整的仓库。"""
+    origin = tmp_path / "origin" / "my_msgs"
+    (origin / "msg").mkdir(parents=True)
+    (origin / "msg" / "Data.msg").write_text("string data")
+    (origin / "package.xml").write_text("<package/>")
+    repo = Repo.init(origin)
+    repo.index.add(["msg/Data.msg", "package.xml"])
+    repo.index.commit("init")
+
+    cache_dir = tmp_path / "cache"
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(4) as pool:
+        results = pool.starmap(
+            _fetch_in_subprocess, [(str(cache_dir), str(origin))] * 4
+        )
+
+    paths = {path for path, _ in results}
+    assert paths == {str(cache_dir / "my_msgs")}
+    assert (cache_dir / "my_msgs" / "msg" / "Data.msg").read_text() == "string data"
+    assert sum("Cloning repository" in output for _, output in results) == 1
+    assert not list(cache_dir.glob(".my_msgs.*.tmp"))
@@ -89,3 +89,67 @@ def test_generate_proto_no_dependencies():
 
     assert actual_lines == expected_lines
     assert dependencies == []
+
+
+def test_generate_proto_with_arrays():
+    """Test that ROS arrays map to bytes and packed repeated fields."""
+    msg_content = textwrap.dedent(
+        """
+        uint8[] data
+        char[] label
+        float64[36] covariance
+        int32[] ids
+        string[] names
+        geometry_msgs/Point[] points
+        """
+    )
+    parsed_msg = parse_msg_content(msg_content)
+    generator = ProtoGenerator()
+
+    proto_content, dependencies = generator.generate_proto(
+        parsed_msg, package_name="my_package", msg_name="Cloud"
+    )
+
+    expected_proto = textwrap.dedent(
+        """
+        // Generated by r2pb - from my_package/Cloud.msg
+        syntax = "proto3";
+
+        package my_package;
+
+        import "geometry_msgs/Point.proto";
+
+        message Cloud {
+          bytes data = 1;
+          bytes label = 2;
+          repeated double covariance = 3 [packed = true]; // fixed size: 36
+          repeated int32 ids = 4 [packed = true];
+          repeated string names = 5;
+          repeated geometry_msgs.Point points = 6;
+        }
+        """
+    ).strip()
+
+    actual_lines = [
+        line.strip() for line in proto_content.strip().splitlines() if line.strip()
+    ]
+    expected_lines = [
+        line.strip() for line in expected_proto.strip().splitlines() if line.strip()
+    ]
+
+    assert actual_lines == expected_lines
+    assert dependencies == ["geometry_msgs/Point"]
+
+
+def test_generate_proto_resolves_unqualified_types():
+    """Test that bare 'Header' and same-package types are qualified and imported."""
+    generator = ProtoGenerator()
+    parsed_msg = parse_msg_content("Header header\nQuaternion[] orientations")
+    proto_content, dependencies = generator.generate_proto(
+        parsed_msg, package_name="sensor_msgs", msg_name="Imu"
+    )
+
+    assert dependencies == ["sensor_msgs/Quaternion", "std_msgs/Header"]
+    assert 'import "std_msgs/Header.proto";' in proto_content
+    assert "std_msgs.Header header = 1;" in proto_content
+    assert "repeated sensor_msgs.Quaternion orientations = 2;" in proto_content
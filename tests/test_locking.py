@@ -0,0 +1,78 @@
+import stat
+import threading
+import time
+
+import pytest
+
+from r2pb.locking import FileLock, LockTimeout, atomic_write, fcntl
+
+
+def test_file_lock_excludes_other_holders(tmp_path):
+    """Test that a second lock on the same file waits for the first."""
+    path = tmp_path / "repo.lock"
+    events = []
+
+    def worker():
+        with FileLock(path):
+            events.append("worker")
+
+    with FileLock(path) as lock:
+        assert lock.is_locked
+        thread = threading.Thread(target=worker)
+        thread.start()
+        time.sleep(0.1)
+        events.append("main")
+    thread.join()
+
+    assert events == ["main", "worker"]
+    assert not lock.is_locked
+
+
+def test_file_lock_timeout(tmp_path):
+    """Test that acquiring a held lock gives up after the timeout."""
+    path = tmp_path / "repo.lock"
+    with FileLock(path):
+        with pytest.raises(LockTimeout):
+            FileLock(path, timeout=0.1).acquire()
+    # Released locks can be acquired again.
+    with FileLock(path, timeout=0.1):
+        pass
+
+
+@pytest.mark.skipif(fcntl is None, reason="shared locks need flock()")
+def test_shared_locks_exclude_only_exclusive_holders(tmp_path):
+    """Test that shared holders coexist and an exclusive lock waits for them."""
+    path = tmp_path / "repo.lock"
+    with FileLock(path, shared=True), FileLock(path, shared=True, timeout=0.1):
+        with pytest.raises(LockTimeout):
+            FileLock(path, timeout=0.1).acquire()
+    with FileLock(path):
+        with pytest.raises(LockTimeout):
+            FileLock(path, shared=True, timeout=0.1).acquire()
+
+
+def test_atomic_write_honours_umask(tmp_path):
+    """Test that files get the permissions a plain open() would give them."""
+    plain = tmp_path / "plain.txt"
+    plain.write_text("x")
+    path = tmp_path / "atomic.txt"
+    with atomic_write(path) as f:
+        f.write("content")
+
+    assert path.read_text() == "content"
+    assert stat.S_IMODE(path.stat().st_mode) == stat.S_IMODE(plain.stat().st_mode)
+    with atomic_write(path, binary=True, mode=0o444) as f:
+        f.write(b"read-only")
+    assert stat.S_IMODE(path.stat().st_mode) == 0o444
+
+
+def test_atomic_write_keeps_old_file_on_error(tmp_path):
+    """Test that a failed write leaves neither a partial file nor a temp file."""
+    path = tmp_path / "data.json"
+    path.write_text("old")
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as f:
+            f.write("partial")
+            raise RuntimeError("boom")
+    assert path.read_text() == "old"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["data.json"]
@@ -1,5 +1,5 @@
 import pytest
-from r2pb.mapper import map_ros_to_proto_type
+from r2pb.mapper import map_ros_to_proto_type, split_array_type, RosType
 
 
 @pytest.mark.parametrize(
@@ -12,8 +12,24 @@ from r2pb.mapper import map_ros_to_proto_type
         ("time", "google.protobuf.Timestamp"),
         ("std_msgs/Header", "Header"),
         ("geometry_msgs/Pose", "Pose"),
+        ("float64[36]", "double"),
+        ("geometry_msgs/Point[]", "Point"),
     ],
 )
 def test_map_ros_to_proto_type(ros_type, proto_type):
     """Tests mapping of various ROS types to Protobuf types."""
     assert map_ros_to_proto_type(ros_type) == proto_type
+
+
+@pytest.mark.parametrize(
+    "ros_type, expected",
+    [
+        ("uint8", RosType("uint8")),
+        ("uint8[]", RosType("uint8", True, None)),
+        ("float64[9]", RosType("float64", True, 9)),
+        ("geometry_msgs/Point[]", RosType("geometry_msgs/Point", True, None)),
+    ],
+)
+def test_split_array_type(ros_type, expected):
+    """Tests splitting ROS array types into element type and size."""
+    assert split_array_type(ros_type) == expected
@@ -0,0 +1,183 @@
+import struct
+
+import pytest
+
+pytest.importorskip("mcap")
+pytest.importorskip("google.protobuf")
+
+from google.protobuf import descriptor_pb2  # noqa: E402
+from mcap.reader import make_reader  # noqa: E402
+from mcap.writer import CompressionType, Writer  # noqa: E402
+
+from r2pb.descriptor import MessagePool  # noqa: E402
+from r2pb.mcap_convert import (  # noqa: E402
+    SchemaTranslator,
+    convert_mcap,
+    parse_ros_schema,
+)
+from r2pb.parser import Field  # noqa: E402
+
+ROS1_SCHEMA = b"""Header header
+float64 x
+int8[] deltas
+uint8[] data
+string label
+================================================================================
+MSG: std_msgs/Header
+uint32 seq
+time stamp
+string frame_id
+"""
+
+ROS2_SCHEMA = b"""builtin_interfaces/Time stamp
+byte level
+string<=8 name
+float32[<=4] values
+================================================================================
+MSG: builtin_interfaces/Time
+int32 sec
+uint32 nanosec
+"""
+
+
+def _ros1_sample(i):
+    frame = f"frame{i}".encode()
+    label = b"" if i % 2 else b"hello"
+    return (
+        struct.pack("<III", i, 100 + i, 7)
+        + struct.pack("<I", len(frame))
+        + frame
+        + struct.pack("<d", i * 0.5)
+        + struct.pack("<I2b", 2, -1, i % 100)
+        + struct.pack("<I", 3)
+        + bytes([i % 256, 1, 2])
+        + struct.pack("<I", len(label))
+        + label
+    )
+
+
+def _cdr_sample(i):
+    # Encapsulation header, then fields aligned relative to its end.
+    body = struct.pack("<iI", -i, i) + bytes([200])
+    body += b"\0" * 3 + struct.pack("<I", 4) + b"abc\0"
+    body += struct.pack("<I", 2) + struct.pack("<2f", 1.5, -i)
+    return b"\x00\x01\x00\x00" + body
+
+
+def _write_input(path, count=50, chunk_size=256, summary=True):
+    with open(path, "wb") as f:
+        writer = Writer(
+            f,
+            chunk_size=chunk_size,
+            compression=CompressionType.ZSTD,
+            repeat_schemas=summary,
+            repeat_channels=summary,
+        )
+        writer.start(profile="ros1", library="test")
+        ros1 = writer.register_schema("test_msgs/Sample", "ros1msg", ROS1_SCHEMA)
+        ros2 = writer.register_schema("test_msgs/msg/Status", "ros2msg", ROS2_SCHEMA)
+        json_schema = writer.register_schema("Blob", "jsonschema", b"{}")
+        channels = {
+            "ros1": writer.register_channel("/sample", "ros1", ros1),
+            "ros2": writer.register_channel("/status", "cdr", ros2),
+            "json": writer.register_channel("/blob", "json", json_schema),
+        }
+        for i in range(count):
+            writer.add_message(channels["ros1"], i, _ros1_sample(i), i, i)
+            writer.add_message(channels["ros2"], i, _cdr_sample(i), i, i)
+            writer.add_message(channels["json"], i, b'{"i": %d}' % i, i, i)
+        writer.add_attachment(1, 2, "calib.yaml", "text/yaml", b"k: v")
+        writer.add_metadata("info", {"robot": "r2"})
+        writer.finish()
+
+
+def _decode_output(path):
+    """Decodes every message of a converted file with its embedded schema."""
+    with open(path, "rb") as f:
+        reader = make_reader(f)
+        decoded = {}
+        for schema, channel, message in reader.iter_messages():
+            if channel.message_encoding == "protobuf":
+                assert schema.encoding == "protobuf"
+                pool = MessagePool(
+                    descriptor_pb2.FileDescriptorSet.FromString(schema.data)
+                )
+                msg = pool.get_message_class(schema.name).FromString(message.data)
+            else:
+                msg = message.data
+            decoded.setdefault(channel.topic, []).append(msg)
+        f.seek(0)
+        attachments = list(make_reader(f).iter_attachments())
+        f.seek(0)
+        metadata = list(make_reader(f).iter_metadata())
+    return decoded, attachments, metadata
+
+
+def test_parse_ros_schema_qualifies_types_and_drops_bounds():
+    """Test splitting concatenated schemas and normalizing ROS 2 types."""
+    messages = parse_ros_schema("test_msgs/msg/Status", "ros2msg", ROS2_SCHEMA.decode())
+    assert set(messages) == {"test_msgs/Status", "builtin_interfaces/Time"}
+    assert messages["test_msgs/Status"].fields == [
+        Field("builtin_interfaces/Time", "stamp"),
+        Field("byte", "level"),
+        Field("string", "name"),
+        Field("float32[]", "values"),
+    ]
+
+    messages = parse_ros_schema("test_msgs/Sample", "ros1msg", ROS1_SCHEMA.decode())
+    assert messages["test_msgs/Sample"].fields[0] == Field("std_msgs/Header", "header")
+
+
+def test_schema_translator_caches_translations():
+    """Test that each schema is translated to a descriptor set once."""
+    translator = SchemaTranslator()
+    first = translator.translate("test_msgs/Sample", "ros1msg", ROS1_SCHEMA)
+    assert first.proto_name == "test_msgs.Sample"
+    assert translator.translate("test_msgs/Sample", "ros1msg", ROS1_SCHEMA) is first
+
+
+@pytest.mark.parametrize("workers, summary", [(0, True), (2, True), (2, False)])
+def test_convert_mcap(tmp_path, workers, summary):
+    """Test converting ros1 and cdr channels while passing others through."""
+    source = tmp_path / "in.mcap"
+    target = tmp_path / "out.mcap"
+    # Without a summary, schemas and channels are only found inside chunks.
+    _write_input(source, summary=summary)
+
+    stats = convert_mcap(source, target, workers=workers, chunk_size=512)
+    assert stats.messages == 150
+    assert stats.translated == 100
+    assert stats.channels == 3
+
+    decoded, attachments, metadata = _decode_output(target)
+
+    samples = decoded["/sample"]
+    assert len(samples) == 50
+    for i, msg in enumerate(samples):
+        assert msg.header.seq == i
+        assert (msg.header.stamp.seconds, msg.header.stamp.nanos) == (100 + i, 7)
+        assert msg.header.frame_id == f"frame{i}"
+        assert msg.x == i * 0.5
+        assert list(msg.deltas) == [-1, i % 100]
+        assert msg.data == bytes([i % 256, 1, 2])
+        assert msg.label == ("" if i % 2 else "hello")
+
+    statuses = decoded["/status"]
+    for i, msg in enumerate(statuses):
+        assert (msg.stamp.sec, msg.stamp.nanosec) == (-i, i)
+        assert msg.level == 200
+        assert msg.name == "abc"
+        assert list(msg.values) == [1.5, -i]
+
+    assert decoded["/blob"][3] == b'{"i": 3}'
+    assert [a.name for a in attachments] == ["calib.yaml"]
+    assert metadata[0].metadata == {"robot": "r2"}
+
+
+def test_convert_mcap_rejects_unknown_compression(tmp_path):
+    """Test that an unsupported output compression is reported up front."""
+    source = tmp_path / "in.mcap"
+    _write_input(source, count=1)
+    with pytest.raises(ValueError, match="Unsupported compression 'bz2'"):
+        convert_mcap(source, tmp_path / "out.mcap", compression="bz2")
+    assert not (tmp_path / "out.mcap").exists()
@@ -0,0 +1,114 @@
+import struct
+import textwrap
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from r2pb.cache import LRUCache
+from r2pb.numpy_dtype import DtypeBuilder, NotFixedSizeError
+
+MESSAGES = {
+    "test_msgs/Sample": textwrap.dedent("""
+        time stamp
+        duration age
+        bool valid
+        int8 level
+        uint16 flags
+        float32[3] gain
+        geometry_msgs/Point[2] corners
+        """),
+    "test_msgs/Cloud": "geometry_msgs/Point[] points",
+    "test_msgs/Node": "int32 value\nLink[2] links",
+    "test_msgs/Link": "float32 weight\nNode target",
+}
+
+
+@pytest.fixture
+def builder(make_parser):
+    return DtypeBuilder(make_parser(MESSAGES))
+
+
+def test_nested_fixed_size_dtype(builder):
+    """Test that nested fixed-size messages become nested structured dtypes."""
+    dtype = builder.build("geometry_msgs/Pose")
+    assert dtype.itemsize == 56
+    assert dtype.names == ("position", "orientation")
+    assert dtype["position"].names == ("x", "y", "z")
+    assert builder.build("geometry_msgs/Pose") is dtype
+
+
+def test_dtype_matches_ros1_packing(builder):
+    """Test that a serialized message is viewed field by field without padding."""
+    dtype = builder.build("test_msgs/Sample")
+    data = struct.pack(
+        "<IIiiBbH3f6d",
+        100,
+        5,
+        -1,
+        7,
+        1,
+        -3,
+        0xBEEF,
+        1.0,
+        2.0,
+        3.0,
+        1,
+        2,
+        3,
+        4,
+        5,
+        6,
+    )
+    assert dtype.itemsize == len(data)
+
+    sample = builder.frombuffer("test_msgs/Sample", data)[0]
+    assert sample["stamp"]["secs"] == 100
+    assert sample["age"]["secs"] == -1
+    assert sample["valid"] == 1
+    assert sample["level"] == -3
+    assert sample["flags"] == 0xBEEF
+    assert list(sample["gain"]) == [1.0, 2.0, 3.0]
+    assert sample["corners"]["z"].tolist() == [3.0, 6.0]
+
+
+def test_frombuffer_array_of_points(builder):
+    """Test viewing a serialized Point[] field as one vectorized array."""
+    points = np.arange(3000, dtype="<f8").reshape(1000, 3)
+    data = b"junk" + struct.pack("<I", 1000) + points.tobytes() + b"tail"
+
+    array, end = builder.frombuffer_array("geometry_msgs/Point", data, offset=4)
+
+    assert end == len(data) - 4
+    assert array.shape == (1000,)
+    np.testing.assert_array_equal(array["y"], points[:, 1])
+
+
+@pytest.mark.parametrize(
+    "msg_type, reason",
+    [
+        ("geometry_msgs/PoseStamped", "field 'header'.*'frame_id' is a string"),
+        ("test_msgs/Cloud", "field 'points' is a variable-length array"),
+        ("test_msgs/Node", "field 'links'.*field 'target'.*Node is recursive"),
+    ],
+)
+def test_variable_length_messages_are_not_eligible(builder, msg_type, reason):
+    """Test that messages without a fixed layout are reported as ineligible."""
+    assert not builder.is_fixed_size(msg_type)
+    with pytest.raises(NotFixedSizeError, match=reason):
+        builder.build(msg_type)
+    assert builder.is_fixed_size("geometry_msgs/Point")
+
+
+def test_dtype_cache_is_bounded(make_parser):
+    """Test that dtypes and ineligibility reasons share one bounded cache."""
+    parser = make_parser(MESSAGES)
+    builder = DtypeBuilder(parser, cache=LRUCache(max_entries=2))
+    builder.build("geometry_msgs/Point")
+    assert not builder.is_fixed_size("test_msgs/Cloud")
+    assert not builder.is_fixed_size("test_msgs/Cloud")
+    assert parser.parse.call_count == 2
+
+    builder.build("geometry_msgs/Quaternion")
+    assert builder._cache.stats().entries == 2
+    assert builder._cache.stats().evictions == 1
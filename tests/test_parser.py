@@ -2,6 +2,7 @@ import pytest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+from r2pb.bundle import build_bundle
 from r2pb.parser import parse_msg_content, ParsedMsg, Field, Constant, MsgParser
 
 # --- Tests for the original parse_msg_content function ---
@@ -169,3 +170,41 @@ def test_parser_online_repo_exists_but_msg_is_missing(mock_fetcher, tmp_path):
 
     # 验证 fetcher 确实被调用了
     mock_fetcher.find_and_fetch.assert_called_once_with("std_msgs")
+
+
+def test_parser_missing_msg_fails_fast(mock_fetcher, tmp_path):
+    """测试无法找到的消息会被负缓存，重复查找时不再在线获取。"""
+    online_pkg_path = tmp_path / "online_pkgs" / "std_msgs"
+    online_pkg_path.mkdir(parents=True)
+    mock_fetcher.find_and_fetch.return_value = online_pkg_path
+
+    parser = MsgParser()
+    for _ in range(3):
+        with pytest.raises(
+            FileNotFoundError, match="'Missing.msg' not found in package 'std_msgs'"
+        ):
+            parser.find_msg_file_content("std_msgs", "Missing")
+    mock_fetcher.find_and_fetch.assert_called_once_with("std_msgs")
+
+    # 本地路径中新出现的消息不受负缓存影响
+    local_msg = tmp_path / "ws" / "std_msgs" / "msg" / "Missing.msg"
+    local_msg.parent.mkdir(parents=True)
+    local_msg.write_text("string data")
+    parser.local_package_paths = [tmp_path / "ws"]
+    assert parser.find_msg_file_content("std_msgs", "Missing") == "string data"
+
+
+def test_parser_prefers_bundle(mock_fetcher, local_packages, tmp_path):
+    """测试 bundle 中的消息优先于本地路径，且不会触发在线获取。"""
+    bundle_path = tmp_path / "msgs.bundle"
+    build_bundle(
+        bundle_path,
+        [("my_msgs/MyData", "int32 data"), ("std_msgs/String", "string data")],
+    )
+
+    parser = MsgParser(local_package_paths=[local_packages], bundles=[bundle_path])
+    assert parser.find_msg_file_content("my_msgs", "MyData") == "int32 data"
+    assert parser.parse("std_msgs", "String") == ParsedMsg(
+        fields=[Field(field_type="string", name="data")], constants=[]
+    )
+    mock_fetcher.find_and_fetch.assert_not_called()
@@ -0,0 +1,188 @@
+import json
+import stat
+from unittest import mock
+
+import pytest
+
+from r2pb.converter import Converter
+from r2pb.parser import MsgParser
+from r2pb.sharding import (
+    MANIFEST_NAME,
+    Shard,
+    ShardError,
+    assign_shards,
+    load_plan,
+    merge_shards,
+    parse_shard,
+    write_plan,
+)
+
+MESSAGES = {
+    "nav_msgs/Path": "std_msgs/Header header\ngeometry_msgs/PoseStamped[] poses",
+    "sensor_msgs/Imu": "std_msgs/Header header\ngeometry_msgs/Quaternion orientation",
+}
+ROOTS = ["nav_msgs/Path", "sensor_msgs/Imu"]
+
+
+@pytest.fixture
+def converter(make_workspace):
+    """Create a converter resolving messages from a local workspace."""
+    converter = Converter()
+    converter._parser = MsgParser(local_package_paths=[make_workspace(MESSAGES)])
+    return converter
+
+
+def test_parse_shard():
+    """Test parsing and validating 'i/N' shard specifications."""
+    assert parse_shard("2/4") == Shard(2, 4)
+    assert str(parse_shard("1/1")) == "1/1"
+    for spec in ["0/4", "5/4", "2", "a/b", "2/"]:
+        with pytest.raises(ValueError, match="Invalid shard"):
+            parse_shard(spec)
+
+
+def test_assign_shards_by_package():
+    """Test that packages stay together and are balanced largest first."""
+    graph = {
+        msg_type: []
+        for msg_type in [
+            "std_msgs/Header",
+            "geometry_msgs/Point",
+            "geometry_msgs/Quaternion",
+            "geometry_msgs/Pose",
+            "geometry_msgs/PoseStamped",
+            *ROOTS,
+        ]
+    }
+    assignment = assign_shards(graph, 2)
+
+    # geometry_msgs (4) fills shard 1; the three single-message packages go to 2.
+    assert {t for t, i in assignment.items() if i == 1} == {
+        "geometry_msgs/Point",
+        "geometry_msgs/Quaternion",
+        "geometry_msgs/Pose",
+        "geometry_msgs/PoseStamped",
+    }
+    # Insertion order of the graph does not matter.
+    reordered = dict(reversed(list(graph.items())))
+    assert assign_shards(reordered, 2) == assignment
+    # With more shards than packages, even geometry_msgs is split up.
+    assert set(assign_shards(graph, 10).values()) == set(range(1, 8))
+
+
+def test_assign_shards_splits_dominant_package():
+    """Test that a package above the fair share is split along its edges."""
+    graph = {
+        "big_msgs/A": ["big_msgs/B"],
+        "big_msgs/B": ["big_msgs/C"],
+        "big_msgs/C": [],
+        "big_msgs/X": ["big_msgs/Y", "std_msgs/Header"],
+        "big_msgs/Y": ["big_msgs/Z"],
+        "big_msgs/Z": [],
+        "std_msgs/Header": [],
+    }
+    assignment = assign_shards(graph, 2)
+
+    # Each dependency component of big_msgs stays on one shard.
+    assert {assignment[t] for t in ["big_msgs/A", "big_msgs/B", "big_msgs/C"]} == {1}
+    assert {assignment[t] for t in ["big_msgs/X", "big_msgs/Y", "big_msgs/Z"]} == {2}
+    assert assignment["std_msgs/Header"] == 1
+
+    # A component above the fair share is cut in dependency order.
+    assignment = assign_shards(graph, 4)
+    assert assignment["big_msgs/B"] == assignment["big_msgs/C"]
+    assert assignment["big_msgs/A"] != assignment["big_msgs/B"]
+    assert sorted(list(assignment.values()).count(i) for i in range(1, 5)) == [
+        1,
+        2,
+        2,
+        2,
+    ]
+
+
+def test_sharded_conversion_merges_to_full_tree(converter, tmp_path, proto_files):
+    """Test that merged shard outputs equal an unsharded conversion."""
+    converter.convert(ROOTS, tmp_path / "full")
+
+    shard_dirs = []
+    for index in (1, 2, 3):
+        shard_dir = tmp_path / f"shard-{index}"
+        converter.convert(ROOTS, shard_dir, shard=Shard(index, 3))
+        shard_dirs.append(shard_dir)
+
+    owned = [set(proto_files(d)) for d in shard_dirs]
+    assert all(owned)
+    assert not owned[0] & owned[1] and not owned[1] & owned[2]
+
+    assert merge_shards(shard_dirs, tmp_path / "merged") == 7
+    assert proto_files(tmp_path / "merged") == proto_files(tmp_path / "full")
+
+    manifest_path = tmp_path / "merged" / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text())
+    assert (manifest["shard"], manifest["shards"]) == (1, 1)
+    # Manifests and plans are handed to other nodes, so they are not
+    # owner-only.
+    plan_path = write_plan(tmp_path / "plan.json", converter.plan_shards(ROOTS, 3))
+    plain = tmp_path / "plain.txt"
+    plain.write_text("x")
+    mode = stat.S_IMODE(plain.stat().st_mode)
+    assert stat.S_IMODE(manifest_path.stat().st_mode) == mode
+    assert stat.S_IMODE(plan_path.stat().st_mode) == mode
+    assert manifest["roots"] == ROOTS
+    assert manifest["messages"]["geometry_msgs/Pose"]["dependencies"] == [
+        "geometry_msgs/Point",
+        "geometry_msgs/Quaternion",
+    ]
+
+
+def test_merge_rejects_inconsistent_shards(converter, tmp_path):
+    """Test that missing, duplicated and modified shards are rejected."""
+    shard_dirs = [tmp_path / "s1", tmp_path / "s2"]
+    converter.convert(ROOTS, shard_dirs[0], shard=Shard(1, 2))
+    converter.convert(ROOTS, shard_dirs[1], shard=Shard(2, 2))
+
+    with pytest.raises(ShardError, match="Missing shards: 2/2"):
+        merge_shards(shard_dirs[:1], tmp_path / "out")
+    with pytest.raises(ShardError, match="given twice"):
+        merge_shards([shard_dirs[0], shard_dirs[0]], tmp_path / "out")
+
+    converter.convert(["std_msgs/Header"], tmp_path / "other", shard=Shard(1, 2))
+    with pytest.raises(ShardError, match="different run"):
+        merge_shards([shard_dirs[0], tmp_path / "other"], tmp_path / "out")
+
+    proto = next(shard_dirs[1].rglob("*.proto"))
+    proto.write_text(proto.read_text() + "// edited\n")
+    with pytest.raises(ShardError, match="does not match its hash"):
+        merge_shards(shard_dirs, tmp_path / "out")
+    assert not (tmp_path / "out").exists()
+
+    with pytest.raises(ShardError, match="has no"):
+        merge_shards([tmp_path], tmp_path / "out")
+
+
+def test_sharded_conversion_parses_each_message_once(converter, tmp_path):
+    """Test that a graph pass shared through a plan spares the nodes parsing."""
+    plan_path = write_plan(tmp_path / "plan.json", converter.plan_shards(ROOTS, 2))
+    plan = load_plan(plan_path)
+    assert plan.roots == sorted(ROOTS)
+    assert plan.graph["sensor_msgs/Imu"] == [
+        "geometry_msgs/Quaternion",
+        "std_msgs/Header",
+    ]
+
+    converter._parser = mock.Mock(wraps=converter._parser)
+    shard_dirs = [tmp_path / "s1", tmp_path / "s2"]
+    for index, shard_dir in enumerate(shard_dirs, start=1):
+        converter.convert(ROOTS, shard_dir, shard=Shard(index, 2), plan=plan)
+    parsed = [call.args for call in converter._parser.parse.call_args_list]
+    assert sorted("/".join(args) for args in parsed) == sorted(plan.graph)
+    assert merge_shards(shard_dirs, tmp_path / "merged") == 7
+
+    # Without a plan, the graph pass parses every message, and only once.
+    fresh = Converter()
+    fresh._parser = mock.Mock(wraps=MsgParser(local_package_paths=[tmp_path / "ws"]))
+    fresh.convert(ROOTS, tmp_path / "s3", shard=Shard(1, 2))
+    assert fresh._parser.parse.call_count == len(plan.graph)
+
+    with pytest.raises(ShardError, match="plan is for"):
+        converter.convert(ROOTS, tmp_path / "s4", shard=Shard(1, 3), plan=plan)
@@ -0,0 +1,308 @@
+import random
+import struct
+import textwrap
+
+import pytest
+
+from r2pb.cache import LRUCache
+from r2pb.mapper import split_array_type
+from r2pb.transcoder import (
+    TranscodeError,
+    TranscodeRangeError,
+    TranscoderBuilder,
+)
+
+MESSAGES = {
+    "test_msgs/Everything": textwrap.dedent("""
+        std_msgs/Header header
+        bool flag
+        byte b
+        char c
+        int8 i8
+        uint8 u8
+        int16 i16
+        uint16 u16
+        int32 i32
+        uint32 u32
+        int64 i64
+        uint64 u64
+        float32 f32
+        float64 f64
+        string name
+        duration elapsed
+        uint8[] data
+        char[4] tag
+        float32[] ranges
+        float64[9] covariance
+        int16[] ids
+        bool[] mask
+        uint64[2] counters
+        string[] labels
+        time[] stamps
+        geometry_msgs/Point point
+        geometry_msgs/Point[] points
+        geometry_msgs/Point[2] corners
+        """),
+}
+
+_INT_RANGES = {
+    "byte": (-(2**7), 2**7 - 1),
+    "int8": (-(2**7), 2**7 - 1),
+    "uint8": (0, 2**8 - 1),
+    "int16": (-(2**15), 2**15 - 1),
+    "uint16": (0, 2**16 - 1),
+    "int32": (-(2**31), 2**31 - 1),
+    "uint32": (0, 2**32 - 1),
+    "int64": (-(2**63), 2**63 - 1),
+    "uint64": (0, 2**64 - 1),
+}
+_STRUCT_CODES = {
+    "bool": "B",
+    "byte": "b",
+    "char": "B",
+    "int8": "b",
+    "uint8": "B",
+    "int16": "h",
+    "uint16": "H",
+    "int32": "i",
+    "uint32": "I",
+    "int64": "q",
+    "uint64": "Q",
+    "float32": "f",
+    "float64": "d",
+}
+
+
+@pytest.fixture
+def parser(make_parser):
+    return make_parser(MESSAGES)
+
+
+# --- Reference implementation used by the round-trip harness ---------------
+
+
+def random_value(parser, rng, ros_type):
+    """Generates a random ROS value for a (possibly array) type."""
+    spec = split_array_type(ros_type)
+    if spec.is_array:
+        if spec.base_type in ("uint8", "char"):
+            return bytes(rng.randrange(256) for _ in range(spec.array_size or 5))
+        count = spec.array_size or rng.randrange(4)
+        return [random_value(parser, rng, spec.base_type) for _ in range(count)]
+    base = spec.base_type
+    if base == "bool":
+        return rng.random() < 0.5
+    if base == "char":
+        return rng.randrange(128)
+    if base in _INT_RANGES:
+        return rng.randint(*_INT_RANGES[base])
+    if base == "float32":
+        return struct.unpack("<f", struct.pack("<f", rng.uniform(-1e3, 1e3)))[0]
+    if base == "float64":
+        return rng.uniform(-1e6, 1e6)
+    if base == "string":
+        return "".join(rng.choice("abcxyz_") for _ in range(rng.randrange(6)))
+    if base == "time":
+        return (rng.randrange(2**32), rng.randrange(10**9))
+    if base == "duration":
+        return (rng.randint(-(2**31), 2**31 - 1), rng.randint(-(10**9), 10**9))
+    pkg, msg = base.split("/")
+    return {
+        f.name: random_value(parser, rng, f.field_type)
+        for f in parser.parse(pkg, msg).fields
+    }
+
+
+def ros1_serialize(parser, ros_type, value) -> bytes:
+    """A straightforward, interpreted ROS1 serializer."""
+    spec = split_array_type(ros_type)
+    base = spec.base_type
+    if spec.is_array:
+        prefix = b"" if spec.array_size else struct.pack("<I", len(value))
+        if base in ("uint8", "char"):
+            return prefix + value
+        return prefix + b"".join(ros1_serialize(parser, base, v) for v in value)
+    if base in _STRUCT_CODES:
+        return struct.pack("<" + _STRUCT_CODES[base], value)
+    if base == "string":
+        data = value.encode("utf-8")
+        return struct.pack("<I", len(data)) + data
+    if base == "time":
+        return struct.pack("<II", *value)
+    if base == "duration":
+        return struct.pack("<ii", *value)
+    pkg, msg = base.split("/")
+    return b"".join(
+        ros1_serialize(parser, f.field_type, value[f.name])
+        for f in parser.parse(pkg, msg).fields
+    )
+
+
+def fill_proto(parser, message, ros_type, value):
+    """Copies a ROS value into a protobuf message built from r2pb descriptors."""
+    pkg, msg = ros_type.split("/")
+    for field in parser.parse(pkg, msg).fields:
+        spec = split_array_type(field.field_type)
+        base, v = spec.base_type, value[field.name]
+        if base in ("time", "duration"):
+            if spec.is_array:
+                for secs, nsecs in v:
+                    getattr(message, field.name).add(seconds=secs, nanos=nsecs)
+            else:
+                getattr(message, field.name).seconds = v[0]
+                getattr(message, field.name).nanos = v[1]
+        elif "/" in base:
+            if spec.is_array:
+                for item in v:
+                    fill_proto(parser, getattr(message, field.name).add(), base, item)
+            else:
+                fill_proto(parser, getattr(message, field.name), base, v)
+        elif base == "char" and not spec.is_array:
+            setattr(message, field.name, chr(v))
+        elif spec.is_array and base not in ("uint8", "char"):
+            getattr(message, field.name).extend(v)
+        else:
+            setattr(message, field.name, v)
+
+
+# --- Tests -----------------------------------------------------------------
+
+
+def test_round_trip_random_messages(parser):
+    """Round-trip harness: protobuf encoding -> transcoder == reference ROS1."""
+    pytest.importorskip("google.protobuf")
+    from r2pb.descriptor import DescriptorBuilder
+
+    msg_type = "test_msgs/Everything"
+    pool = DescriptorBuilder(parser).build_pool(msg_type)
+    message_class = pool.get_message_class("test_msgs.Everything")
+    transcoder = TranscoderBuilder(parser).build(msg_type)
+
+    rng = random.Random(1234)
+    for _ in range(200):
+        value = random_value(parser, rng, msg_type)
+        message = message_class()
+        fill_proto(parser, message, msg_type, value)
+
+        expected = ros1_serialize(parser, msg_type, value)
+        assert transcoder.transcode(message.SerializeToString()) == expected
+
+
+def test_empty_input_yields_defaults(parser):
+    """Test that absent fields become zeros, including fixed-size arrays."""
+    transcoder = TranscoderBuilder(parser).build("test_msgs/Everything")
+    ros1 = transcoder.transcode(b"")
+    assert len(ros1) == transcoder.serialized_size(b"")
+    assert ros1 == bytes(len(ros1))
+
+
+def test_transcode_into_preallocated_buffer(parser):
+    """Test writing several messages back to back into one buffer."""
+    transcoder = TranscoderBuilder(parser).build("geometry_msgs/Point")
+    # x = 1.0 (field 1, fixed64), z = -2.5 (field 3, fixed64)
+    data = b"\x09" + struct.pack("<d", 1.0) + b"\x19" + struct.pack("<d", -2.5)
+
+    buffer = bytearray(48)
+    offset = transcoder.transcode_into(data, buffer)
+    offset = transcoder.transcode_into(data, memoryview(buffer), offset)
+
+    assert offset == 48
+    assert struct.unpack("<6d", buffer) == (1.0, 0.0, -2.5, 1.0, 0.0, -2.5)
+    with pytest.raises(TranscodeError, match="24 needed"):
+        transcoder.transcode_into(data, buffer, 40)
+
+
+def test_narrowing_is_range_checked(parser):
+    """Test that widened integers that do not fit the ROS type are rejected."""
+    transcoder = TranscoderBuilder(parser).build("test_msgs/Everything")
+    # i8 is field 5 (int32 on the wire); 200 does not fit int8.
+    with pytest.raises(TranscodeRangeError, match="Everything.i8"):
+        transcoder.transcode(b"\x28\xc8\x01")
+    # u16 is field 8; 70000 does not fit uint16.
+    with pytest.raises(TranscodeRangeError, match="Everything.u16"):
+        transcoder.transcode(b"\x40\xf0\xa2\x04")
+    # Negative int32 values arrive sign-extended to ten bytes and still fit.
+    values = transcoder.decode(b"\x28" + b"\xff" * 9 + b"\x01")
+    assert values[4] == -1
+
+
+def test_unpacked_repeated_and_unknown_fields(parser):
+    """Test that unpacked repeated fields are accepted and unknowns skipped."""
+    transcoder = TranscoderBuilder(parser).build("test_msgs/Everything")
+    # ids (field 21) as two unpacked varints, plus an unknown field 99.
+    data = b"\xa8\x01\x05\xa8\x01\x07" + b"\x98\x06\x01"
+    assert transcoder.decode(data)[20] == [5, 7]
+
+
+def test_fixed_size_mismatch_is_rejected(parser):
+    """Test that a fixed-size array with the wrong element count is an error."""
+    transcoder = TranscoderBuilder(parser).build("test_msgs/Everything")
+    # tag (field 18) is char[4]; send three bytes.
+    with pytest.raises(TranscodeError, match="'tag' has 3 elements, expected 4"):
+        transcoder.transcode(b"\x92\x01\x03abc")
+
+
+def test_truncated_input_is_rejected(parser):
+    """Test that truncated protobuf input raises TranscodeError."""
+    transcoder = TranscoderBuilder(parser).build("geometry_msgs/Point")
+    with pytest.raises(TranscodeError):
+        transcoder.transcode(b"\x09\x00\x00")
+
+
+def test_builder_caches_transcoders(parser):
+    """Test that each message type is compiled once per builder."""
+    builder = TranscoderBuilder(parser)
+    assert builder.build("geometry_msgs/Point") is builder.build("geometry_msgs/Point")
+
+    bounded = TranscoderBuilder(parser, cache=LRUCache(max_entries=1))
+    bounded.build("geometry_msgs/Point")
+    bounded.build("std_msgs/Header")
+    assert len(bounded._transcoders) == 1
+    assert bounded._transcoders.stats().evictions == 1
+
+
+def test_split_submessages_are_merged(parser):
+    """Test that a singular submessage given twice merges like protobuf does."""
+    pytest.importorskip("google.protobuf")
+    from r2pb.descriptor import DescriptorBuilder
+
+    msg_type = "test_msgs/Everything"
+    pool = DescriptorBuilder(parser).build_pool(msg_type)
+    message_class = pool.get_message_class("test_msgs.Everything")
+    transcoder = TranscoderBuilder(parser).build(msg_type)
+
+    first, second = message_class(), message_class()
+    first.header.seq = 7
+    first.header.stamp.seconds = 3
+    first.point.x = 1.5
+    first.elapsed.seconds = 2
+    second.header.frame_id = "map"
+    second.header.stamp.nanos = 9
+    second.point.z = -4.0
+    second.elapsed.nanos = 5
+    second.name = "b"
+    # Concatenated encodings are a valid encoding of the merged message.
+    data = first.SerializeToString() + second.SerializeToString()
+
+    merged = message_class()
+    merged.ParseFromString(data)
+    assert merged.header.seq == 7 and merged.point.x == 1.5
+    assert transcoder.transcode(data) == transcoder.transcode(
+        merged.SerializeToString()
+    )
+
+
+def test_names_are_not_pasted_into_generated_source(make_parser):
+    """Test that field and type names cannot inject code into the transcoder."""
+    parser = make_parser({**MESSAGES, "bad_msgs/Quote": "float32[] x'+str(1)+'"})
+    with pytest.raises(TranscodeError, match="Invalid field name"):
+        TranscoderBuilder(parser).build("bad_msgs/Quote")
+    with pytest.raises(TranscodeError, match="Invalid message type"):
+        TranscoderBuilder(parser).build("bad_msgs/Quote'+str(1)+'")
+
+    # Names inside generated error messages are emitted as literals.
+    transcoder = TranscoderBuilder(parser).build("test_msgs/Everything")
+    with pytest.raises(
+        TranscodeError, match="Malformed packed field test_msgs/Everything.ranges"
+    ):
+        transcoder.transcode(b"\x9a\x01\x03abc")